@@ -0,0 +1,103 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+from perf_stats import STATS
+
+# Constants
+USER_COOLDOWN = 30.0  # Seconds after a notification during which the user's new alerts are merged into it
+ESCALATION_WINDOW = 600.0  # Seconds of incident history used to pick the escalation level
+# Incidents within ESCALATION_WINDOW needed to reach each level
+ESCALATION_LEVELS = [(1, "notice"), (3, "warning"), (5, "critical")]
+SEVERITY_ORDER = {"low": 0, "medium": 1, "high": 2}
+
+
+class Incident:
+    """One or more alerts for the same user, merged and handled as a single event."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user, started):
+        self.id = next(self._ids)
+        # Stable across restarts, used to file evidence (e.g. "20250101-093000-7")
+        self.event_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{self.id}"
+        self.user = user
+        self.started = started
+        self.updated = started
+        self.notified = started  # Last time the side effects ran for this incident
+        self.causes = []  # Rule names, in the order they fired
+        self.severity = "low"
+        self.level = ESCALATION_LEVELS[0][1]
+        self.alert_count = 0
+
+    def add(self, cause, severity, current_time):
+        if cause not in self.causes:
+            self.causes.append(cause)
+        if SEVERITY_ORDER.get(severity, 0) > SEVERITY_ORDER.get(self.severity, 0):
+            self.severity = severity
+        self.alert_count += 1
+        self.updated = current_time
+
+
+class AlertAggregator:
+    """
+    Sits between the alert rules and the alert side effects (sound, CSV,
+    screenshot + Telegram, warning window).
+    - Alerts fired on the same frame become one incident.
+    - Within USER_COOLDOWN of a user's last notification, further alerts are
+      merged into that incident silently, unless they raise its severity.
+    - The escalation level grows with the number of incidents in ESCALATION_WINDOW.
+    Per-class cooldowns are part of the rules themselves (rules.yaml).
+    """
+
+    def __init__(self, rules, user_cooldown=USER_COOLDOWN, escalation_window=ESCALATION_WINDOW):
+        self.rules = rules
+        self.user_cooldown = user_cooldown
+        self.escalation_window = escalation_window
+        self.lock = threading.Lock()
+        self.open_incidents = {}  # user -> last Incident
+        self.history = {}  # user -> deque of incident start times
+
+    def _level(self, user, current_time):
+        history = self.history.setdefault(user, deque())
+        while history and current_time - history[0] > self.escalation_window:
+            history.popleft()
+        level = ESCALATION_LEVELS[0][1]
+        for count, name in ESCALATION_LEVELS:
+            if len(history) >= count:
+                level = name
+        return level
+
+    def submit(self, alert_names, user, current_time):
+        """
+        Feed the alerts fired on one frame.
+        Returns the Incident to act on, or None when the alerts were absorbed.
+        """
+        if not alert_names:
+            return None
+
+        with self.lock:
+            incident = self.open_incidents.get(user)
+            if incident is not None and current_time - incident.notified < self.user_cooldown:
+                previous_severity = incident.severity
+                for name in alert_names:
+                    incident.add(name, self.rules.severity(name), current_time)
+                # Re-notify only when the incident got more serious
+                if SEVERITY_ORDER.get(incident.severity, 0) > SEVERITY_ORDER.get(previous_severity, 0):
+                    incident.notified = current_time
+                    STATS.incr("incidents_escalated")
+                    return incident
+                STATS.incr("alerts_merged", len(alert_names))
+                return None
+
+            incident = Incident(user, current_time)
+            for name in alert_names:
+                incident.add(name, self.rules.severity(name), current_time)
+            self.history.setdefault(user, deque()).append(current_time)
+            incident.level = self._level(user, current_time)
+            self.open_incidents[user] = incident
+            STATS.incr("incidents")
+            if len(alert_names) > 1:
+                STATS.incr("alerts_merged", len(alert_names) - 1)
+            return incident
@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+import time
+
+from perf_stats import STATS
+
+# Constants
+DEFAULT_SOUND = "short_alert.wav"
+# Per-class alert sounds; classes not listed here use DEFAULT_SOUND
+ALERT_SOUNDS = {}
+CLASS_MIN_INTERVAL = 5.0  # Seconds before the same class may sound again
+GLOBAL_MIN_INTERVAL = 0.5  # Seconds between any two alert sounds
+QUEUE_SIZE = 8  # Pending play requests; extra requests are dropped
+
+
+class AlertAudio:
+    """
+    Alert sound player that never blocks the caller.
+    pygame is initialised and all sounds are decoded into memory once, on the
+    audio thread. play() only enqueues a request. If pygame or an audio device
+    is missing (e.g. headless nodes) every call is a no-op.
+    """
+
+    def __init__(self, sounds=None, default_sound=DEFAULT_SOUND,
+                 class_min_interval=CLASS_MIN_INTERVAL, global_min_interval=GLOBAL_MIN_INTERVAL):
+        self.sound_files = dict(ALERT_SOUNDS if sounds is None else sounds)
+        self.default_sound = default_sound
+        self.class_min_interval = class_min_interval
+        self.global_min_interval = global_min_interval
+
+        self.sounds = {}
+        self.channel = None
+        self.enabled = True  # Becomes False if audio can't be initialised
+        self.last_played = {}
+        self.last_any = 0.0
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _init_audio(self):
+        try:
+            import pygame
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            # Keep channel 0 for alerts so other sounds can never cut them off
+            pygame.mixer.set_reserved(1)
+            self.channel = pygame.mixer.Channel(0)
+        except Exception as e:
+            print(f"Alert audio disabled: {e}")
+            self.enabled = False
+            return
+
+        loaded = {}
+        for cls_name, path in list(self.sound_files.items()) + [(None, self.default_sound)]:
+            if path in loaded:
+                self.sounds[cls_name] = loaded[path]
+                continue
+            if not os.path.exists(path):
+                print(f"Sound file not found: {path}")
+                continue
+            try:
+                loaded[path] = self.sounds[cls_name] = pygame.mixer.Sound(path)
+            except pygame.error as e:
+                print(f"Error loading sound {path}: {e}")
+
+        if not self.sounds:
+            self.enabled = False
+
+    def _run(self):
+        self._init_audio()
+        while True:
+            cls_name = self.queue.get()
+            if cls_name is StopIteration:
+                break
+            if not self.enabled:
+                continue
+            sound = self.sounds.get(cls_name) or self.sounds.get(None)
+            if sound is None:
+                continue
+            try:
+                self.channel.play(sound)
+                STATS.incr("alert_sounds_played")
+            except Exception as e:
+                print(f"Error playing sound: {e}")
+
+    def play(self, cls_name=None):
+        """Request the alert sound for a class. Returns immediately."""
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_played.get(cls_name, 0.0)
+            if now - last < self.class_min_interval or now - self.last_any < self.global_min_interval:
+                STATS.incr("alert_sounds_suppressed")
+                return
+            self.last_played[cls_name] = now
+            self.last_any = now
+
+        try:
+            self.queue.put_nowait(cls_name)
+        except queue.Full:
+            STATS.incr("alert_sounds_suppressed")
+
+    def close(self):
+        try:
+            self.queue.put_nowait(StopIteration)
+        except queue.Full:
+            pass
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+
+import yaml
+
+from perf_stats import STATS
+
+# Constants
+RULES_FILE = "rules.yaml"
+RELOAD_CHECK_INTERVAL = 2.0  # Seconds between checks of the rules file for changes
+CONDITIONS = ("present", "absent", "multiple")
+SEVERITIES = ("low", "medium", "high")
+RULE_DEFAULTS = {
+    "confidence": 0.45,
+    "frames": 200,
+    "window": 60,
+    "cooldown": 0,
+    "severity": "medium",
+    "min_count": 2
+}
+
+
+class AlertRule:
+    """One compiled alert rule."""
+
+    def __init__(self, name, spec, defaults, overrides=None):
+        values = dict(RULE_DEFAULTS)
+        values.update(defaults)
+        values.update(spec or {})
+        values.update(overrides or {})
+
+        self.name = name
+        self.class_name = values.get("class", name)
+        self.condition = values.get("condition", "present")
+        self.confidence = float(values["confidence"])
+        self.frames = int(values["frames"])
+        self.window = float(values["window"])
+        self.cooldown = float(values["cooldown"])
+        self.severity = values["severity"]
+        self.min_count = int(values["min_count"]) if self.condition == "multiple" else 1
+        self.message = values.get("message", "Unknown warning!")
+        self.class_id = None  # Resolved against the model's class names
+
+        if self.condition not in CONDITIONS:
+            raise ValueError(f"Rule '{name}': unknown condition '{self.condition}'")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Rule '{name}': unknown severity '{self.severity}'")
+        if self.frames < 1:
+            raise ValueError(f"Rule '{name}': frames must be at least 1")
+
+
+class RuleState:
+    """Per-rule counters kept across frames (and across reloads)."""
+
+    def __init__(self):
+        self.count = 0
+        self.start = 0.0
+        self.last_fired = None
+
+
+def load_rules(path=RULES_FILE, overrides=None):
+    """
+    Parse and validate a rules file. Returns a list of AlertRule.
+    overrides (e.g. {"frames": 30}) take precedence over every rule in the file.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    defaults = config.get("defaults") or {}
+    return [AlertRule(name, spec, defaults, overrides) for name, spec in (config.get("rules") or {}).items()]
+
+
+class RuleEngine:
+    """
+    Evaluates the alert rules against each frame's detections.
+    Rules are compiled once; the file is re-read only when its mtime changes,
+    and counters survive a reload for rules that keep their name.
+    """
+
+    def __init__(self, path=RULES_FILE, names=None, overrides=None, reload_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.overrides = overrides
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.names = {}
+        self.rules = []
+        self.rules_by_name = {}
+        self.rules_by_class = {}
+        self.states = {}
+        self.mtime = None
+        self.last_check = 0.0
+
+        self._load()
+        if names is not None:
+            self.set_class_names(names)
+
+    def _load(self):
+        self.mtime = os.path.getmtime(self.path)
+        self._install(load_rules(self.path, self.overrides))
+
+    def _install(self, rules):
+        with self.lock:
+            self.rules = rules
+            self.rules_by_name = {rule.name: rule for rule in rules}
+            self.states = {rule.name: self.states.get(rule.name) or RuleState() for rule in rules}
+            self._resolve_class_ids()
+
+    def _resolve_class_ids(self):
+        ids = {name: cls_id for cls_id, name in self.names.items()}
+        self.rules_by_class = {}
+        for rule in self.rules:
+            rule.class_id = ids.get(rule.class_name)
+            if rule.class_id is not None:
+                self.rules_by_class.setdefault(rule.class_id, []).append(rule)
+
+    def set_class_names(self, names):
+        """Map rule classes to the model's class ids (model.names)."""
+        with self.lock:
+            self.names = dict(names)
+            self._resolve_class_ids()
+            for rule in self.rules:
+                if rule.class_id is None:
+                    print(f"Rule '{rule.name}': class '{rule.class_name}' is not known to the model.")
+
+    def maybe_reload(self):
+        """Reload the rules file if it changed (checked at most every reload_interval seconds)."""
+        now = time.monotonic()
+        if now - self.last_check < self.reload_interval:
+            return False
+        self.last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.mtime:
+                return False
+            self.mtime = mtime
+            self._install(load_rules(self.path, self.overrides))
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            # Keep running with the previous rules
+            print(f"Error reloading {self.path}: {e}")
+            return False
+        print(f"Alert rules reloaded from {self.path}")
+        STATS.incr("rules_reloads")
+        return True
+
+    def evaluate(self, cls_ids, confs, current_time):
+        """
+        Feed one frame's detections (parallel sequences of class ids and confidences).
+        Returns the list of AlertRule that fired on this frame.
+        """
+        self.maybe_reload()
+        fired = []
+        with self.lock:
+            # One pass over the boxes, touching only the rules for each box's class
+            counts = {}
+            for cls_id, conf in zip(cls_ids, confs):
+                for rule in self.rules_by_class.get(cls_id, ()):
+                    if conf >= rule.confidence:
+                        counts[rule.name] = counts.get(rule.name, 0) + 1
+
+            for rule in self.rules:
+                state = self.states[rule.name]
+                count = counts.get(rule.name, 0)
+
+                if rule.condition == "absent":
+                    matched = count == 0
+                else:
+                    matched = count >= rule.min_count
+
+                if matched:
+                    if state.count == 0:
+                        state.start = current_time
+                    state.count += 1
+
+                # Start over once the window has passed
+                if state.count != 0 and current_time - state.start >= rule.window:
+                    state.count = 0
+
+                if state.count >= rule.frames:
+                    state.count = 0
+                    if state.last_fired is not None and current_time - state.last_fired < rule.cooldown:
+                        STATS.incr("alerts_suppressed_cooldown")
+                        continue
+                    state.last_fired = current_time
+                    fired.append(rule)
+        return fired
+
+    def matching_classes(self, cls_ids, confs):
+        """Names of the detections that pass their class' confidence threshold."""
+        with self.lock:
+            thresholds = {}
+            for rule in self.rules:
+                if rule.class_id is not None:
+                    thresholds[rule.class_id] = min(rule.confidence, thresholds.get(rule.class_id, 1.0))
+        return [self.names.get(cls_id, "unknown") for cls_id, conf in zip(cls_ids, confs)
+                if conf >= thresholds.get(cls_id, RULE_DEFAULTS["confidence"])]
+
+    def min_fps(self):
+        """Lowest frame rate at which every rule can still collect its frames within its window."""
+        with self.lock:
+            return max((rule.frames / rule.window for rule in self.rules if rule.window > 0), default=0.0)
+
+    def rule(self, name):
+        return self.rules_by_name.get(name)
+
+    def message(self, name):
+        rule = self.rules_by_name.get(name)
+        return rule.message if rule is not None else "Unknown warning!"
+
+    def severity(self, name):
+        rule = self.rules_by_name.get(name)
+        return rule.severity if rule is not None else "medium"
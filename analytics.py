@@ -0,0 +1,217 @@
+"""
+Pre-aggregated alert analytics.
+
+Every logged incident bumps a counter in an hourly bucket keyed by user and
+cause, so dashboards read a few thousand small counters instead of parsing
+the full detection log. Rollups are persisted to ROLLUP_FILE and rebuilt from
+the CSV log (and its compressed archives) only when that file is missing.
+"""
+import atexit
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from log_writer import log_files, open_log
+from perf_stats import STATS
+
+# Constants
+ROLLUP_FILE = "analytics_rollups.json"
+SAVE_INTERVAL = 30.0  # Seconds between saves of changed rollups
+BUCKET_FORMAT = "%Y-%m-%d %H"  # One bucket per hour
+LOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CAUSE_SEPARATOR = " | "  # Merged incidents share one CSV row
+
+
+class AlertRollups:
+    """
+    Incremental per-hour, per-user, per-cause alert counters.
+    buckets: {"YYYY-mm-dd HH": {user: {cause: count}}}
+    """
+
+    def __init__(self, path=ROLLUP_FILE, save_interval=SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.dirty = False
+        self.last_save = time.monotonic()
+        self.held = None  # Incidents recorded while a rebuild runs, added when it finishes
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.buckets = json.load(f).get("buckets", {})
+            except (OSError, ValueError) as e:
+                print(f"Error reading {self.path}: {e}")
+        atexit.register(self.save)
+
+    def record(self, timestamp, user, causes):
+        """Count one incident. timestamp is a datetime or a time.struct_time/epoch seconds."""
+        bucket = _bucket_key(timestamp)
+        user = user or "Unknown"
+        with self.lock:
+            if self.held is not None:
+                self.held.append((bucket, user, causes))
+                return
+            _count(self.buckets, bucket, user, causes)
+            self.dirty = True
+        STATS.incr("rollup_updates")
+        if time.monotonic() - self.last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Atomically write the rollups if they changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps({"version": 1, "buckets": self.buckets})
+            self.dirty = False
+            self.last_save = time.monotonic()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving {self.path}: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def rebuild_in_background(self, log_file, cause_names=None):
+        """
+        Run rebuild_from_log on a background thread. Incidents recorded meanwhile are
+        held back and added when it finishes; the rebuild leaves their log rows alone.
+        """
+        until = datetime.now().replace(microsecond=0)
+        with self.lock:
+            self.held = []
+        thread = threading.Thread(target=self.rebuild_from_log, args=(log_file, cause_names, until), daemon=True)
+        thread.start()
+        return thread
+
+    def rebuild_from_log(self, log_file, cause_names=None, until=None):
+        """
+        Recount everything (logged before `until`) from the CSV log and its rotated copies.
+        cause_names maps warning messages back to rule names (messages are what the log stores).
+        """
+        cause_names = cause_names or {}
+        buckets = {}
+        try:
+            for path in log_files(log_file):
+                try:
+                    with open_log(path) as f:
+                        for row in csv.reader(f):
+                            if len(row) < 3:
+                                continue
+                            try:
+                                logged = datetime.strptime(row[0], LOG_TIME_FORMAT)
+                            except ValueError:
+                                continue  # Header or malformed row
+                            if until is not None and logged >= until:
+                                continue
+                            causes = [cause_names.get(m, m) for m in row[1].split(CAUSE_SEPARATOR)]
+                            _count(buckets, _bucket_key(logged), row[2] or "Unknown", causes)
+                except (OSError, EOFError) as e:
+                    # EOFError: a truncated archive
+                    print(f"Error reading {path}: {e}")
+        finally:
+            with self.lock:
+                for bucket, user, causes in self.held or []:
+                    _count(buckets, bucket, user, causes)
+                self.held = None
+                self.buckets = buckets
+                self.dirty = True
+        self.save()
+
+    def query(self, since=None, until=None, users=None, causes=None):
+        """Yield (bucket datetime, user, cause, count) for the buckets in [since, until)."""
+        since_key = since.strftime(BUCKET_FORMAT) if since else None
+        until_key = until.strftime(BUCKET_FORMAT) if until else None
+        with self.lock:
+            # Keys sort chronologically, so the range check is a string comparison
+            selected = [(key, self.buckets[key]) for key in sorted(self.buckets)
+                        if (since_key is None or key >= since_key) and (until_key is None or key < until_key)]
+            rows = [(key, user, cause, count)
+                    for key, by_user in selected
+                    for user, by_cause in by_user.items() if users is None or user in users
+                    for cause, count in by_cause.items() if causes is None or cause in causes]
+        for key, user, cause, count in rows:
+            yield datetime.strptime(key, BUCKET_FORMAT), user, cause, count
+
+    def totals(self, by, since=None, until=None, users=None, causes=None):
+        """
+        Sum the counters grouped by "user", "cause", "user_cause", "day" or "hour_of_day".
+        e.g. totals("user", since=week_ago, causes={"drowsy"}) -> {"alice": 12, "bob": 3}
+        """
+        result = {}
+        for bucket, user, cause, count in self.query(since, until, users, causes):
+            if by == "user":
+                key = user
+            elif by == "cause":
+                key = cause
+            elif by == "user_cause":
+                key = (user, cause)
+            elif by == "day":
+                key = bucket.date()
+            elif by == "hour_of_day":
+                key = bucket.hour
+            else:
+                raise ValueError(f"Unknown grouping '{by}'")
+            result[key] = result.get(key, 0) + count
+        return result
+
+    def users(self):
+        with self.lock:
+            return sorted({user for by_user in self.buckets.values() for user in by_user})
+
+
+def _count(buckets, bucket, user, causes):
+    counts = buckets.setdefault(bucket, {}).setdefault(user, {})
+    for cause in causes:
+        counts[cause] = counts.get(cause, 0) + 1
+
+
+def _bucket_key(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime(BUCKET_FORMAT)
+    if isinstance(timestamp, time.struct_time):
+        return time.strftime(BUCKET_FORMAT, timestamp)
+    return time.strftime(BUCKET_FORMAT, time.localtime(timestamp))
+
+
+def render_dashboard(figure, rollups, days=7):
+    """
+    Draw the analytics charts for the last `days` days into a matplotlib Figure:
+    alerts per user by cause, alerts per day, and alerts by hour of day.
+    """
+    since = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+    by_user_cause = rollups.totals("user_cause", since=since)
+    by_day = rollups.totals("day", since=since)
+    by_hour = rollups.totals("hour_of_day", since=since)
+
+    figure.clear()
+    ax_users, ax_days, ax_hours = figure.subplots(3, 1)
+
+    users = sorted({user for user, _ in by_user_cause})
+    causes = sorted({cause for _, cause in by_user_cause})
+    bottoms = [0] * len(users)
+    for cause in causes:
+        heights = [by_user_cause.get((user, cause), 0) for user in users]
+        ax_users.bar(users, heights, bottom=bottoms, label=cause)
+        bottoms = [b + h for b, h in zip(bottoms, heights)]
+    ax_users.set_title(f"Alerts per user (last {days} days)")
+    if causes:
+        ax_users.legend(fontsize=8, loc="upper right")
+
+    day_list = [since.date() + timedelta(days=i) for i in range(days + 1)]
+    ax_days.bar([d.strftime("%m-%d") for d in day_list], [by_day.get(d, 0) for d in day_list], color="#d9534f")
+    ax_days.set_title("Alerts per day")
+
+    ax_hours.bar(range(24), [by_hour.get(h, 0) for h in range(24)], color="#5bc0de")
+    ax_hours.set_xticks(range(0, 24, 2))
+    ax_hours.set_title("Alerts by hour of day")
+
+    figure.tight_layout()
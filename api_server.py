@@ -0,0 +1,345 @@
+"""
+Local HTTP/WebSocket API for other services and supervisors.
+
+    GET /status            current state (user, running, fps, connected clients)
+    GET /events?limit=50   most recent detection/alert events (JSON)
+    GET /stream.mjpg?fps=5 live annotated stream (MJPEG)
+    GET /ws                detection/alert events pushed over WebSocket
+
+The detection loop publishes into an EventHub; the server runs its own asyncio
+loop on a daemon thread. Every frame is inferred once and JPEG-encoded at most
+once however many viewers are connected. Each viewer gets its own frame-rate
+limit and always receives the newest frame, so slow clients skip frames instead
+of queueing them. Slow WebSocket clients lose their oldest events.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+from perf_stats import STATS
+
+# Constants
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+RECENT_EVENTS = 500  # Events kept for GET /events
+DEFAULT_STREAM_FPS = 5.0
+MAX_STREAM_FPS = 15.0
+MAX_STREAM_CLIENTS = 16
+JPEG_QUALITY = 75
+WS_QUEUE_SIZE = 100  # Pending events per WebSocket client before the oldest are dropped
+SEND_TIMEOUT = 5.0  # Seconds a client may stall a write before it is disconnected
+KEEPALIVE_INTERVAL = 15.0  # Seconds between WebSocket pings when idle
+MAX_WS_FRAME = 4096  # Largest WebSocket frame accepted from a client (they only send control frames)
+WS_CLOSE_TOO_BIG = 1009
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class EventHub:
+    """
+    Thread-safe bridge between the detection loop and the API server.
+    publish_* may be called from any thread and never block on clients.
+    """
+
+    def __init__(self, recent=RECENT_EVENTS):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=recent)
+        self.status = {"started": time.time(), "running": False, "user": None}
+        self.loop = None  # Set once the server's event loop is running
+        self.ws_queues = set()
+        self.stream_clients = 0
+
+        self.frame = None
+        self.frame_seq = 0
+        self.frame_event = None
+        self.jpeg_seq = -1
+        self.jpeg = None
+        self.jpeg_future = None
+
+    def wants_frames(self):
+        """True while at least one MJPEG viewer is connected (skip annotating otherwise)."""
+        return self.stream_clients > 0
+
+    def update_status(self, **values):
+        with self.lock:
+            self.status.update(values)
+
+    def publish_frame(self, frame):
+        """Offer the latest annotated BGR frame. The array must not be modified afterwards."""
+        with self.lock:
+            self.frame = frame
+            self.frame_seq += 1
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._frame_ready)
+
+    def publish_event(self, kind, **data):
+        event = {"type": kind, "time": time.time()}
+        event.update(data)
+        with self.lock:
+            self.recent.append(event)
+        STATS.incr("api_events")
+        if self.loop is not None and self.ws_queues:
+            self.loop.call_soon_threadsafe(self._broadcast, event)
+        return event
+
+    def recent_events(self, limit=None, since=None):
+        with self.lock:
+            events = [e for e in self.recent if since is None or e["time"] > since]
+        return events[-limit:] if limit else events
+
+    # --- Event loop side ---
+
+    def _frame_ready(self):
+        event, self.frame_event = self.frame_event, asyncio.Event()
+        if event is not None:
+            event.set()
+
+    def _broadcast(self, event):
+        for q in self.ws_queues:
+            if q.full():
+                q.get_nowait()  # Drop the oldest event for this slow client
+                STATS.incr("api_events_dropped")
+            q.put_nowait(event)
+
+    async def wait_frame(self, timeout):
+        if self.frame_event is None:
+            self.frame_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self.frame_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def latest_jpeg(self):
+        """JPEG of the newest frame, encoded once and shared by every viewer."""
+        with self.lock:
+            frame, seq = self.frame, self.frame_seq
+        if frame is None:
+            return None
+        if seq == self.jpeg_seq:
+            return self.jpeg
+        if self.jpeg_future is None or self.jpeg_future[0] != seq:
+            loop = asyncio.get_running_loop()
+            self.jpeg_future = (seq, loop.run_in_executor(None, _encode_jpeg, frame))
+        data = await self.jpeg_future[1]
+        if seq > self.jpeg_seq:
+            self.jpeg_seq, self.jpeg = seq, data
+        return data
+
+
+def _encode_jpeg(frame):
+    import cv2
+    with STATS.time("encode"):
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return buf.tobytes() if ok else None
+
+
+def incident_event(incident, rules):
+    """Event payload for an alert incident (see alert_aggregator.Incident)."""
+    return {
+        "incident": incident.id,
+        "event_id": incident.event_id,
+        "user": incident.user,
+        "causes": list(incident.causes),
+        "messages": [rules.message(c) for c in incident.causes],
+        "severity": incident.severity,
+        "level": incident.level,
+        "alert_count": incident.alert_count
+    }
+
+
+class ApiServer:
+    """Asyncio HTTP server running on its own daemon thread."""
+
+    def __init__(self, hub, host=API_HOST, port=API_PORT):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Bind and serve in the background. Raises OSError if the port is taken."""
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.hub.loop = self.loop
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.hub.loop = None
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            parts = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(parts) < 2 or parts[0] != "GET":
+                await self._send(writer, 405, {"error": "method not allowed"})
+                return
+
+            url = urlsplit(parts[1])
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            STATS.incr("api_requests")
+            if url.path == "/status":
+                await self._send(writer, 200, self._status())
+            elif url.path == "/events":
+                limit = int(query.get("limit", 50))
+                since = float(query["since"]) if "since" in query else None
+                await self._send(writer, 200, self.hub.recent_events(limit, since))
+            elif url.path == "/stream.mjpg":
+                await self._stream(writer, query)
+            elif url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers)
+            elif url.path == "/":
+                await self._send(writer, 200, {"endpoints": ["/status", "/events", "/stream.mjpg", "/ws"]})
+            else:
+                await self._send(writer, 404, {"error": "not found"})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except ValueError as e:
+            await self._send(writer, 400, {"error": str(e)})
+        finally:
+            writer.close()
+
+    def _status(self):
+        with self.hub.lock:
+            status = dict(self.hub.status)
+        status.update({
+            "fps": round(STATS.fps(), 2),
+            "stream_clients": self.hub.stream_clients,
+            "websocket_clients": len(self.hub.ws_queues)
+        })
+        return status
+
+    async def _send(self, writer, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  503: "Service Unavailable"}.get(code, "")
+        writer.write(f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+
+    async def _stream(self, writer, query):
+        if self.hub.stream_clients >= MAX_STREAM_CLIENTS:
+            await self._send(writer, 503, {"error": "too many viewers"})
+            return
+        interval = 1.0 / min(max(float(query.get("fps", DEFAULT_STREAM_FPS)), 0.1), MAX_STREAM_FPS)
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        self.hub.stream_clients += 1
+        try:
+            sent_seq = 0
+            last_sent = 0.0
+            while True:
+                if self.hub.frame_seq == sent_seq and not await self.hub.wait_frame(KEEPALIVE_INTERVAL):
+                    continue
+                # Per-client rate limit; frames published meanwhile are skipped, not queued
+                delay = last_sent + interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                sent_seq = self.hub.frame_seq
+                jpeg = await self.hub.latest_jpeg()
+                if jpeg is None:
+                    continue
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                             + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+                last_sent = time.monotonic()
+                STATS.incr("api_frames_sent")
+        finally:
+            self.hub.stream_clients -= 1
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            raise ValueError("missing Sec-WebSocket-Key")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        events = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.hub.ws_queues.add(events)
+        receiver = asyncio.ensure_future(self._ws_receive(reader, writer))
+        try:
+            while not receiver.done():
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({getter, receiver}, timeout=KEEPALIVE_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    _ws_write(writer, 0x1, json.dumps(getter.result()).encode("utf-8"))
+                else:
+                    getter.cancel()
+                    if not done:
+                        _ws_write(writer, 0x9, b"")  # Ping idle connections
+                await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
+        finally:
+            self.hub.ws_queues.discard(events)
+            receiver.cancel()
+            try:
+                await receiver
+            except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+                pass  # Normal ways for a client to go away
+            except Exception as e:
+                print(f"WebSocket receive error: {e}")
+
+    async def _ws_receive(self, reader, writer):
+        """Handle control frames from the client; returns when it closes."""
+        while True:
+            head = await reader.readexactly(2)
+            opcode = head[0] & 0x0F
+            length = head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", await reader.readexactly(8))[0]
+            if length > MAX_WS_FRAME:
+                # Don't read it into memory: close with "message too big"
+                STATS.incr("api_ws_oversized_frames")
+                _ws_write(writer, 0x8, struct.pack(">H", WS_CLOSE_TOO_BIG))
+                return
+            mask = await reader.readexactly(4) if head[1] & 0x80 else b"\0\0\0\0"
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+            if opcode == 0x8:
+                _ws_write(writer, 0x8, payload[:2])
+                return
+            if opcode == 0x9:
+                _ws_write(writer, 0xA, payload)
+
+
+def _ws_write(writer, opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    writer.write(header + payload)
+
+
+def start_api_server(hub, host=API_HOST, port=API_PORT):
+    """Serve the API on a daemon thread. Returns the server or None on failure."""
+    try:
+        server = ApiServer(hub, host, port).start()
+    except OSError as e:
+        print(f"Could not start API server on {host}:{port}: {e}")
+        return None
+    print(f"API available at http://{host}:{port}/ (stream: /stream.mjpg, events: /ws)")
+    return server
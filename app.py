@@ -1,15 +1,31 @@
+import time  # For timing detection intervals
+APP_START_TIME = time.perf_counter()  # Reference point for startup timings
+
 import threading
+import uuid
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from ultralytics import YOLO
-import cv2
 from PIL import Image, ImageTk, ImageGrab
 import os
-import time  # For timing detection intervals
 import csv  # Import csv module for logging
-import pygame
-import face_recognition
-import requests
+from perf_stats import STATS, start_metrics_server
+from detector import CLASSES_OF_INTEREST, LiveDetector, get_model, load_profile, result_detections
+from alert_rules import RuleEngine
+from alert_aggregator import AlertAggregator, SEVERITY_ORDER
+from alert_audio import AlertAudio
+from log_writer import CSVLogWriter, log_files, open_log
+from analytics import AlertRollups, ROLLUP_FILE, render_dashboard
+from api_server import EventHub, incident_event, start_api_server
+from notifiers import Notification, start_delivery_engine
+from evidence import EvidenceStore, ClipRecorder
+from hard_examples import HardExampleStore
+from camera import CameraService
+from photo_gallery import Gallery, PhotoBatchJob, list_images
+from result_cache import ResultCache
+from resource_governor import ResourceGovernor
+
+# Heavy libraries (cv2, ultralytics, face_recognition, pygame, requests) are imported
+# inside the methods that use them so the login window appears immediately.
 
 # For Windows screenshot capturing
 try:
@@ -19,14 +35,28 @@ except ImportError:
 
 # Constants
 LOG_FILE = "detections_log.csv"
+LOG_HEADER = ["Time Detected", "Warning Cause", "Name"]
 USERS_DIR = "users"
 MAX_ENTRIES = 100  # Maximum number of log entries to display
 REFRESH_INTERVAL = 5000  # Auto-refresh interval in milliseconds (5 seconds)
-
-# Telegram Configuration
-# It's recommended to load these from environment variables for security
-TELEGRAM_BOT_TOKEN = '7694868786:AAEEir3nMZA4IMDUNFAxV-f_p--n9AygzYw'  # Replace with your new bot's token
-MANAGER_CHAT_ID = '1989750249'  # Replace with the manager's chat ID
+STATS_REFRESH_INTERVAL = 1000  # Refresh interval for the performance window (1 second)
+DASHBOARD_RANGES = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30}
+# Camera index, video file, or "synthetic" (format and resolution are negotiated in camera.py)
+CAMERA_SOURCE = 0
+# Login gives up when no enrolled face has matched within this many seconds
+LOGIN_TIMEOUT = 15.0
+# Let YOLO find the person first and search only their head for the face (uses the loaded model)
+FACE_SEARCH_IN_PERSON_BOXES = False
+# Read the camera in a separate process and hand frames over through shared memory
+CAPTURE_IN_SUBPROCESS = False
+# Load the model and the face index in the background while the login screen is shown
+PRELOAD_ON_STARTUP = True
+# Serve status, events and the annotated stream on http://127.0.0.1:8765 (see api_server.py)
+API_ENABLED = True
+# Keep each alert's raw frame and detections for supervisor review and retraining (see hard_examples.py)
+HARD_EXAMPLES_ENABLED = True
+# Cheap person-only check on every frame, full detector periodically or on activity (see cascade.py)
+CASCADE_MODE = False
 
 # Ensure USERS_DIR exists
 if not os.path.exists(USERS_DIR):
@@ -34,6 +64,9 @@ if not os.path.exists(USERS_DIR):
 
 class ObjectDetectionApp:
     def __init__(self, root):
+        # Thread pools are sized from the CPU budget before cv2/torch/dlib are first imported
+        self.governor = ResourceGovernor().start()
+
         self.root = root
         self.root.title("Remote Worker Control")
         
@@ -89,13 +122,50 @@ class ObjectDetectionApp:
         self.style.map("TButton",
                        background=[("active", "#E6E6E6")])
 
-        # Initialize pygame mixer for sounds
-        pygame.mixer.init()
+        # Model and input size of the active deployment profile (model_profiles.yaml)
+        self.model_path, self.predict_kwargs = load_profile()
+        # One camera shared by login, signup, photo capture and live detection (opened on first use)
+        self.camera = CameraService(CAMERA_SOURCE)
+
+        # Alert policy (per-class confidence, frames, window, cooldown, severity, message)
+        # from rules.yaml; edits to the file are picked up while detection runs
+        self.alert_rules = RuleEngine()
+        # Merges simultaneous alerts into incidents and applies per-user cooldowns
+        self.alert_aggregator = AlertAggregator(self.alert_rules)
+        # Alert sounds are loaded into memory once and played from their own thread
+        self.audio = AlertAudio()
+        # Telegram / webhook / e-mail / file notifications, routed by severity (notifiers.yaml)
+        self.notifier = start_delivery_engine()
+        # Buffered detection log shared by the detection thread and the Tk thread
+        self.log_writer = CSVLogWriter(LOG_FILE, LOG_HEADER)
+        # Hourly per-user, per-cause counters behind the dashboard
+        rollups_exist = os.path.exists(ROLLUP_FILE)
+        self.analytics = AlertRollups()
+        if not rollups_exist:
+            # One-time backfill from the existing log
+            cause_names = {rule.message: rule.name for rule in self.alert_rules.rules}
+            self.analytics.rebuild_in_background(LOG_FILE, cause_names)
+
+        # Deduplicated, size-bounded storage for screenshots, photos and alert clips
+        self.evidence = EvidenceStore()
+        self.clip_recorder = ClipRecorder(self.evidence)
+        # Results of uploaded photos/videos by content, so re-uploads skip inference
+        self.result_cache = ResultCache()
+        # Alert frames + detections in YOLO format, reviewed later and exported for fine-tuning
+        self.hard_examples = None
+        if HARD_EXAMPLES_ENABLED:
+            try:
+                self.hard_examples = HardExampleStore()
+            except Exception as e:
+                print(f"Hard-example collection disabled: {e}")
 
-        # Ensure the screenshots directory exists
-        self.screenshots_dir = "screenshots"
-        if not os.path.exists(self.screenshots_dir):
-            os.makedirs(self.screenshots_dir)
+        # Expose performance metrics (Prometheus format) on a local HTTP endpoint
+        self.metrics_server = start_metrics_server()
+        # Local API: detections/alerts for other services, live stream for supervisors
+        self.api_hub = EventHub()
+        self.api_server = start_api_server(self.api_hub) if API_ENABLED else None
+        self.stats_window = None
+        self.dashboard_window = None
 
         # Create frames
         self.create_frames()
@@ -110,7 +180,7 @@ class ObjectDetectionApp:
         self.stop = False
 
         # Classes of interest for warnings
-        self.classes_of_interest = ["cigaratte", "phone", "drowsy", "food"]
+        self.classes_of_interest = list(CLASSES_OF_INTEREST)
 
         # Track detection start times (None if not detected yet)
         self.detection_start_times = {
@@ -127,26 +197,42 @@ class ObjectDetectionApp:
         # Start auto-refresh for the side panel
         self.start_auto_refresh()
 
-        # Frame sayacı ve başlangıç zamanı için yapı
-        self.frame_counters = {
-            "cigaratte": 0,
-            "phone": 0,
-            "drowsy": 0,
-            "food": 0,
-            "no_person": 0,
-            "multiple_person": 0
-        }
-        self.start_times = {
-            "cigaratte": time.time(),
-            "phone": time.time(),
-            "drowsy": time.time(),
-            "food": time.time(),
-            "no_person": time.time(),
-            "multiple_person": time.time()
-        }
+        # Startup timing; preloading starts once the first window is on screen
+        self.first_detection_recorded = False
+        self.root.after(0, self.on_first_window)
 
-        self.alert_threshold = 200  # 1 dakika içinde 200 frame
-        self.reset_interval = 60    # Sayaçları sıfırlamak için 1 dakika
+    def on_first_window(self):
+        """Record time-to-first-window and start background preloading."""
+        elapsed = time.perf_counter() - APP_START_TIME
+        STATS.set_gauge("startup_first_window_seconds", round(elapsed, 3))
+        print(f"Time to first window: {elapsed:.2f}s")
+
+        if PRELOAD_ON_STARTUP:
+            threading.Thread(target=self.preload_model, daemon=True).start()
+            threading.Thread(target=self.preload_face_index, daemon=True).start()
+
+    def preload_model(self):
+        """Load and warm up the YOLO model while the user is at the login screen."""
+        if not os.path.exists(self.model_path):
+            return
+        start = time.perf_counter()
+        try:
+            get_model(self.model_path, warmup=True)
+            STATS.set_gauge("preload_model_seconds", round(time.perf_counter() - start, 3))
+            print(f"Model preloaded in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"Error preloading model: {e}")
+
+    def preload_face_index(self):
+        """Encode the enrolled users' faces ahead of the first login."""
+        start = time.perf_counter()
+        try:
+            from face_auth import get_face_index
+            get_face_index(USERS_DIR)
+            STATS.set_gauge("preload_face_index_seconds", round(time.perf_counter() - start, 3))
+            print(f"Face index preloaded in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"Error preloading face index: {e}")
 
     def create_frames(self):
         """Create frames for login/signup and main application."""
@@ -288,6 +374,30 @@ class ObjectDetectionApp:
         )
         self.logout_button.grid(row=2, column=1, padx=20, pady=10)
 
+        self.stats_button = ttk.Button(
+            button_frame,
+            text="Performance",
+            width=20,
+            command=self.show_stats_window
+        )
+        self.stats_button.grid(row=3, column=0, padx=20, pady=10)
+
+        self.dashboard_button = ttk.Button(
+            button_frame,
+            text="Dashboard",
+            width=20,
+            command=self.show_dashboard_window
+        )
+        self.dashboard_button.grid(row=3, column=1, padx=20, pady=10)
+
+        self.upload_folder_button = ttk.Button(
+            button_frame,
+            text="Upload Folder",
+            width=20,
+            command=self.upload_and_process_folder
+        )
+        self.upload_folder_button.grid(row=4, column=0, columnspan=2, padx=20, pady=10)
+
         # --- Footer Label ---
         footer_label = tk.Label(
             self.main_frame,
@@ -366,62 +476,145 @@ class ObjectDetectionApp:
             self.load_csv_data()
 
     def load_csv_data(self):
-        """Read the CSV file and populate the Treeview with the latest detections."""
-        log_file = LOG_FILE
+        """Read the CSV log (and its rotated copies if needed) and populate the Treeview with the latest detections."""
+        # Make sure rows still sitting in the writer's buffer are shown
+        self.log_writer.flush()
 
         # Clear any existing rows
         for row in self.log_tree.get_children():
             self.log_tree.delete(row)
 
-        # If the file doesn't exist yet, do nothing
-        if not os.path.exists(log_file):
-            print(f"Log file {log_file} does not exist.")
+        # If no log has been written yet, do nothing
+        paths = log_files(LOG_FILE)
+        if not paths:
+            print(f"Log file {LOG_FILE} does not exist.")
             self.status_label.config(text="Log file does not exist.")
             return
 
-        with open(log_file, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            try:
-                header = next(reader)
+        # Newest file first; after a rotation (e.g. at midnight) the archives fill up the panel
+        rows = []
+        for path in reversed(paths):
+            rows = self.read_log_rows(path) + rows
+            if len(rows) >= MAX_ENTRIES:
+                break
+        if not rows:
+            print("Log file is empty.")
+            self.status_label.config(text="Log file is empty.")
+            return
+
+        # Sort rows by timestamp
+        try:
+            rows.sort(key=lambda x: time.strptime(x[0], "%Y-%m-%d %H:%M:%S"))
+        except Exception as e:
+            print(f"Error sorting rows: {e}")
+
+        # Limit to the most recent MAX_ENTRIES
+        rows = rows[-MAX_ENTRIES:]
+
+        # Insert into Treeview
+        for row in rows:
+            self.log_tree.insert("", "end", values=row)
+
+        entry_count = len(rows)
+        self.status_label.config(text=f"Loaded {entry_count} entries.")
+
+        print(f"Loaded {entry_count} rows into the log tree.")
+
+    def read_log_rows(self, path):
+        """(time, cause, name) rows of one log file or archive."""
+        try:
+            with open_log(path) as file:
+                reader = csv.reader(file)
+                try:
+                    header = next(reader)
+                except StopIteration:
+                    return []  # Empty file
+                rows = []
                 # Normalize header for comparison
                 header_normalized = [h.strip().lower() for h in header]
                 expected_header = ["time detected", "warning cause", "name"]
                 if header_normalized != expected_header:
                     print("Header does not match expected format. Including the first row as data.")
                     # The first row is not a header; include it
-                    file.seek(0)
-                    reader = csv.reader(file)
-            except StopIteration:
-                # Empty file
-                print("Log file is empty.")
-                self.status_label.config(text="Log file is empty.")
+                    reader = [header] + list(reader)
+                for row in reader:
+                    if len(row) >= 3:
+                        rows.append((row[0], row[1], row[2]))
+                    else:
+                        print(f"Skipping malformed row: {row}")
+                return rows
+        except OSError as e:
+            # An archive can disappear while it is being compressed or pruned
+            print(f"Error reading {path}: {e}")
+            return []
+
+    def show_stats_window(self):
+        """Open (or focus) a window with live per-stage timings and counters."""
+        if self.stats_window is not None and tk.Toplevel.winfo_exists(self.stats_window):
+            self.stats_window.lift()
+            return
+
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("Performance")
+        self.stats_window.configure(bg="#343541")
+
+        stats_label = tk.Label(
+            self.stats_window,
+            text="",
+            font=("Courier", 11),
+            bg="#343541",
+            fg="white",
+            justify="left"
+        )
+        stats_label.pack(padx=20, pady=20)
+
+        def refresh():
+            if self.stats_window is None or not tk.Toplevel.winfo_exists(self.stats_window):
                 return
+            stats_label.config(text="\n".join(STATS.summary_lines()))
+            self.stats_window.after(STATS_REFRESH_INTERVAL, refresh)
 
-            rows = []
-            for row in reader:
-                if len(row) >= 3:
-                    time_detected, warning_cause, name = row[0], row[1], row[2]
-                    rows.append((time_detected, warning_cause, name))
-                else:
-                    print(f"Skipping malformed row: {row}")
+        def on_close():
+            self.stats_window.destroy()
+            self.stats_window = None
 
-            # Sort rows by timestamp
-            try:
-                rows.sort(key=lambda x: time.strptime(x[0], "%Y-%m-%d %H:%M:%S"))
-            except Exception as e:
-                print(f"Error sorting rows: {e}")
+        self.stats_window.protocol("WM_DELETE_WINDOW", on_close)
+        refresh()
+
+    def show_dashboard_window(self):
+        """Open (or focus) the analytics dashboard, drawn from the hourly rollups."""
+        if self.dashboard_window is not None and tk.Toplevel.winfo_exists(self.dashboard_window):
+            self.dashboard_window.lift()
+            return
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-            # Limit to the most recent MAX_ENTRIES
-            rows = rows[-MAX_ENTRIES:]
+        self.dashboard_window = tk.Toplevel(self.root)
+        self.dashboard_window.title("Dashboard")
+        self.dashboard_window.configure(bg="#343541")
 
-            # Insert into Treeview
-            for row in rows:
-                self.log_tree.insert("", "end", values=row)
+        range_var = tk.StringVar(value="Last 7 days")
+        range_box = ttk.Combobox(self.dashboard_window, textvariable=range_var,
+                                 values=list(DASHBOARD_RANGES), state="readonly", width=20)
+        range_box.pack(pady=(10, 0))
 
-            entry_count = len(rows)
-            self.status_label.config(text=f"Loaded {entry_count} entries.")
+        figure = Figure(figsize=(8, 9), dpi=100)
+        canvas = FigureCanvasTkAgg(figure, master=self.dashboard_window)
+        canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
 
-            print(f"Loaded {entry_count} rows into the log tree.")
+        def redraw(event=None):
+            with STATS.time("dashboard"):
+                render_dashboard(figure, self.analytics, days=DASHBOARD_RANGES[range_var.get()])
+                canvas.draw()
+
+        def on_close():
+            self.dashboard_window.destroy()
+            self.dashboard_window = None
+
+        range_box.bind("<<ComboboxSelected>>", redraw)
+        self.dashboard_window.protocol("WM_DELETE_WINDOW", on_close)
+        redraw()
 
     def start_auto_refresh(self):
         """Start the auto-refresh mechanism for the side panel."""
@@ -542,125 +735,139 @@ class ObjectDetectionApp:
 
     def detect_objects_in_video(self):
         """Continuously read from webcam, run YOLO, and display results."""
-        model_path = 'runs/train/bitirme/weights/best.pt'
+        import cv2
+
+        started = time.perf_counter()
+        model_path = self.model_path
         if not os.path.exists(model_path):
             messagebox.showerror("Error", f"Model file not found: {model_path}")
             return
 
-        model = YOLO(model_path)
-        cap = cv2.VideoCapture(0)
+        if CASCADE_MODE:
+            from cascade import CascadeDetector
+            detector = CascadeDetector(get_model(model_path), self.alert_rules, **self.predict_kwargs)
+        else:
+            detector = LiveDetector(get_model(model_path), self.alert_rules, **self.predict_kwargs)
+        if CAPTURE_IN_SUBPROCESS:
+            from frame_pool import SharedMemoryCapture
+            # The child opens the device itself; the shared service (e.g. kept open after login) lets go of it first
+            self.camera.close()
+            cap = SharedMemoryCapture(CAMERA_SOURCE)
+        else:
+            cap = self.camera.acquire()
         fps = cap.get(cv2.CAP_PROP_FPS)
         print(f"Camera FPS: {fps}")
+        STATS.set_gauge("camera_fps", fps)
         
         if not cap.isOpened():
+            cap.release()
             messagebox.showerror("Error", "Camera could not be opened.")
             return
 
+        self.api_hub.update_status(running=True, user=self.current_user)
+        # Over the CPU budget the loop slows down, but not below what the alert rules need
+        self.governor.set_min_fps(self.alert_rules.min_fps())
+        last_classes = None
+        loop_start = time.perf_counter()
         while not self.stop and cap.isOpened():
-            ret, frame = cap.read()
+            self.governor.throttle()
+            with STATS.time("capture"):
+                ret, frame = cap.read()
             if not ret:
                 print("Frame could not be captured.")
+                STATS.incr("capture_failures")
                 break
             
-            # Run YOLO prediction
-            results = model.predict(source=frame, show=False)
-            detected_classes = []
-
-            for box in results[0].boxes:
-                cls_id = int(box.cls[0])
-                conf = float(box.conf[0])  # Confidence score [0..1]
-                cls_name = model.names.get(cls_id, "unknown")
-                if conf >= 0.45:  # Sadece confidence skoru 0.45 üzerindeki sınıfları al
-                    detected_classes.append(cls_name)
-            
-            current_time = time.time()
-            
-            # İnsan tespiti sayacı ve zamanı güncelleme
-            if "person" not in detected_classes:
-              if self.frame_counters["no_person"] == 0:
-                self.start_times["no_person"] = current_time       
-              self.frame_counters["no_person"] += 1
-
-            if self.frame_counters["no_person"] != 0:
-              elapsed_time = current_time - self.start_times["no_person"]
-              if elapsed_time >= self.reset_interval:
-                  self.frame_counters["no_person"] = 0
-
-            if self.frame_counters["no_person"] >= self.alert_threshold:
-              self.play_alert_sound()
-              self.log_detection_to_csv("person_absent")
-              self.show_person_absent_warning()
-              self.frame_counters["no_person"] = 0  # Uyarı verdikten sonra sıfırla
-    
-            # Eğer birden fazla kişi tespit edilirse
-            person_count = detected_classes.count("person")
-            if person_count > 1:
-              if self.frame_counters["multiple_person"] == 0:
-                self.start_times["multiple_person"] = current_time       
-              self.frame_counters["multiple_person"] += 1
-
-              if self.frame_counters["multiple_person"] != 0:
-                elapsed_time = current_time - self.start_times["multiple_person"]
-                if elapsed_time >= self.reset_interval:
-                    self.frame_counters["multiple_person"] = 0
-
-              if self.frame_counters["multiple_person"] >= self.alert_threshold:
-                self.play_alert_sound()
-                self.log_detection_to_csv("multiple_person")
-                self.show_warning("multiple_person")
-                self.frame_counters["multiple_person"] = 0  # Uyarı verdikten sonra sıfırla
-
-            # Her sınıf için frame sayısını güncelle
-            for cls_name in self.classes_of_interest:
-                if cls_name in detected_classes:
-                  if self.frame_counters[cls_name] == 0:
-                    self.start_times[cls_name] = current_time       
-                  self.frame_counters[cls_name] += 1
-                  
-                if self.frame_counters[cls_name] != 0:
-                  # Eğer 1 dakika geçmişse sayaçları sıfırla
-                  elapsed_time = current_time - self.start_times[cls_name]
-                  if elapsed_time >= self.reset_interval:
-                      self.frame_counters[cls_name] = 0
-
-                # Eğer frame sayısı eşik değeri geçerse uyarı ver
-                if self.frame_counters[cls_name] >= self.alert_threshold:
-                    self.play_alert_sound()
-                    self.log_detection_to_csv(cls_name)
-                    self.show_warning(cls_name)
-                    self.frame_counters[cls_name] = 0  # Uyarı verdikten sonra sıfırla
-
-            annotated_frame = results[0].plot()
-            cv2.imshow("Video Processing", annotated_frame)
+            # Run YOLO prediction and update the per-class frame counters
+            result, detected_classes, fired = detector.process_frame(frame)
+            if not self.first_detection_recorded:
+                self.record_first_detection(started)
+
+            # Detection events only when the set of visible classes changes
+            classes = sorted(set(detected_classes))
+            if classes != last_classes:
+                self.api_hub.publish_event("detection", user=self.current_user, classes=classes)
+                last_classes = classes
+
+            incident = self.alert_aggregator.submit(fired, self.current_user, time.time())
+            if incident is not None:
+                self.handle_incident(incident)
+                if self.hard_examples is not None:
+                    self.hard_examples.submit(incident, frame, result, self.alert_rules)
+
+            with STATS.time("render"):
+                annotated_frame = result.plot()
+                self.draw_stats_overlay(annotated_frame)
+                cv2.imshow("Video Processing", annotated_frame)
+                key = cv2.waitKey(1) & 0xFF
+            # Keeps the last seconds around for pre-/post-alert clips
+            self.clip_recorder.push(annotated_frame)
+            # Shared by every API viewer; only JPEG-encoded while someone watches
+            if self.api_hub.wants_frames():
+                self.api_hub.publish_frame(annotated_frame)
+
+            STATS.tick_frame()
+
+            # Frames the camera produced while we were busy with this one are lost (estimate)
+            loop_end = time.perf_counter()
+            STATS.observe("frame", loop_end - loop_start)
+            if fps > 0:
+                missed = int((loop_end - loop_start) * fps) - 1
+                if missed > 0:
+                    STATS.incr("frames_dropped", missed)
+            loop_start = loop_end
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if key == ord('q'):
                 self.stop = True
                 break
 
         cap.release()
         cv2.destroyAllWindows()
-
-    def play_alert_sound(self):
-        """Plays the alert sound once."""
-        sound_file = "short_alert.wav"  # Replace with your sound file path
-        if os.path.exists(sound_file):
-            try:
-                pygame.mixer.music.load(sound_file)
-                pygame.mixer.music.play(loops=0)  # Play the file once
-            except pygame.error as e:
-                print(f"Error playing sound: {e}")
-        else:
-            print(f"Sound file not found: {sound_file}")
-
-    def show_warning(self, cls_name):
-        """Displays a warning pop-up for specific classes of interest."""
-        warning_messages = {
-            'cigaratte':  "Smoking is prohibited!",
-            'phone':      "Phone usage detected!",
-            'drowsy':     "Drowsy condition detected!",
-            'food':       "Eating detected!",
-            'multiple_person': "Multiple persons detected!"
-        }
+        # Clips of alerts shortly before stopping would otherwise wait for the next session
+        self.clip_recorder.flush()
+        self.api_hub.update_status(running=False)
+
+    def record_first_detection(self, started):
+        """Record time-to-first-detection, from app start and from the Start Video click."""
+        self.first_detection_recorded = True
+        now = time.perf_counter()
+        STATS.set_gauge("startup_first_detection_seconds", round(now - APP_START_TIME, 3))
+        STATS.set_gauge("first_detection_after_start_seconds", round(now - started, 3))
+        print(f"Time to first detection: {now - APP_START_TIME:.2f}s since launch, "
+              f"{now - started:.2f}s since Start Video")
+
+    def draw_stats_overlay(self, frame):
+        """Draw FPS and inference latency on the top-left corner of the frame."""
+        import cv2
+
+        snap = STATS.snapshot()
+        inference = snap["stages"]["inference"]
+        text = f"FPS {snap['fps']:.1f} | infer p50 {inference['p50'] * 1000:.0f} ms p99 {inference['p99'] * 1000:.0f} ms"
+        cv2.putText(frame, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(frame, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+
+    def handle_incident(self, incident):
+        """Run the alert side effects (sound, log + notifications, warning window) once per incident."""
+        top_cause = max(incident.causes, key=lambda c: SEVERITY_ORDER.get(self.alert_rules.severity(c), 0))
+        self.play_alert_sound(top_cause)
+        self.clip_recorder.trigger(incident.event_id, meta={"causes": incident.causes, "user": incident.user})
+        self.log_detection_to_csv(incident)
+        self.api_hub.publish_event("alert", **incident_event(incident, self.alert_rules))
+
+        if "person_absent" in incident.causes:
+            self.show_person_absent_warning()
+        other_causes = [c for c in incident.causes if c != "person_absent"]
+        if other_causes:
+            self.show_warning(other_causes)
+
+    def play_alert_sound(self, cls_name=None):
+        """Plays the alert sound once (non-blocking, rate-limited per class)."""
+        self.audio.play(cls_name)
+
+    def show_warning(self, causes):
+        """Displays a warning pop-up for one or more classes of interest."""
+        if isinstance(causes, str):
+            causes = [causes]
 
         # Avoid multiple stacked windows by checking if the existing one is open
         if self.warning_window is None or not tk.Toplevel.winfo_exists(self.warning_window):
@@ -677,15 +884,12 @@ class ObjectDetectionApp:
             )
 
             def on_close():
-                # Reset the timer and sound flag for this class
-                self.detection_start_times[cls_name] = None
-                self.sound_played[cls_name] = False
                 self.warning_window.destroy()
                 self.warning_window = None
 
             self.warning_window.protocol("WM_DELETE_WINDOW", on_close)
 
-            message_text = warning_messages.get(cls_name, "Unknown warning!")
+            message_text = "\n".join(self.alert_rules.message(c) for c in causes)
             warning_label = tk.Label(
                 self.warning_window,
                 text=message_text,
@@ -705,7 +909,7 @@ class ObjectDetectionApp:
 
     def show_person_absent_warning(self):
         """Displays a warning pop-up when no person is detected for 20 seconds."""
-        warning_text = "Person not present!"
+        warning_text = self.alert_rules.message("person_absent")
 
         # Avoid multiple stacked windows by checking if the existing one is open
         if self.person_absent_warning_window is None or not tk.Toplevel.winfo_exists(self.person_absent_warning_window):
@@ -742,47 +946,37 @@ class ObjectDetectionApp:
             close_button = ttk.Button(self.person_absent_warning_window, text="OK", command=on_close)
             close_button.pack(pady=20)
 
-    def log_detection_to_csv(self, cls_name):
+    def log_detection_to_csv(self, incident):
         """
-        Logs the detection event to a CSV file with the class type, timestamp, and user name.
-        Also sends a single Telegram message with both text and image.
+        Logs an incident to a CSV file with its cause(s), timestamp, and user name.
+        Also sends a single notification with both text and image.
         """
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-
-        # Mapping from class_name to warning messages
-        warning_messages = {
-            "cigaratte": "Smoking is prohibited!",
-            "phone": "Phone usage detected!",
-            "drowsy": "Drowsy condition detected!",
-            "food": "Eating detected!",
-            "person_absent": "Person not present!",
-            "multiple_person": "Multiple Persons Detected"
-        }
+        now = time.localtime()
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", now)
 
-        warning_cause = warning_messages.get(cls_name, "Unknown warning!")
+        # Merged alerts share one row: "Smoking is prohibited! | Phone usage detected!"
+        warning_cause = " | ".join(self.alert_rules.message(c) for c in incident.causes)
 
         entry = [timestamp, warning_cause, self.current_user if self.current_user else "Unknown"]
 
-        # Check if the file exists. If not, create it and write the header.
-        file_exists = os.path.exists(LOG_FILE)
-
         try:
-            with open(LOG_FILE, mode='a', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                if not file_exists:
-                    # Write the header if the file is new
-                    writer.writerow(["Time Detected", "Warning Cause", "Name"])
-                # Write the detection details
-                writer.writerow(entry)
+            # Buffered: the row reaches the disk with the next batch
+            self.log_writer.write(entry)
+            self.analytics.record(now, self.current_user, incident.causes)
             print(f"Logged detection: {warning_cause} at {timestamp} by {self.current_user}")
         except Exception as e:
             print(f"Error logging detection to CSV: {e}")
+        STATS.incr("alerts")
+
+        # Prepare the notification text
+        notification_text = f"**Message From Remote Controller Bot**\n**Warning Triggered:**\nTime: {timestamp}\nCause: {warning_cause}\nUser: {self.current_user if self.current_user else 'Unknown'}\nLevel: {incident.level} ({incident.severity} severity)"
 
-        # Prepare the Telegram message
-        telegram_message = f"**Message From Remote Controller Bot**\n**Warning Triggered:**\nTime: {timestamp}\nCause: {warning_cause}\nUser: {self.current_user if self.current_user else 'Unknown'}"
+        notification = Notification(notification_text, severity=incident.severity,
+                                    data=incident_event(incident, self.alert_rules))
 
-        # Start a thread to capture screenshot and send Telegram message with image and caption
-        threading.Thread(target=self.capture_screenshot_and_send_single_message, args=(warning_cause, timestamp, telegram_message), daemon=True).start()
+        # Start a thread to capture a screenshot and hand the notification (with the image) to the notifiers
+        STATS.add_gauge("screenshot_queue_depth", 1)
+        threading.Thread(target=self.capture_screenshot_and_notify, args=(notification,), daemon=True).start()
 
         # If the side panel is visible, update the Treeview in real-time
         if self.side_panel_visible:
@@ -821,10 +1015,8 @@ class ObjectDetectionApp:
         answer = messagebox.askyesno("Confirm Clear", "Are you sure you want to clear the CSV log?")
         if answer:
             try:
-                # Truncate the CSV file
-                with open(LOG_FILE, mode='w', newline='', encoding='utf-8') as file:
-                    writer = csv.writer(file)
-                    writer.writerow(["Time Detected", "Warning Cause", "Name"])  # Write header
+                # Truncate the CSV file (through the writer, so pending rows are dropped too)
+                self.log_writer.clear()
                 print("CSV log has been cleared.")
 
                 # Clear the Treeview
@@ -839,46 +1031,18 @@ class ObjectDetectionApp:
                 print(f"Error clearing CSV log: {e}")
                 messagebox.showerror("Error", f"An error occurred while clearing the CSV log: {e}")
 
-    def send_telegram_message(self, message):
-        """Send a text message to the manager via Telegram using direct HTTP requests."""
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
-        payload = {
-            'chat_id': MANAGER_CHAT_ID,
-            'text': message,
-            'parse_mode': 'Markdown'  # Optional: for formatting
-        }
-        try:
-            response = requests.post(url, data=payload)
-            if response.status_code == 200:
-                print("Telegram message sent successfully.")
-            else:
-                print(f"Failed to send Telegram message: {response.text}")
-        except requests.exceptions.RequestException as e:
-            print(f"Exception occurred while sending Telegram message: {e}")
-
-    def send_telegram_image(self, image_path, message):
-        """Send an image with a caption to the manager via Telegram using direct HTTP requests."""
-        url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto'
-        payload = {
-            'chat_id': MANAGER_CHAT_ID,
-            'caption': message,
-            'parse_mode': 'Markdown'  # Optional: for formatting
-        }
-        try:
-            with open(image_path, 'rb') as photo_file:
-                files = {'photo': photo_file}
-                response = requests.post(url, data=payload, files=files)
-                if response.status_code == 200:
-                    print("Telegram image sent successfully.")
-                else:
-                    print(f"Failed to send Telegram image: {response.text}")
-        except requests.exceptions.RequestException as e:
-            print(f"Exception occurred while sending Telegram image: {e}")
-
-    def capture_screenshot_and_send_single_message(self, warning_cause, timestamp, telegram_message):
+    def capture_screenshot_and_notify(self, notification):
         """
-        Captures a screenshot and sends it along with the Telegram message in one single message.
+        Captures a screenshot and sends it along with the notification text in one single message.
         """
+        try:
+            notification.image_path = self._capture_screenshot(notification.data.get("event_id"))
+        finally:
+            STATS.add_gauge("screenshot_queue_depth", -1)
+        self.notifier.submit(notification)
+
+    def _capture_screenshot(self, event_id=None):
+        """Screenshot the detection window into the evidence store; runs on the alert thread. Returns the path or None."""
         # Define the window title to capture
         window_title = "Video Processing"
 
@@ -891,7 +1055,7 @@ class ObjectDetectionApp:
                 hwnd = win32gui.FindWindow(None, window_title)
                 if hwnd == 0:
                     print(f"Window titled '{window_title}' not found.")
-                    return
+                    return None
 
                 # Get the window's bounding rectangle
                 left, top, right, bottom = win32gui.GetWindowRect(hwnd)
@@ -900,19 +1064,27 @@ class ObjectDetectionApp:
 
                 # Capture the screenshot
                 screenshot = ImageGrab.grab(bbox=(left, top, right, bottom))
-                screenshot_filename = f"{self.screenshots_dir}/screenshot_{int(time.time())}.png"
-                screenshot.save(screenshot_filename)
+                screenshot_filename = self.evidence.put_image(screenshot, event_id, kind="screenshot")
                 print(f"Screenshot saved: {screenshot_filename}")
-
-                # Send the screenshot with the message as a caption
-                self.send_telegram_image(screenshot_filename, telegram_message)
+                return screenshot_filename
             except Exception as e:
                 print(f"Error capturing screenshot: {e}")
         else:
             print("win32gui not available. Screenshot functionality is disabled on this platform.")
+        return None
+
+    def face_person_model(self):
+        """The shared YOLO model for the person pre-pass of face detection, or None."""
+        if FACE_SEARCH_IN_PERSON_BOXES and os.path.exists(self.model_path):
+            return get_model(self.model_path)
+        return None
 
     def signup_user(self):
-        """Handles the signup process: captures user's face and saves it."""
+        """Handles the signup process: captures several good frames of the user's face and saves a template."""
+        import cv2
+        from face_auth import (ENROLL_FRAMES, ENROLL_INTERVAL, StableFaceDetector, draw_face_status, encode_face,
+                               save_user_template, user_exists)
+
         # Prompt for user's name
         user_name = simpledialog.askstring("Signup", "Please enter your name:")
         if not user_name:
@@ -920,136 +1092,112 @@ class ObjectDetectionApp:
             return
 
         # Check if user already exists
-        user_image_path = os.path.join(USERS_DIR, f"{user_name}.jpg")
-        if os.path.exists(user_image_path):
+        if user_exists(user_name, USERS_DIR):
             messagebox.showwarning("Warning", "This username already exists.")
             return
 
         # Notify user to position their face in the webcam
-        messagebox.showinfo("Information", "Please position your face in front of the camera and press 'e'.")
+        messagebox.showinfo("Information", "Please look at the camera and hold still while a few pictures are taken.\n"
+                                           "Press 'q' to cancel.")
 
-        # Capture image from webcam
-        cap = cv2.VideoCapture(0)
+        # Capture several stable, sharp frames of exactly one face
+        cap = self.camera.acquire()
         if not cap.isOpened():
+            cap.release()
             messagebox.showerror("Error", "Camera could not be opened.")
             return
 
-        captured_image = None
-        while True:
+        tracker = StableFaceDetector(self.face_person_model())
+        encodings = []
+        reference_image = None
+        last_capture = 0.0
+        while len(encodings) < ENROLL_FRAMES:
             ret, frame = cap.read()
             if not ret:
                 messagebox.showerror("Error", "Frame could not be captured.")
                 break
 
-            cv2.imshow("Signup - Show Your Face", frame)
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('e'):
-                captured_image = frame
-                break
-            elif key == ord('q'):
+            status, rgb_image, location = tracker.update(frame)
+            now = time.perf_counter()
+            if status == "ready" and now - last_capture >= ENROLL_INTERVAL:
+                encodings.append(encode_face(rgb_image, [location]))
+                last_capture = now
+                if reference_image is None:
+                    reference_image = frame
+
+            display = frame.copy()
+            draw_face_status(display, status, location, f"{len(encodings)}/{ENROLL_FRAMES}")
+            cv2.imshow("Signup - Show Your Face", display)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
         cap.release()
         cv2.destroyAllWindows()
 
-        if captured_image is None:
+        if len(encodings) < ENROLL_FRAMES:
             messagebox.showwarning("Warning", "Photo could not be taken.")
             return
 
-        # Convert the image from BGR (OpenCV) to RGB (face_recognition)
-        rgb_image = cv2.cvtColor(captured_image, cv2.COLOR_BGR2RGB)
-
-        # Detect faces
-        face_locations = face_recognition.face_locations(rgb_image)
-        if len(face_locations) != 1:
-            messagebox.showerror("Error", "Please show exactly one face.")
-            return
-
-        # Save the image
+        # Save the template (all encodings) and a reference photo
         try:
-            cv2.imwrite(user_image_path, captured_image)
+            save_user_template(user_name, encodings, reference_image, USERS_DIR)
             messagebox.showinfo("Success", f"User '{user_name}' has been successfully registered.")
-            print(f"User {user_name} signed up with image at {user_image_path}")
+            print(f"User {user_name} signed up with {len(encodings)} face encodings")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred while saving the photo: {e}")
 
     def login_user(self):
-        """Handles the login process: captures current face and verifies it."""
+        """Handles the login process: captures the face as soon as it is steady and verifies it."""
+        import cv2
+        from face_auth import StableFaceDetector, draw_face_status, encode_face, find_matching_user
+
         # Notify user to position their face in the webcam
-        messagebox.showinfo("Information", "Please position your face in front of the camera and press 'e'.")
+        messagebox.showinfo("Information", "Please look at the camera. Press 'q' to cancel.")
 
-        # Capture image from webcam
-        cap = cv2.VideoCapture(0)
+        cap = self.camera.acquire()
         if not cap.isOpened():
+            cap.release()
             messagebox.showerror("Error", "Camera could not be opened.")
             return
 
-        captured_image = None
-        while True:
+        # Capture automatically once one sharp face is steady; retry until it matches or time runs out
+        tracker = StableFaceDetector(self.face_person_model())
+        started = time.perf_counter()
+        match = None
+        attempts = 0
+        cancelled = False
+        while time.perf_counter() - started < LOGIN_TIMEOUT:
             ret, frame = cap.read()
             if not ret:
                 messagebox.showerror("Error", "Frame could not be captured.")
+                cancelled = True
                 break
 
-            cv2.imshow("Login - Show Your Face", frame)
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('e'):
-                captured_image = frame
-                break
-            elif key == ord('q'):
+            status, rgb_image, location = tracker.update(frame)
+            if status == "ready":
+                attempts += 1
+                match = find_matching_user(encode_face(rgb_image, [location]), USERS_DIR)
+                if match:
+                    break
+                status = "unknown face"
+                tracker.reset()  # Wait for a new steady face before the next attempt
+
+            display = frame.copy()
+            draw_face_status(display, status, location)
+            cv2.imshow("Login - Show Your Face", display)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                cancelled = True
                 break
 
         cap.release()
         cv2.destroyAllWindows()
-
-        if captured_image is None:
-            messagebox.showwarning("Warning", "Photo could not be taken.")
-            return
-
-        # Convert the image from BGR (OpenCV) to RGB (face_recognition)
-        rgb_image = cv2.cvtColor(captured_image, cv2.COLOR_BGR2RGB)
-
-        # Detect faces
-        face_locations = face_recognition.face_locations(rgb_image)
-        if len(face_locations) != 1:
-            messagebox.showerror("Error", "Please show exactly one face.")
+        STATS.observe("login", time.perf_counter() - started)
+        STATS.set_gauge("login_attempts", attempts)
+        if cancelled:
             return
 
-        # Encode the captured face
-        captured_encoding = face_recognition.face_encodings(rgb_image, face_locations)[0]
-
-        # Initialize variables for matching
-        matches = []
-        matched_user = None
-
-        # Iterate over stored user images
-        for user_image_file in os.listdir(USERS_DIR):
-            if not user_image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                continue
-
-            user_name = os.path.splitext(user_image_file)[0]
-            user_image_path = os.path.join(USERS_DIR, user_image_file)
-
-            # Load user image
-            user_image = face_recognition.load_image_file(user_image_path)
-            user_face_locations = face_recognition.face_locations(user_image)
-            if len(user_face_locations) != 1:
-                print(f"User {user_name} has {len(user_face_locations)} faces in the image. Skipping.")
-                continue
-
-            # Encode user face
-            user_encoding = face_recognition.face_encodings(user_image, user_face_locations)[0]
-
-            # Compare faces
-            distance = face_recognition.face_distance([user_encoding], captured_encoding)[0]
-            tolerance = 0.6  # Lower is stricter
-            if distance < tolerance:
-                matches.append((user_name, distance))
-
-        if matches:
-            # Find the best match
-            matches.sort(key=lambda x: x[1])  # Sort by distance
-            matched_user = matches[0][0]
+        if match:
+            matched_user = match[0]
             messagebox.showinfo("Success", f"Welcome, {matched_user}!")
             print(f"User {matched_user} logged in successfully.")
 
@@ -1066,7 +1214,7 @@ class ObjectDetectionApp:
             self.main_frame.pack(fill='both', expand=True)
         else:
             messagebox.showerror("Error", "Authentication failed.")
-            print("Login failed: No matching user found.")
+            print(f"Login failed: No matching user found after {attempts} attempt(s).")
 
     def logout_user(self):
         """Handles the logout process: hides main_frame and shows login_frame."""
@@ -1082,26 +1230,20 @@ class ObjectDetectionApp:
         # Show the login_frame
         self.init_login_frame()
 
-    def generate_unique_filename(self, base_name, extension):
-        """Generate a unique filename by appending an increasing counter if needed."""
-        counter = 0
-        while True:
-            filename = f"{base_name}_{counter}{extension}" if counter > 0 else f"{base_name}{extension}"
-            if not os.path.exists(filename):
-                return filename
-            counter += 1
-
     def capture_and_save_result(self):
         """Capture a single image from the webcam, run YOLO, and show the result."""
-        model_path = 'runs/train/bitirme/weights/best.pt'
+        import cv2
+
+        model_path = self.model_path
         if not os.path.exists(model_path):
             messagebox.showerror("Error", f"Model file not found: {model_path}")
             return
 
-        model = YOLO(model_path)
-        cap = cv2.VideoCapture(0)
+        model = get_model(model_path)
+        cap = self.camera.acquire()
 
         if not cap.isOpened():
+            cap.release()
             messagebox.showerror("Error", "Camera could not be opened.")
             return
 
@@ -1127,9 +1269,8 @@ class ObjectDetectionApp:
             return  # No image captured
 
         # Save captured image
-        temp_image_path = self.generate_unique_filename("captured_image", ".jpg")
         try:
-            cv2.imwrite(temp_image_path, captured_image)
+            temp_image_path = self.evidence.put_image(captured_image, kind="capture")
             print(f"Photo saved: {temp_image_path}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred while saving the photo: {e}")
@@ -1137,10 +1278,10 @@ class ObjectDetectionApp:
 
         # Process the image with YOLO
         try:
-            results = model.predict(source=temp_image_path, show=False)
+            results = model.predict(source=captured_image, show=False, **self.predict_kwargs)
             annotated_frame = results[0].plot()
-            result_image_path = self.generate_unique_filename("result", ".jpg")
-            cv2.imwrite(result_image_path, annotated_frame)
+            result_image_path = self.evidence.put_image(annotated_frame, kind="result",
+                                                        meta={"source": temp_image_path})
             print(f"Result image saved: {result_image_path}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred while processing the image: {e}")
@@ -1161,8 +1302,9 @@ class ObjectDetectionApp:
 
         try:
             image = Image.open(image_path)
-            # Resize image for consistent display
-            image = image.resize((600, 400), Image.LANCZOS)
+            # Decode JPEGs at reduced size, then fit into 600x400 keeping the aspect ratio
+            image.draft("RGB", (600, 400))
+            image.thumbnail((600, 400), Image.LANCZOS)
             photo = ImageTk.PhotoImage(image)
         except Exception as e:
             print(f"Error loading image: {e}")
@@ -1178,30 +1320,41 @@ class ObjectDetectionApp:
         close_button.pack(pady=10)
 
     def upload_and_process_photo(self):
-        """Prompt user to select a photo, run YOLO, and display the result."""
-        model_path = 'runs/train/bitirme/weights/best.pt'
+        """Prompt user to select one or more photos, run YOLO, and display the result(s)."""
+        model_path = self.model_path
         if not os.path.exists(model_path):
             messagebox.showerror("Error", f"Model file not found: {model_path}")
             return
 
-        model = YOLO(model_path)
-        input_image_path = filedialog.askopenfilename(
-            title="Select a Photo",
+        input_image_paths = filedialog.askopenfilenames(
+            title="Select Photos",
             filetypes=(("Image Files", "*.jpg *.jpeg *.png"), ("All Files", "*.*"))
         )
 
-        if not input_image_path:
+        if not input_image_paths:
             print("No photo selected.")
             return
+        if len(input_image_paths) > 1:
+            self.process_photos(list(input_image_paths))
+            return
 
+        input_image_path = input_image_paths[0]
         print(f"Uploaded photo: {input_image_path}")
-        result_image_path = self.generate_unique_filename("result", ".jpg")
 
-        # Process the image
+        # Process the image, unless it was processed before with the same weights and settings
         try:
-            results = model.predict(source=input_image_path, show=False)
+            cache_key = self.result_cache.key(input_image_path, model_path, "photo", self.predict_kwargs)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                print(f"Result image (cached): {cached['outputs']['result']}")
+                self.display_image(cached["outputs"]["result"])
+                return
+            results = get_model(model_path).predict(source=input_image_path, show=False, **self.predict_kwargs)
             annotated_frame = results[0].plot()
-            cv2.imwrite(result_image_path, annotated_frame)
+            result_image_path = self.evidence.put_image(annotated_frame, kind="result",
+                                                        meta={"source": input_image_path})
+            self.result_cache.put(cache_key, "photo", input_image_path, {"result": result_image_path},
+                                  result_detections(results[0]))
             print(f"Result image saved: {result_image_path}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred while processing the image: {e}")
@@ -1209,14 +1362,59 @@ class ObjectDetectionApp:
 
         self.display_image(result_image_path)
 
+    def upload_and_process_folder(self):
+        """Prompt user to select a folder and process every photo in it."""
+        if not os.path.exists(self.model_path):
+            messagebox.showerror("Error", f"Model file not found: {self.model_path}")
+            return
+
+        folder = filedialog.askdirectory(title="Select a Folder of Photos")
+        if not folder:
+            print("No folder selected.")
+            return
+        paths = list_images([folder])
+        if not paths:
+            messagebox.showinfo("Information", f"No photos found in {folder}")
+            return
+        self.process_photos(paths)
+
+    def process_photos(self, paths):
+        """Run YOLO on many photos in the background and show the results in a gallery as they finish."""
+        print(f"Processing {len(paths)} photos...")
+        job = PhotoBatchJob(get_model(self.model_path), paths, self.evidence, cache=self.result_cache,
+                            model_path=self.model_path, **self.predict_kwargs).start()
+        gallery = Gallery(self.root, title=f"Results ({len(paths)} photos)", on_open=self.display_image)
+
+        def poll():
+            if gallery.closed:
+                job.cancel()
+                return
+            # Read before draining: results added after this check are picked up by the next poll
+            finished = job.done.is_set()
+            with job.lock:
+                new_results = job.results[len(gallery.items):]
+            for source_path, result_path, caption in new_results:
+                gallery.add(result_path, f"{os.path.basename(source_path)}: {caption}")
+            done, total = job.progress()
+            if finished:
+                failed = f", {len(job.failed)} could not be read" if job.failed else ""
+                gallery.set_status(f"{len(job.results)} of {total} photos processed{failed}. Click a photo to enlarge.")
+                print(f"Processed {len(job.results)} photos{failed}")
+                return
+            gallery.set_status(f"Processing... {done}/{total}")
+            self.root.after(200, poll)
+
+        poll()
+
     def upload_and_process_video(self):
         """Prompt user to select a video, run YOLO on it, and save the annotated output."""
-        model_path = 'runs/train/bitirme/weights/best.pt'
+        from video_jobs import VideoJob, find_resumable_job
+
+        model_path = self.model_path
         if not os.path.exists(model_path):
             messagebox.showerror("Error", f"Model file not found: {model_path}")
             return
 
-        model = YOLO(model_path)
         input_video_path = filedialog.askopenfilename(
             title="Select a Video",
             filetypes=(("Video Files", "*.mp4 *.avi *.mov"), ("All Files", "*.*"))
@@ -1227,43 +1425,69 @@ class ObjectDetectionApp:
             return
 
         print(f"Uploaded video: {input_video_path}")
-        result_video_path = self.generate_unique_filename("vid_result", ".mp4")
 
-        cap = cv2.VideoCapture(input_video_path)
-        if not cap.isOpened():
-            messagebox.showerror("Error", "Video could not be opened.")
+        # Re-encoding an annotated copy is the slow part on long recordings
+        write_video = messagebox.askyesnocancel(
+            "Output",
+            "Save an annotated video?\n\nChoose 'No' to only write the detections file (much faster)."
+        )
+        if write_video is None:
             return
 
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        fps = fps if fps > 0 else 25  # Default to 25 if FPS is not available
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out = cv2.VideoWriter(result_video_path, fourcc, fps, (width, height))
+        # The same video, weights and settings give the same result: show the stored one
+        cache_key = self.result_cache.key(input_video_path, model_path, "video",
+                                          {"write_video": write_video, **self.predict_kwargs})
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            outputs = cached["outputs"]
+            print(f"Video processed before, cached results: {', '.join(outputs.values())}")
+            if write_video:
+                messagebox.showinfo("Information", f"This video was processed before.\n"
+                                                   f"Result video: {outputs['video']}\nDetections: {outputs['detections']}")
+            else:
+                messagebox.showinfo("Information", f"This video was processed before.\nDetections: {outputs['detections']}")
+            return
 
-        print("Processing video. Press 'q' to exit.")
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        # Long videos are processed in checkpointed segments; offer to pick up where we left off
+        result_video_path = None
+        resume = False
+        previous_job = find_resumable_job(input_video_path, write_video)
+        if previous_job is not None:
+            done = len(previous_job["segments"])
+            resume = messagebox.askyesno("Resume",
+                                         f"This video was partially processed ({done} segment(s) done).\nResume?")
+            if resume:
+                result_video_path = previous_job["result_video_path"]
+        if result_video_path is None:
+            # Timestamped plus a random suffix, so results started in the same second never collide
+            result_video_path = time.strftime("vid_result_%Y%m%d-%H%M%S") + f"-{uuid.uuid4().hex[:6]}.mp4"
+
+        # Declining discards the earlier segments and starts over
+        job = VideoJob(input_video_path, result_video_path, write_video=write_video, resume=resume)
+        if write_video:
+            print("Processing video. Press 'q' to stop (progress is saved).")
+        else:
+            print("Processing video (detections only)...")
+        completed = job.run(model=get_model(model_path), show=write_video, **self.predict_kwargs)
 
-            try:
-                results = model.predict(source=frame, show=False)
-                annotated_frame = results[0].plot()
-                out.write(annotated_frame)
-                cv2.imshow("Video Processing", annotated_frame)
-            except Exception as e:
-                print(f"Error processing video frame with YOLO: {e}")
-                break
+        if not completed:
+            messagebox.showinfo("Information", "Video processing stopped. Upload the same video again to resume.")
+            return
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        outputs = {"detections": job.sidecar_path}
+        if write_video:
+            outputs["video"] = job.result_video_path
+        try:
+            self.result_cache.put(cache_key, "video", input_video_path, outputs)
+        except OSError as e:
+            print(f"Could not cache the video result: {e}")
 
-        cap.release()
-        out.release()
-        cv2.destroyAllWindows()
-        print(f"Result video saved: {result_video_path}")
-        messagebox.showinfo("Information", f"Result video saved: {result_video_path}")
+        if write_video:
+            print(f"Result video saved: {job.result_video_path}")
+            messagebox.showinfo("Information", f"Result video saved: {job.result_video_path}\nDetections: {job.sidecar_path}")
+        else:
+            print(f"Detections saved: {job.sidecar_path}")
+            messagebox.showinfo("Information", f"Detections saved: {job.sidecar_path}")
 
 # Main Application
 if __name__ == "__main__":
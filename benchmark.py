@@ -0,0 +1,914 @@
+"""
+Reproducible runtime benchmarks for the detection and alerting paths.
+Runs headless (no camera, no display) using FakeVideoCapture.
+
+    python benchmark.py run --suites live,video,login --face-image me.jpg
+    python benchmark.py compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+from perf_stats import PerfStats
+
+# Constants
+RESULTS_DIR = os.path.join("benchmarks", "results")
+DEFAULT_FRAMES = 300
+DEFAULT_WARMUP = 10
+DEFAULT_USERS = "1,10,50"
+DEFAULT_LOGIN_REPEATS = 5
+# Lower than the app's 200-frame threshold so short runs exercise the alert path
+DEFAULT_ALERT_THRESHOLD = 30
+DEFAULT_FRAME_SIZE = "1920x1080"  # Frame size for the frame handoff benchmark
+DEFAULT_LOG_ROWS = 5000  # Rows written by the log writer benchmark
+DEFAULT_LOG_THREADS = 4
+DEFAULT_NOTIFY_COUNT = 200  # Alerts pushed through the notification engine
+DEFAULT_NOTIFY_DELAY = 0.05  # Simulated service latency (seconds) in the notification stub
+DEFAULT_REMOTE_CLIENTS = 2  # Thin clients streaming to the in-process inference server
+DEFAULT_CAMERA_SOURCE = "synthetic"  # Camera index for the camera suite on a machine with a webcam
+DEFAULT_CAMERA_WORK_MS = 50.0  # Simulated per-frame processing in the camera suite
+DEFAULT_CAMERA_ACTIONS = 5  # Login/capture-style open-read-close cycles
+DEFAULT_PHOTO_COUNT = 48  # Photos processed by the photos suite
+DEFAULT_CPU_BUDGET = 0.5  # Share of the cores for the governed run of the governor suite
+DEFAULT_PRESENCE_IMGSZ = 224  # Input size of the presence stage in the cascade suite
+ALERT_MATCH_SECONDS = 5.0  # A cascade alert within this much clip time of an always-full alert recalls it
+COMPARE_KEYS = ["fps", "latency_p50_ms", "latency_p99_ms", "cpu_percent", "rss_peak_mb"]
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux only, None elsewhere)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return ordered[min(last, int(round(q * last)))]
+
+
+class ResourceMeter:
+    """Measures wall time, process CPU time and RSS around a block."""
+
+    def __enter__(self):
+        self.rss_start = current_rss_mb()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.wall_start
+        self.cpu = time.process_time() - self.cpu_start
+        self.rss_end = current_rss_mb()
+        return False
+
+    def report(self):
+        return {
+            "wall_seconds": self.wall,
+            "cpu_seconds": self.cpu,
+            # Can exceed 100 when several cores are busy
+            "cpu_percent": 100.0 * self.cpu / self.wall if self.wall > 0 else 0.0,
+            "rss_start_mb": self.rss_start,
+            "rss_end_mb": self.rss_end,
+            "rss_peak_mb": peak_rss_mb()
+        }
+
+
+def latency_report(latencies):
+    return {
+        "latency_mean_ms": 1000.0 * sum(latencies) / len(latencies) if latencies else 0.0,
+        "latency_p50_ms": 1000.0 * percentile(latencies, 0.5),
+        "latency_p99_ms": 1000.0 * percentile(latencies, 0.99)
+    }
+
+
+def stage_report(stats):
+    snap = stats.snapshot()
+    return {
+        stage: {"p50_ms": v["p50"] * 1000.0, "p99_ms": v["p99"] * 1000.0, "count": v["count"]}
+        for stage, v in snap["stages"].items() if v["count"]
+    }
+
+
+def predict_kwargs(args):
+    kwargs = {"verbose": False}
+    if args.device:
+        kwargs["device"] = args.device
+    if args.imgsz:
+        kwargs["imgsz"] = args.imgsz
+    return kwargs
+
+
+def bench_live(args, model, workdir):
+    """Live loop: fake camera -> YOLO -> alert logic -> CSV logging."""
+    from alert_rules import RuleEngine
+    from detector import LiveDetector
+    from fake_capture import FakeVideoCapture
+
+    stats = PerfStats(window=args.frames + args.warmup)
+    rules = RuleEngine(overrides={"frames": args.alert_threshold})
+    detector = LiveDetector(model, rules, stats=stats, **predict_kwargs(args))
+    cap = FakeVideoCapture(args.clip, num_frames=args.frames + args.warmup)
+    log_path = os.path.join(workdir, "detections_log.csv")
+
+    def on_alert(alert_name):
+        # Same work the app does per alert: one appended CSV row
+        with stats.time("logging"):
+            with open(log_path, mode='a', newline='', encoding='utf-8') as file:
+                csv.writer(file).writerow([time.strftime("%Y-%m-%d %H:%M:%S"), alert_name, "bench"])
+
+    for _ in range(args.warmup):
+        ret, frame = cap.read()
+        detector.process_frame(frame)
+    stats.reset()
+
+    latencies = []
+    alerts = 0
+    with ResourceMeter() as meter:
+        while True:
+            frame_start = time.perf_counter()
+            with stats.time("capture"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            result, detected_classes, fired = detector.process_frame(frame)
+            for alert_name in fired:
+                on_alert(alert_name)
+                alerts += 1
+            with stats.time("render"):
+                result.plot()
+            latencies.append(time.perf_counter() - frame_start)
+
+    report = {"frames": len(latencies), "alerts": alerts,
+              "fps": len(latencies) / meter.wall if meter.wall > 0 else 0.0}
+    report.update(latency_report(latencies))
+    report.update(meter.report())
+    report["stages"] = stage_report(stats)
+    return report
+
+
+def bench_video(args, model, workdir):
+    """Offline path used by upload_and_process_video, without the preview window."""
+    from detector import process_video_file
+    from fake_capture import write_synthetic_clip
+
+    clip = args.clip or write_synthetic_clip(os.path.join(workdir, "clip.mp4"), num_frames=args.frames)
+    output = None if args.sidecar_only else os.path.join(workdir, "vid_result.mp4")
+    sidecar = os.path.join(workdir, "vid_result.jsonl")
+    stats = PerfStats(window=max(args.frames, 1) * 10)
+
+    with ResourceMeter() as meter:
+        frames = process_video_file(model, clip, output, sidecar, show=False, stats=stats, **predict_kwargs(args))
+    frames = frames or 0
+
+    latencies = list(stats.timers["frame"].samples) if "frame" in stats.timers else []
+    report = {"frames": frames, "fps": frames / meter.wall if meter.wall > 0 else 0.0,
+              "annotated_video": output is not None}
+    report.update(latency_report(latencies))
+    report.update(meter.report())
+    report["stages"] = stage_report(stats)
+    return report
+
+
+def bench_login(args, workdir):
+    """Face login against N enrolled users (copies of one reference image)."""
+    import cv2
+    from face_auth import detect_faces, encode_face, find_matching_user
+
+    if not args.face_image:
+        print("Skipping login suite: pass --face-image with a photo of exactly one face.")
+        return None
+
+    probe = cv2.imread(args.face_image)
+    if probe is None:
+        print(f"Could not read face image: {args.face_image}")
+        return None
+
+    # Face detection alone: HOG on the full frame (the old path) vs the downscaled search
+    import face_recognition
+    full_frame, downscaled = [], []
+    for _ in range(args.login_repeats):
+        start = time.perf_counter()
+        face_recognition.face_locations(cv2.cvtColor(probe, cv2.COLOR_BGR2RGB))
+        full_frame.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        detect_faces(probe)
+        downscaled.append(time.perf_counter() - start)
+    results = {"detect": {"full_frame_ms": 1000.0 * sum(full_frame) / len(full_frame),
+                          "downscaled_ms": 1000.0 * sum(downscaled) / len(downscaled)}}
+    for n_users in [int(n) for n in args.users.split(",") if n.strip()]:
+        users_dir = os.path.join(workdir, f"users_{n_users}")
+        os.makedirs(users_dir, exist_ok=True)
+        for i in range(n_users):
+            shutil.copyfile(args.face_image, os.path.join(users_dir, f"user_{i}.jpg"))
+
+        latencies = []
+        with ResourceMeter() as meter:
+            for _ in range(args.login_repeats):
+                start = time.perf_counter()
+                rgb_image, face_locations = detect_faces(probe)
+                if len(face_locations) != 1:
+                    print("The face image must contain exactly one face.")
+                    return None
+                find_matching_user(encode_face(rgb_image, face_locations), users_dir)
+                latencies.append(time.perf_counter() - start)
+
+        # The first login builds the face index; later ones reuse cached encodings
+        report = {"logins": len(latencies), "first_login_ms": 1000.0 * latencies[0] if latencies else 0.0}
+        report.update(latency_report(latencies))
+        report.update(meter.report())
+        results[str(n_users)] = report
+    return results
+
+
+def _queue_producer(frames_queue, shape, count):
+    import numpy as np
+    frame = np.full(shape, 127, dtype=np.uint8)
+    for index in range(count):
+        frames_queue.put((frame, {"index": index}))  # Pickled and copied through a pipe
+    frames_queue.put((None, None))
+
+
+def _pool_producer(pool, shape, count):
+    import numpy as np
+    frame = np.full(shape, 127, dtype=np.uint8)
+    for index in range(count):
+        slot = pool.acquire()
+        np.copyto(pool.buffer(slot), frame)  # Stands in for decoding into the slot
+        pool.publish(slot, {"index": index})
+    pool.publish(-1, {"end": True})
+
+
+def bench_framepool(args):
+    """Cross-process frame handoff: pickled multiprocessing.Queue vs SharedFramePool."""
+    import multiprocessing as mp
+    from frame_pool import SharedFramePool
+
+    width, height = (int(v) for v in args.frame_size.lower().split("x"))
+    shape = (height, width, 3)
+    count = args.frames
+    frame_mb = width * height * 3 / (1024.0 * 1024.0)
+    ctx = mp.get_context("spawn")
+    results = {}
+
+    # Baseline: frames copied through a queue
+    frames_queue = ctx.Queue(maxsize=8)
+    producer = ctx.Process(target=_queue_producer, args=(frames_queue, shape, count))
+    with ResourceMeter() as meter:
+        producer.start()
+        received = 0
+        while True:
+            frame, meta = frames_queue.get()
+            if frame is None:
+                break
+            int(frame[::64, ::64].sum())  # Touch the pixels like a consumer would
+            received += 1
+        producer.join()
+    results["queue"] = {"frames": received, "fps": received / meter.wall, "mb_per_s": received * frame_mb / meter.wall}
+    results["queue"].update(meter.report())
+
+    # Shared memory: only slot indices cross the boundary
+    pool = SharedFramePool(shape, ctx=ctx)
+    producer = ctx.Process(target=_pool_producer, args=(pool, shape, count))
+    try:
+        with ResourceMeter() as meter:
+            producer.start()
+            received = 0
+            while True:
+                slot, meta = pool.get()
+                if slot < 0:
+                    break
+                frame = pool.buffer(slot)
+                int(frame[::64, ::64].sum())
+                pool.release(slot)
+                received += 1
+            producer.join()
+    finally:
+        pool.close()
+    results["shared_memory"] = {"frames": received, "fps": received / meter.wall,
+                                "mb_per_s": received * frame_mb / meter.wall}
+    results["shared_memory"].update(meter.report())
+
+    results["speedup"] = results["shared_memory"]["fps"] / results["queue"]["fps"] if results["queue"]["fps"] else None
+    return results
+
+
+def bench_governor(args, model):
+    """
+    The live loop flat out with library-default thread pools, then under the
+    resource governor: CPU use against the budget, and what it costs in FPS.
+    """
+    import cv2
+    import torch
+    from alert_rules import RuleEngine
+    from detector import LiveDetector
+    from fake_capture import FakeVideoCapture
+    from resource_governor import ResourceGovernor
+
+    default_threads = (torch.get_num_threads(), cv2.getNumThreads())
+    results = {}
+    for phase in ("ungoverned", "governed"):
+        stats = PerfStats(window=args.frames + args.warmup)
+        rules = RuleEngine(overrides={"frames": args.alert_threshold})
+        detector = LiveDetector(model, rules, stats=stats, **predict_kwargs(args))
+        cap = FakeVideoCapture(args.clip, num_frames=args.frames + args.warmup)
+        governor = None
+        if phase == "governed":
+            # Shorter control interval so the loop settles within a benchmark-sized run
+            governor = ResourceGovernor(args.cpu_budget, interval=0.5, stats=stats).start()
+        for _ in range(args.warmup):
+            ret, frame = cap.read()
+            detector.process_frame(frame)
+
+        frames = 0
+        with ResourceMeter() as meter:
+            while True:
+                if governor is not None:
+                    governor.throttle()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                detector.process_frame(frame)
+                stats.tick_frame()
+                frames += 1
+
+        result = {"frames": frames, "fps": frames / meter.wall if meter.wall > 0 else 0.0,
+                  "cpu_cores": meter.cpu / meter.wall if meter.wall > 0 else 0.0,
+                  "torch_threads": torch.get_num_threads(), "opencv_threads": cv2.getNumThreads()}
+        result.update(meter.report())
+        if governor is not None:
+            governor.stop()
+            snap = stats.snapshot()
+            result["budget_cores"] = governor.cores
+            result["frames_throttled"] = snap["counters"].get("frames_throttled", 0)
+            result["frame_interval_ms"] = snap["gauges"].get("governor_frame_interval_ms", 0.0)
+        results[phase] = result
+
+    torch.set_num_threads(default_threads[0])
+    cv2.setNumThreads(default_threads[1])
+    return results
+
+
+def bench_cascade(args, model):
+    """
+    The live loop with the full detector on every frame against cascade mode on
+    the same frames: CPU time, and how many of the always-full alerts the cascade
+    also raises (same rule, within ALERT_MATCH_SECONDS of simulated clip time).
+    """
+    from alert_rules import RuleEngine
+    from cascade import CascadeDetector
+    from detector import LiveDetector, get_model
+    from fake_capture import FakeVideoCapture
+
+    cap = FakeVideoCapture(args.clip, num_frames=args.frames + args.warmup)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    warmup, frames = frames[:args.warmup], frames[args.warmup:]
+
+    # Warm up both input sizes, so neither phase pays for lazy initialisation
+    kwargs = predict_kwargs(args)
+    for frame in warmup:
+        model.predict(source=frame, show=False, **kwargs)
+        presence_model = get_model(args.presence_model) if args.presence_model else model
+        presence_model.predict(source=frame, show=False, **dict(kwargs, imgsz=args.presence_imgsz))
+
+    results = {}
+    alerts = {}
+    for phase in ("always_full", "cascade"):
+        stats = PerfStats(window=len(frames))
+        rules = RuleEngine(overrides={"frames": args.alert_threshold})
+        if phase == "cascade":
+            detector = CascadeDetector(model, rules, stats=stats, presence_model=args.presence_model,
+                                       presence_imgsz=args.presence_imgsz, **kwargs)
+        else:
+            detector = LiveDetector(model, rules, stats=stats, **kwargs)
+
+        # Alerts are timed on the clip's clock
+        fired_alerts = []
+        with ResourceMeter() as meter:
+            for index, frame in enumerate(frames):
+                clip_time = index / cap.fps
+                _, _, fired = detector.process_frame(frame, current_time=clip_time)
+                fired_alerts.extend((name, clip_time) for name in fired)
+        alerts[phase] = fired_alerts
+        counters = stats.snapshot()["counters"]
+        result = {"frames": len(frames), "alerts": len(fired_alerts),
+                  "fps": len(frames) / meter.wall if meter.wall > 0 else 0.0,
+                  "cpu_ms_per_frame": 1000.0 * meter.cpu / max(1, len(frames))}
+        if phase == "cascade":
+            result["full_frames"] = counters.get("cascade_full_frames", 0)
+            result["full_frame_share"] = result["full_frames"] / max(1, len(frames))
+            result["full_reasons"] = {name[len("cascade_full_"):]: count for name, count in counters.items()
+                                      if name.startswith("cascade_full_") and name != "cascade_full_frames"}
+        result.update(meter.report())
+        result["stages"] = stage_report(stats)
+        results[phase] = result
+
+    # Each always-full alert is recalled by at most one cascade alert of the same rule
+    unmatched = list(alerts["cascade"])
+    matched = 0
+    for name, when in alerts["always_full"]:
+        for candidate in unmatched:
+            if candidate[0] == name and abs(candidate[1] - when) <= ALERT_MATCH_SECONDS:
+                unmatched.remove(candidate)
+                matched += 1
+                break
+    full_cpu, cascade_cpu = results["always_full"]["cpu_seconds"], results["cascade"]["cpu_seconds"]
+    results["comparison"] = {
+        "cpu_saving_percent": 100.0 * (1.0 - cascade_cpu / full_cpu) if full_cpu > 0 else 0.0,
+        "alerts_matched": matched,
+        "alert_recall": matched / len(alerts["always_full"]) if alerts["always_full"] else 1.0,
+        "extra_alerts": len(unmatched)
+    }
+    return results
+
+
+def bench_photos(args, model, workdir):
+    """
+    Spot-check photos one at a time as the old upload did (predict on the path,
+    plot, save, full-size decode and resize to show) against the batch job and
+    draft-mode thumbnails, then upload the same photos again (result cache hits).
+    """
+    import cv2
+    from PIL import Image
+    from evidence import EvidenceStore
+    from fake_capture import FakeVideoCapture
+    from photo_gallery import PhotoBatchJob, load_thumbnail
+    from result_cache import ResultCache
+
+    photo_dir = os.path.join(workdir, "photos")
+    os.makedirs(photo_dir, exist_ok=True)
+    cap = FakeVideoCapture(args.clip, num_frames=args.photo_count)
+    paths = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        paths.append(os.path.join(photo_dir, f"photo_{len(paths):04d}.jpg"))
+        cv2.imwrite(paths[-1], frame)
+    kwargs = predict_kwargs(args)
+    results = {}
+    model.predict(source=paths[0], show=False, **kwargs)  # Warm-up
+
+    store = EvidenceStore(os.path.join(workdir, "photos_old"))
+    with ResourceMeter() as meter:
+        for path in paths:
+            result = model.predict(source=path, show=False, **kwargs)[0]
+            result_path = store.put_image(result.plot(), kind="result")
+            Image.open(result_path).resize((600, 400), Image.LANCZOS)
+    results["one_by_one"] = {"photos": len(paths), "photos_per_s": len(paths) / meter.wall}
+    results["one_by_one"].update(meter.report())
+
+    store = EvidenceStore(os.path.join(workdir, "photos_batched"))
+    cache = ResultCache(os.path.join(workdir, "photos_cache"))
+    job_kwargs = {k: v for k, v in kwargs.items() if k != "verbose"}
+    job = PhotoBatchJob(model, paths, store, cache=cache, model_path=args.model, **job_kwargs)
+    with ResourceMeter() as meter:
+        job.run()
+        for _, result_path, _ in job.results:
+            load_thumbnail(result_path)
+    results["batched"] = {"photos": len(job.results), "photos_per_s": len(job.results) / meter.wall,
+                          "failed": len(job.failed)}
+    results["batched"].update(meter.report())
+
+    # The same photos again: content hashes match, inference is skipped
+    job = PhotoBatchJob(model, paths, store, cache=cache, model_path=args.model, **job_kwargs)
+    with ResourceMeter() as meter:
+        job.run()
+    results["repeat_upload"] = {"photos": len(job.results), "photos_per_s": len(job.results) / meter.wall}
+    results["repeat_upload"].update(meter.report())
+    cache.close()
+
+    # Gallery cost per photo: full decode + resize vs draft-mode thumbnail
+    start = time.perf_counter()
+    for _, result_path, _ in job.results:
+        Image.open(result_path).resize((600, 400), Image.LANCZOS)
+    full_ms = 1000.0 * (time.perf_counter() - start) / max(1, len(job.results))
+    start = time.perf_counter()
+    for _, result_path, _ in job.results:
+        load_thumbnail(result_path)
+    thumb_ms = 1000.0 * (time.perf_counter() - start) / max(1, len(job.results))
+    results["thumbnail"] = {"full_decode_ms": full_ms, "draft_thumbnail_ms": thumb_ms}
+    return results
+
+
+def bench_camera(args):
+    """
+    Per-action device open (the old code path) vs the shared camera service, and
+    the age of the frames a slow consumer gets from the service.
+    """
+    import cv2
+    from camera import CameraService
+
+    source = args.camera_source
+    results = {}
+
+    # Before: every login/capture opened the device with driver defaults and closed it again
+    first_frame = []
+    for _ in range(args.camera_actions):
+        start = time.perf_counter()
+        if source == "synthetic":
+            from fake_capture import FakeVideoCapture
+            cap = FakeVideoCapture(realtime=True)
+        else:
+            cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+        ret, _ = cap.read()
+        first_frame.append(time.perf_counter() - start)
+        cap.release()
+        if not ret:
+            print(f"Camera source could not be read: {source}")
+            return None
+    results["reopen"] = {"first_frame_mean_ms": 1000.0 * sum(first_frame) / len(first_frame),
+                         "first_frame_max_ms": 1000.0 * max(first_frame)}
+
+    stats = PerfStats(window=max(args.frames, 1))
+    service = CameraService(source, stats=stats)
+    try:
+        first_frame = []
+        for _ in range(args.camera_actions):
+            start = time.perf_counter()
+            with service.acquire() as cap:
+                cap.read()
+            first_frame.append(time.perf_counter() - start)
+        results["shared"] = {"first_frame_mean_ms": 1000.0 * sum(first_frame) / len(first_frame),
+                             "first_frame_max_ms": 1000.0 * max(first_frame),
+                             "negotiated": service.negotiated}
+
+        # A consumer slower than the camera: frames are skipped rather than queued
+        stats.reset()
+        with ResourceMeter() as meter, service.acquire() as cap:
+            for _ in range(args.frames):
+                ret, _ = cap.read()
+                if not ret:
+                    break
+                time.sleep(args.camera_work_ms / 1000.0)
+        snap = stats.snapshot()
+        age = snap["stages"]["camera_frame_age"]
+        results["slow_consumer"] = {"frames": age["count"], "fps": age["count"] / meter.wall,
+                                    "latency_p50_ms": 1000.0 * age["p50"], "latency_p99_ms": 1000.0 * age["p99"],
+                                    "frames_skipped": snap["counters"].get("camera_frames_skipped", 0)}
+        results["slow_consumer"].update(meter.report())
+    finally:
+        service.close()
+    return results
+
+
+def bench_logwriter(args, workdir):
+    """Detection log writes during an alert burst: open/append/close per row vs CSVLogWriter."""
+    import threading
+    from log_writer import CSVLogWriter
+
+    header = ["Time Detected", "Warning Cause", "Name"]
+    per_thread = max(1, args.log_rows // args.log_threads)
+    results = {}
+
+    def burst(write_row):
+        latencies = []
+        lock = threading.Lock()
+
+        def producer(thread_id):
+            local = []
+            for index in range(per_thread):
+                start = time.perf_counter()
+                write_row([time.strftime("%Y-%m-%d %H:%M:%S"), "Phone usage detected!", f"user{thread_id}_{index}"])
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=producer, args=(i,)) for i in range(args.log_threads)]
+        with ResourceMeter() as meter:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        report = {"rows": len(latencies), "rows_per_s": len(latencies) / meter.wall}
+        report.update(latency_report(latencies))
+        report.update(meter.report())
+        return report
+
+    # Baseline: the old per-row open/append/close
+    naive_path = os.path.join(workdir, "naive_log.csv")
+    naive_lock = threading.Lock()
+
+    def naive_write(row):
+        with naive_lock:
+            file_exists = os.path.exists(naive_path)
+            with open(naive_path, mode='a', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                if not file_exists:
+                    writer.writerow(header)
+                writer.writerow(row)
+
+    results["naive"] = burst(naive_write)
+
+    buffered = CSVLogWriter(os.path.join(workdir, "buffered_log.csv"), header)
+    try:
+        results["buffered"] = burst(buffered.write)
+    finally:
+        buffered.close()
+
+    naive_rate = results["naive"]["rows_per_s"]
+    results["speedup"] = results["buffered"]["rows_per_s"] / naive_rate if naive_rate else None
+    return results
+
+
+def bench_notify(args, workdir):
+    """Alert burst through DeliveryEngine into the local Telegram/webhook/SMTP stub."""
+    from notifiers import DeliveryEngine, Notification, build_notifiers
+    from notify_stub import NotifyStub
+
+    stats = PerfStats()
+    stub = NotifyStub(http_port=0, smtp_port=0, delay=args.notify_delay).start()
+    notifiers, routes = build_notifiers(stub.notifier_config(os.path.join(workdir, "notifications.jsonl")))
+    engine = DeliveryEngine(notifiers, routes, max_pending=args.notify_count * len(notifiers), stats=stats)
+    try:
+        with ResourceMeter() as meter:
+            deliveries = 0
+            for index in range(args.notify_count):
+                deliveries += engine.submit(Notification(f"Benchmark alert {index}", severity="high"))
+            engine.flush()
+    finally:
+        engine.close()
+        stub.stop()
+
+    snap = stats.snapshot()
+    report = {
+        "notifications": args.notify_count,
+        "deliveries": deliveries,
+        "sent": snap["counters"].get("notify_sent", 0),
+        "failures": snap["counters"].get("notify_failures", 0),
+        "deliveries_per_s": deliveries / meter.wall if meter.wall > 0 else 0.0,
+        # Far fewer connections than deliveries means keep-alive reuse works
+        "stub_connections": stub.recorder.snapshot()["connections"]
+    }
+    report.update(meter.report())
+    report["stages"] = stage_report(stats)
+    return report
+
+
+def bench_remote(args, model):
+    """Thin clients -> InferenceServer on localhost: bandwidth, gating and round-trip latency."""
+    import threading
+    import cv2
+    from fake_capture import FakeVideoCapture
+    from remote_inference import InferenceServer, RemoteInferenceClient, SEND_WIDTH, START_QUALITY
+
+    stats = PerfStats(window=args.frames * args.remote_clients)
+    server = InferenceServer(model, port=0, stats=stats, **predict_kwargs(args)).start()
+    reports = {}
+    lock = threading.Lock()
+
+    def run_client(index):
+        client_stats = PerfStats(window=args.frames)
+        client = RemoteInferenceClient(port=server.port, user=f"bench{index}", stats=client_stats)
+        cap = FakeVideoCapture(args.clip, num_frames=args.frames, realtime=True, seed=index)
+        baseline_bytes = 0
+        start = time.perf_counter()
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if client.submit(frame) != "dropped":
+                # What sending every processed frame as a full JPEG would have cost
+                small = cv2.resize(frame, (SEND_WIDTH, int(frame.shape[0] * SEND_WIDTH / frame.shape[1])))
+                baseline_bytes += len(cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, START_QUALITY])[1])
+        deadline = time.perf_counter() + 5.0
+        while client.in_flight and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        client.close()
+        report = {
+            "frames": args.frames,
+            "counts": dict(client.counts),
+            "kbps": client.bytes_sent * 8 / 1000.0 / elapsed,
+            "bytes_per_sent_frame": client.bytes_sent / max(1, args.frames - client.counts["dropped"]),
+            "bandwidth_vs_full_jpeg": client.bytes_sent / baseline_bytes if baseline_bytes else None
+        }
+        report.update(latency_report(client.latencies))
+        with lock:
+            reports[f"client{index}"] = report
+
+    threads = [threading.Thread(target=run_client, args=(i,)) for i in range(args.remote_clients)]
+    try:
+        with ResourceMeter() as meter:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        server.stop()
+
+    snap = stats.snapshot()
+    results = dict(reports)
+    results["server"] = {
+        "frames": snap["counters"].get("frames_processed", 0),
+        "batches": snap["counters"].get("remote_batches", 0),
+        "fps": snap["counters"].get("frames_processed", 0) / meter.wall if meter.wall > 0 else 0.0,
+        "stages": stage_report(stats)
+    }
+    results["server"].update(meter.report())
+    return results
+
+
+def environment_info(args):
+    info = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model": args.model,
+        "device": args.device or "default",
+        "imgsz": args.imgsz,
+        "clip": args.clip or "synthetic"
+    }
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True)
+        info["commit"] = commit.stdout.strip() or None
+        info["dirty"] = bool(dirty.stdout.strip())
+    except OSError:
+        info["commit"] = None
+    for module in ("cv2", "torch", "ultralytics"):
+        try:
+            info[f"{module}_version"] = __import__(module).__version__
+        except Exception:
+            info[f"{module}_version"] = None
+    return info
+
+
+def run(args):
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    report = {"environment": environment_info(args), "suites": {}}
+
+    model = None
+    if any(suite in suites for suite in ("live", "video", "remote", "governor", "photos", "cascade")):
+        from detector import load_model
+        if not os.path.exists(args.model):
+            print(f"Model file not found: {args.model}")
+            return 1
+        model = load_model(args.model)
+
+    workdir = tempfile.mkdtemp(prefix="rwc_bench_")
+    try:
+        for suite in suites:
+            print(f"Running {suite} benchmark...")
+            if suite == "live":
+                result = bench_live(args, model, workdir)
+            elif suite == "video":
+                result = bench_video(args, model, workdir)
+            elif suite == "login":
+                result = bench_login(args, workdir)
+            elif suite == "framepool":
+                result = bench_framepool(args)
+            elif suite == "logwriter":
+                result = bench_logwriter(args, workdir)
+            elif suite == "notify":
+                result = bench_notify(args, workdir)
+            elif suite == "remote":
+                result = bench_remote(args, model)
+            elif suite == "camera":
+                result = bench_camera(args)
+            elif suite == "governor":
+                result = bench_governor(args, model)
+            elif suite == "photos":
+                result = bench_photos(args, model, workdir)
+            elif suite == "cascade":
+                result = bench_cascade(args, model)
+            else:
+                print(f"Unknown suite: {suite}")
+                continue
+            if result is not None:
+                report["suites"][suite] = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = report["environment"].get("commit") or "nogit"
+        output = os.path.join(RESULTS_DIR, f"{commit}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved: {output}")
+    return 0
+
+
+def _flatten(suites):
+    """Yield (name, metrics) pairs, descending into the per-user login results."""
+    for suite, values in suites.items():
+        if any(key in values for key in COMPARE_KEYS):
+            yield suite, values
+        else:
+            for sub, sub_values in values.items():
+                if isinstance(sub_values, dict):
+                    yield f"{suite}[{sub}]", sub_values
+
+
+def compare(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = dict(_flatten(json.load(f)["suites"]))
+    with open(args.new, encoding="utf-8") as f:
+        new = dict(_flatten(json.load(f)["suites"]))
+
+    print(f"{'metric':<36}{'old':>12}{'new':>12}{'change':>10}")
+    for name in sorted(set(old) & set(new)):
+        for key in COMPARE_KEYS:
+            a, b = old[name].get(key), new[name].get(key)
+            if a is None or b is None:
+                continue
+            change = f"{100.0 * (b - a) / a:+.1f}%" if a else "n/a"
+            print(f"{name + '.' + key:<36}{a:>12.2f}{b:>12.2f}{change:>10}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remote Worker Control benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run benchmark suites and write a JSON report")
+    run_parser.add_argument("--suites", default="live,video,login",
+                            help="Comma separated: live,video,login,framepool,logwriter,notify,remote,camera,"
+                                 "governor,photos,cascade")
+    run_parser.add_argument("--model", default="runs/train/bitirme/weights/best.pt")
+    run_parser.add_argument("--device", default=None, help="Inference device, e.g. cpu or 0")
+    run_parser.add_argument("--imgsz", type=int, default=None)
+    run_parser.add_argument("--clip", default=None, help="Recorded clip to use instead of synthetic frames")
+    run_parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    run_parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    run_parser.add_argument("--sidecar-only", action="store_true",
+                            help="Video suite writes detections only, no annotated video")
+    run_parser.add_argument("--alert-threshold", type=int, default=DEFAULT_ALERT_THRESHOLD)
+    run_parser.add_argument("--face-image", default=None, help="Photo with one face for the login suite")
+    run_parser.add_argument("--users", default=DEFAULT_USERS, help="Comma separated enrolled-user counts")
+    run_parser.add_argument("--login-repeats", type=int, default=DEFAULT_LOGIN_REPEATS)
+    run_parser.add_argument("--frame-size", default=DEFAULT_FRAME_SIZE, help="WIDTHxHEIGHT for the framepool suite")
+    run_parser.add_argument("--log-rows", type=int, default=DEFAULT_LOG_ROWS, help="Rows for the logwriter suite")
+    run_parser.add_argument("--log-threads", type=int, default=DEFAULT_LOG_THREADS,
+                            help="Concurrent producers for the logwriter suite")
+    run_parser.add_argument("--notify-count", type=int, default=DEFAULT_NOTIFY_COUNT,
+                            help="Alerts for the notify suite")
+    run_parser.add_argument("--notify-delay", type=float, default=DEFAULT_NOTIFY_DELAY,
+                            help="Simulated service latency for the notify suite")
+    run_parser.add_argument("--remote-clients", type=int, default=DEFAULT_REMOTE_CLIENTS,
+                            help="Thin clients for the remote suite")
+    run_parser.add_argument("--camera-source", default=DEFAULT_CAMERA_SOURCE,
+                            help="Camera index, video file or 'synthetic' for the camera suite")
+    run_parser.add_argument("--camera-work-ms", type=float, default=DEFAULT_CAMERA_WORK_MS,
+                            help="Simulated processing per frame in the camera suite")
+    run_parser.add_argument("--camera-actions", type=int, default=DEFAULT_CAMERA_ACTIONS,
+                            help="Open-read-close cycles in the camera suite")
+    run_parser.add_argument("--photo-count", type=int, default=DEFAULT_PHOTO_COUNT,
+                            help="Photos processed by the photos suite")
+    run_parser.add_argument("--cpu-budget", type=float, default=DEFAULT_CPU_BUDGET,
+                            help="Share of the cores allowed in the governor suite")
+    run_parser.add_argument("--presence-model", default=None,
+                            help="Weights of the cascade's presence stage (default: the main model)")
+    run_parser.add_argument("--presence-imgsz", type=int, default=DEFAULT_PRESENCE_IMGSZ,
+                            help="Input size of the cascade's presence stage")
+    run_parser.add_argument("--output", default=None, help="Output JSON path")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="Compare two benchmark JSON reports")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
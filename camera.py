@@ -0,0 +1,267 @@
+"""
+Shared camera service: the device is opened once, with a negotiated format, and
+every feature (live detection, signup, login, photo capture) reads from it.
+
+A reader thread keeps only the newest frame, so a slow consumer always gets a
+fresh frame instead of working through frames queued in the driver. Sources:
+a camera index, a video file/URL (paced at its own FPS, like a camera), or
+"synthetic" for the built-in test scene.
+
+    with camera.acquire() as cap:      # VideoCapture-like client
+        ret, frame = cap.read()
+"""
+import sys
+import threading
+import time
+
+from perf_stats import STATS
+
+# Constants
+CAMERA_SOURCE = 0
+TARGET_WIDTH = 1280
+TARGET_HEIGHT = 720
+TARGET_FPS = 30
+FOURCC = "MJPG"  # Compressed on the USB bus: higher resolution/FPS than raw YUYV allows
+BUFFER_SIZE = 1  # Frames the driver may queue (fewer = fresher)
+IDLE_RELEASE_SECONDS = 30.0  # Keep the device open this long after the last client leaves
+READ_TIMEOUT = 2.0  # Seconds a client waits for a new frame
+
+
+def _device_backend():
+    import cv2
+
+    if sys.platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    if sys.platform == "win32":
+        return cv2.CAP_DSHOW  # Honours FOURCC/size requests; MSMF often ignores them
+    return cv2.CAP_ANY
+
+
+def open_device(source=CAMERA_SOURCE, width=TARGET_WIDTH, height=TARGET_HEIGHT, fps=TARGET_FPS, fourcc=FOURCC):
+    """
+    Open a capture source and negotiate format, size, FPS and buffering.
+    Returns (capture, negotiated), where negotiated holds what the driver actually chose.
+    """
+    import cv2
+
+    start = time.perf_counter()
+    source = str(source)
+    if source == "synthetic":
+        from fake_capture import FakeVideoCapture
+        cap = FakeVideoCapture(width=width, height=height, fps=fps, realtime=True)
+    elif source.isdigit():
+        cap = cv2.VideoCapture(int(source), _device_backend())
+        if not cap.isOpened():
+            cap = cv2.VideoCapture(int(source))
+        if cap.isOpened():
+            # FOURCC first: V4L2 picks the available sizes and rates per pixel format
+            if fourcc:
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            cap.set(cv2.CAP_PROP_FPS, fps)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, BUFFER_SIZE)
+    else:
+        cap = cv2.VideoCapture(source)
+
+    code = int(cap.get(cv2.CAP_PROP_FOURCC)) if cap.isOpened() else 0
+    negotiated = {
+        "source": source,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": float(cap.get(cv2.CAP_PROP_FPS)),
+        "fourcc": "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00") if code > 0 else "",
+        "open_seconds": round(time.perf_counter() - start, 3)
+    }
+    return cap, negotiated
+
+
+class CameraService:
+    """
+    Opens the source on the first acquire() and shares it between clients.
+    The device is released IDLE_RELEASE_SECONDS after the last client leaves,
+    so moving from login to detection doesn't pay for another device open.
+    """
+
+    def __init__(self, source=CAMERA_SOURCE, width=TARGET_WIDTH, height=TARGET_HEIGHT, fps=TARGET_FPS,
+                 fourcc=FOURCC, idle_release=IDLE_RELEASE_SECONDS, stats=STATS):
+        self.source = source
+        self.settings = {"width": width, "height": height, "fps": fps, "fourcc": fourcc}
+        self.idle_release = idle_release
+        self.stats = stats
+        self.open_lock = threading.Lock()  # Opening, closing and client counting
+        self.cond = threading.Condition()  # Newest frame
+        self.opened = False
+        self.negotiated = {}
+        self.reader = None
+        self.stop_event = None
+        self.clients = 0
+        self.idle_timer = None
+        self.frame = None
+        self.seq = 0
+        self.frame_time = 0.0
+        self.ended = False
+
+    def acquire(self):
+        """Return a client; opens the device if needed. Check client.isOpened()."""
+        with self.open_lock:
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+                self.idle_timer = None
+            if not self.opened or self.ended:
+                self._open()
+            client = CameraClient(self)
+            if not self.opened:
+                # Nothing to share: the client isn't counted, so it needn't be released
+                client.released = True
+                return client
+            self.clients += 1
+        return client
+
+    def _open(self):
+        self._close()
+        cap, negotiated = open_device(self.source, **self.settings)
+        if not cap.isOpened():
+            print(f"Camera could not be opened: {self.source}")
+            cap.release()
+            return
+        print(f"Camera opened: {negotiated}")
+        self.negotiated = negotiated
+        self.stats.set_gauge("camera_open_seconds", negotiated["open_seconds"])
+        self.stats.set_gauge("camera_width", negotiated["width"])
+        self.stats.set_gauge("camera_height", negotiated["height"])
+        self.stats.set_gauge("camera_fps", negotiated["fps"])
+        self.stats.incr("camera_opens")
+        with self.cond:
+            self.frame = None
+            self.ended = False
+            self.opened = True
+        self.stop_event = threading.Event()
+        self.reader = threading.Thread(target=self._read_loop, args=(cap, self.stop_event), daemon=True)
+        self.reader.start()
+
+    def _read_loop(self, cap, stop_event):
+        """Owns the capture: reads until stopped or the source ends, then releases it."""
+        # Files have no clock of their own: pace them so they behave like a camera
+        pace = None
+        if not str(self.source).isdigit() and self.source != "synthetic" and self.negotiated["fps"] > 0:
+            pace = 1.0 / self.negotiated["fps"]
+        next_frame = time.perf_counter()
+        try:
+            while not stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                now = time.perf_counter()
+                with self.cond:
+                    if not ret:
+                        self.ended = True
+                        self.cond.notify_all()
+                        break
+                    self.frame = frame
+                    self.frame_time = now
+                    self.seq += 1
+                    self.cond.notify_all()
+                self.stats.observe("camera_read", now - start)
+                if pace is not None:
+                    next_frame += pace
+                    delay = next_frame - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_frame = time.perf_counter()
+        finally:
+            cap.release()
+
+    def read(self, last_seq=0, timeout=READ_TIMEOUT):
+        """Wait for a frame newer than last_seq. Returns (frame, seq), or (None, last_seq) at the end."""
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            while self.seq <= last_seq and not self.ended and self.opened:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None, last_seq
+                self.cond.wait(remaining)
+            if self.seq <= last_seq:
+                return None, last_seq
+            # Time from the driver handing the frame over to a client picking it up
+            self.stats.observe("camera_frame_age", time.perf_counter() - self.frame_time)
+            if last_seq and self.seq - last_seq > 1:
+                self.stats.incr("camera_frames_skipped", self.seq - last_seq - 1)
+            return self.frame, self.seq
+
+    def release_client(self):
+        with self.open_lock:
+            self.clients -= 1
+            if self.clients > 0:
+                return
+            if self.idle_release:
+                self.idle_timer = threading.Timer(self.idle_release, self._release_if_idle)
+                self.idle_timer.daemon = True
+                self.idle_timer.start()
+            else:
+                self._close()
+
+    def _release_if_idle(self):
+        with self.open_lock:
+            if self.clients == 0:
+                self._close()
+
+    def _close(self):
+        if self.reader is None:
+            return
+        self.stop_event.set()
+        with self.cond:
+            self.opened = False
+            self.cond.notify_all()
+        # The reader finishes its current read (one frame period) and releases the device
+        self.reader.join(timeout=READ_TIMEOUT)
+        self.reader = None
+
+    def close(self):
+        with self.open_lock:
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+            self._close()
+
+
+class CameraClient:
+    """VideoCapture-like view of a CameraService (isOpened, read, get, release)."""
+
+    def __init__(self, service):
+        self.service = service
+        # A new client may start with the frame already held (at most one frame period old)
+        self.last_seq = service.seq - 1 if service.frame is not None else service.seq
+        self.released = False
+
+    def isOpened(self):
+        return not self.released and self.service.opened and not self.service.ended
+
+    def read(self):
+        """The newest frame not yet returned to this client. Frames are shared: don't draw on them."""
+        if self.released:
+            return False, None
+        frame, self.last_seq = self.service.read(self.last_seq)
+        return frame is not None, frame
+
+    def get(self, prop):
+        import cv2
+
+        negotiated = self.service.negotiated
+        if prop == cv2.CAP_PROP_FPS:
+            return float(negotiated.get("fps", 0.0))
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(negotiated.get("width", 0))
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(negotiated.get("height", 0))
+        return 0.0
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.service.release_client()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
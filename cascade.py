@@ -0,0 +1,131 @@
+"""
+Cascade mode for live detection: a cheap presence check on every frame, the
+full detector only when it is needed.
+
+Most of the time the only question is whether the one expected worker is still
+there. The presence stage runs a person-only pass at low resolution
+(PRESENCE_IMGSZ) and feeds the person_absent / multiple_person rules. The full
+model runs on the first frame, at least every FULL_INTERVAL seconds, when the
+number of people changes, and when the area around the people (face, hands,
+whatever they hold) has changed since its last run. In between, its last
+non-person detections are kept and combined with the current people, so every
+rule still sees a detection on every frame.
+
+    detector = CascadeDetector(get_model(path), rules, imgsz=640)
+    result, detected_classes, fired = detector.process_frame(frame)
+"""
+import time
+
+from detector import LiveDetector, get_model, record_predict_speed, result_arrays
+from perf_stats import STATS
+
+# Constants
+PRESENCE_MODEL = None  # Weights of the presence stage; None uses the main model (person class only)
+PRESENCE_IMGSZ = 224  # Input size of the presence stage (cost grows with the pixel count)
+PRESENCE_CONF = 0.25  # Minimum confidence of a person box in the presence stage
+PERSON_CLASS = "person"
+FULL_INTERVAL = 1.0  # Longest time in seconds between two runs of the full detector
+ACTIVITY_FRACTION = 0.01  # Changed share of the people's area that triggers the full detector
+ACTIVITY_PADDING = 0.25  # Person boxes are widened by this share of their width (reaching hands)
+
+
+def person_ids(names, person_class=PERSON_CLASS):
+    return [cls_id for cls_id, name in names.items() if name == person_class]
+
+
+def activity_boxes(person_boxes, width, height, padding=ACTIVITY_PADDING):
+    """Person boxes (x1, y1, x2, y2) widened to take in the hands and held objects."""
+    boxes = []
+    for x1, y1, x2, y2 in person_boxes:
+        pad = padding * (x2 - x1)
+        boxes.append((max(0, x1 - pad), max(0, y1 - pad), min(width, x2 + pad), min(height, y2)))
+    return boxes
+
+
+class CascadeDetector(LiveDetector):
+    """LiveDetector that runs the full model only when the presence stage asks for it."""
+
+    def __init__(self, model, rules=None, stats=STATS, presence_model=PRESENCE_MODEL, presence_imgsz=PRESENCE_IMGSZ,
+                 full_interval=FULL_INTERVAL, activity_fraction=ACTIVITY_FRACTION, **predict_kwargs):
+        from scene_gate import SceneChangeGate
+
+        super().__init__(model, rules, stats, **predict_kwargs)
+        self.presence_model = get_model(presence_model) if presence_model else model
+        self.presence_imgsz = presence_imgsz
+        self.full_interval = full_interval
+        self.activity_fraction = activity_fraction
+        # The gate's reference is the frame the full detector last saw
+        self.gate = SceneChangeGate()
+        ids = person_ids(model.names)
+        self.person_id = ids[0] if ids else None
+        self.presence_ids = person_ids(self.presence_model.names)
+        if self.person_id is None or not self.presence_ids:
+            print(f"Cascade: no '{PERSON_CLASS}' class in the model, running the full detector on every frame")
+        self.held = None  # Non-person boxes (N x 6 tensor) of the last full run
+        self.full_people = 0
+        self.last_full = None
+
+    def process_frame(self, frame, current_time=None):
+        """Return (result, detected_classes, fired_alerts) for a BGR frame, like LiveDetector."""
+        if current_time is None:
+            current_time = time.time()
+        if self.person_id is None or not self.presence_ids:
+            people, reason = None, "no_person_class"
+        else:
+            people = self._presence(frame)
+            reason = self._trigger(frame, people, current_time)
+
+        if reason is not None:
+            result = self._full(frame, people, current_time)
+            self.stats.incr("cascade_full_frames")
+            self.stats.incr(f"cascade_full_{reason}")
+        else:
+            result = self._combine(frame, people)
+            self.stats.incr("cascade_light_frames")
+
+        cls_ids, confs = result_arrays(result)
+        detected_classes, fired = self.evaluate(cls_ids, confs, current_time)
+        return result, detected_classes, fired
+
+    def _presence(self, frame):
+        kwargs = {key: value for key, value in self.predict_kwargs.items() if key != "imgsz"}
+        with self.stats.time("presence"):
+            result = self.presence_model.predict(source=frame, imgsz=self.presence_imgsz, classes=self.presence_ids,
+                                                 conf=PRESENCE_CONF, show=False, **kwargs)[0]
+        return result.boxes.data.cpu()
+
+    def _trigger(self, frame, people, current_time):
+        """Why the full detector has to run on this frame, or None."""
+        if self.last_full is None:
+            return "first"
+        if current_time - self.last_full >= self.full_interval:
+            return "interval"
+        # Compared with the presence stage's own count, so both sides have the same blind spots
+        if len(people) != self.full_people:
+            return "presence"
+        if len(people):
+            height, width = frame.shape[:2]
+            boxes = activity_boxes(people[:, :4].tolist(), width, height)
+            if self.gate.region_change(frame, boxes) >= self.activity_fraction:
+                return "activity"
+        return None
+
+    def _full(self, frame, people, current_time):
+        result = self.model.predict(source=frame, show=False, **self.predict_kwargs)[0]
+        record_predict_speed(result, self.stats)
+        if people is not None:
+            data = result.boxes.data.cpu()
+            self.held = data[data[:, 5] != self.person_id]
+            self.full_people = len(people)
+            self.last_full = current_time
+            self.gate.set_reference(frame)
+        return result
+
+    def _combine(self, frame, people):
+        """Result for a frame the full model skipped: its held boxes plus the people found now."""
+        import torch
+        from ultralytics.engine.results import Results
+
+        people = people.clone()
+        people[:, 5] = self.person_id
+        return Results(frame, path="", names=self.model.names, boxes=torch.cat([self.held, people]))
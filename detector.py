@@ -0,0 +1,214 @@
+import threading
+import time
+
+from perf_stats import STATS
+
+# cv2 and ultralytics are imported inside the functions that need them so that
+# importing this module (e.g. from the GUI at startup) stays cheap
+
+# Constants
+MODEL_PATH = 'runs/train/bitirme/weights/best.pt'
+PROFILES_FILE = "model_profiles.yaml"  # Deployment profiles written by model_sweep.py
+CLASSES_OF_INTEREST = ["cigaratte", "phone", "drowsy", "food"]
+
+
+def load_profile(name=None, path=PROFILES_FILE):
+    """
+    Return (model_path, predict_kwargs) of a deployment profile in model_profiles.yaml,
+    or of the file's `active` profile when name is None. Without the file or the
+    profile this is MODEL_PATH at its default input size.
+    """
+    import yaml
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return MODEL_PATH, {}
+    name = name or config.get("active")
+    profile = (config.get("profiles") or {}).get(name)
+    if profile is None:
+        if name:
+            print(f"Unknown model profile '{name}', using {MODEL_PATH}")
+        return MODEL_PATH, {}
+    predict_kwargs = {key: profile[key] for key in ("imgsz", "device") if key in profile}
+    return profile.get("model", MODEL_PATH), predict_kwargs
+
+
+def load_model(model_path=MODEL_PATH):
+    """Load the trained YOLO model."""
+    from ultralytics import YOLO
+    return YOLO(model_path)
+
+
+class SharedModel:
+    """A YOLO model shared between threads; predict() calls are serialized."""
+
+    def __init__(self, model):
+        self.model = model
+        self.names = model.names
+        self.lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self.lock:
+            return self.model.predict(*args, **kwargs)
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_path=MODEL_PATH, warmup=False):
+    """Load a model once per process and share it between all features."""
+    with _models_lock:
+        model = _models.get(model_path)
+        if model is None:
+            start = time.perf_counter()
+            model = _models[model_path] = SharedModel(load_model(model_path))
+            STATS.set_gauge("model_load_seconds", round(time.perf_counter() - start, 3))
+    if warmup:
+        warmup_model(model)
+    return model
+
+
+def warmup_model(model):
+    """Run one dummy prediction so the first real frame doesn't pay for lazy initialisation."""
+    import numpy as np
+    model.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), show=False, verbose=False)
+
+
+def record_predict_speed(result, stats=STATS):
+    """Record the preprocess/inference/postprocess split reported by YOLO (in ms)."""
+    for stage in ("preprocess", "inference", "postprocess"):
+        ms = result.speed.get(stage)
+        if ms is not None:
+            stats.observe(stage, ms / 1000.0)
+
+
+def result_detections(result):
+    """Convert a YOLO result into plain dicts (class id, name, confidence, xyxy box)."""
+    detections = []
+    for box in result.boxes:
+        cls_id = int(box.cls[0])
+        detections.append({
+            "cls": cls_id,
+            "name": result.names.get(cls_id, "unknown"),
+            "conf": round(float(box.conf[0]), 4),
+            "box": [round(float(v), 1) for v in box.xyxy[0].tolist()]
+        })
+    return detections
+
+
+def result_arrays(result):
+    """Return (class_ids, confidences) of a YOLO result as plain Python lists."""
+    boxes = result.boxes
+    if len(boxes) == 0:
+        return [], []
+    return [int(c) for c in boxes.cls.tolist()], boxes.conf.tolist()
+
+
+class LiveDetector:
+    """Runs YOLO plus the alert rules on one frame at a time (no GUI)."""
+
+    def __init__(self, model, rules=None, stats=STATS, **predict_kwargs):
+        from alert_rules import RuleEngine
+
+        self.model = model
+        self.rules = rules if rules is not None else RuleEngine()
+        self.rules.set_class_names(model.names)
+        self.stats = stats
+        self.predict_kwargs = predict_kwargs
+
+    def process_frame(self, frame, current_time=None):
+        """Return (result, detected_classes, fired_alerts) for a BGR frame."""
+        results = self.model.predict(source=frame, show=False, **self.predict_kwargs)
+        return self.process_result(results[0], current_time)
+
+    def process_result(self, result, current_time=None):
+        """Apply the alert rules to a YOLO result predicted elsewhere (e.g. in a batch)."""
+        record_predict_speed(result, self.stats)
+        cls_ids, confs = result_arrays(result)
+        detected_classes, fired = self.evaluate(cls_ids, confs, current_time)
+        return result, detected_classes, fired
+
+    def evaluate(self, cls_ids, confs, current_time=None):
+        """Return (detected_classes, fired_alerts) for one frame's class ids and confidences."""
+        alert_start = time.perf_counter()
+        detected_classes = self.rules.matching_classes(cls_ids, confs)
+        if current_time is None:
+            current_time = time.time()
+        fired = [rule.name for rule in self.rules.evaluate(cls_ids, confs, current_time)]
+        self.stats.observe("alert", time.perf_counter() - alert_start)
+        return detected_classes, fired
+
+
+def process_video_file(model, input_video_path, result_video_path=None, sidecar_path=None, show=True,
+                       stats=STATS, start_frame=0, max_frames=None, stop_event=None, **predict_kwargs):
+    """
+    Run YOLO over every frame of a video (or the max_frames starting at start_frame).
+    Decoding and encoding run on their own threads so they overlap with inference.
+    The annotated video is written to result_video_path (skipped when None) and
+    the raw detections to sidecar_path as JSON lines (skipped when None).
+    Pressing 'q' or setting stop_event ends processing early (stop_event is set on 'q').
+    Returns the number of processed frames, or None if the video could not be opened.
+    An inference error is raised after the reader and writers are closed, so a short
+    frame count always means the end of the video (or a stop), never a failure.
+    """
+    import cv2
+    from video_io import ThreadedVideoReader, ThreadedVideoWriter, DetectionSidecarWriter
+
+    reader = ThreadedVideoReader(input_video_path, stats=stats, start_frame=start_frame, max_frames=max_frames)
+    if not reader.isOpened():
+        return None
+
+    out = None
+    if result_video_path:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = ThreadedVideoWriter(result_video_path, fourcc, reader.fps, (reader.width, reader.height), stats=stats)
+    sidecar = DetectionSidecarWriter(sidecar_path, reader.fps) if sidecar_path else None
+
+    frames = 0
+    error = None
+    while stop_event is None or not stop_event.is_set():
+        frame_start = time.perf_counter()
+        with stats.time("capture"):
+            ret, frame = reader.read()
+        if not ret:
+            break
+
+        try:
+            results = model.predict(source=frame, show=False, **predict_kwargs)
+            record_predict_speed(results[0], stats)
+            if sidecar is not None:
+                with stats.time("logging"):
+                    sidecar.write(start_frame + frames, result_detections(results[0]))
+            if out is not None or show:
+                with stats.time("render"):
+                    annotated_frame = results[0].plot()
+                    if out is not None:
+                        out.write(annotated_frame)
+                    if show:
+                        cv2.imshow("Video Processing", annotated_frame)
+            stats.observe("frame", time.perf_counter() - frame_start)
+            stats.tick_frame()
+            frames += 1
+        except Exception as e:
+            print(f"Error processing video frame with YOLO: {e}")
+            error = e
+            break
+
+        if show and cv2.waitKey(1) & 0xFF == ord('q'):
+            if stop_event is not None:
+                stop_event.set()
+            break
+
+    reader.release()
+    if out is not None:
+        out.release()
+    if sidecar is not None:
+        sidecar.release()
+    if show:
+        cv2.destroyAllWindows()
+    if error is not None:
+        raise error
+    return frames
@@ -0,0 +1,342 @@
+"""
+Evidence store for alert snapshots, captured photos and short alert clips.
+
+Images are JPEG-compressed and stored once under the SHA-256 of their bytes
+(evidence/objects/ab/abcdef....jpg), so identical snapshots share one file.
+An SQLite index maps events to their evidence, and retention deletes the
+oldest evidence past MAX_AGE_DAYS or whenever the store grows beyond MAX_BYTES.
+
+ClipRecorder keeps the last few seconds of frames in a compressed in-memory
+ring buffer; trigger() turns the frames before and after an alert into a clip.
+
+    python evidence.py list --event 20250101-120000-3
+    python evidence.py gc
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+from perf_stats import STATS
+
+# Constants
+EVIDENCE_DIR = "evidence"
+INDEX_NAME = "index.sqlite"
+MAX_BYTES = 2 * 1024 ** 3  # Disk budget for all evidence
+MAX_AGE_DAYS = 30  # Evidence older than this is deleted (0 keeps it until the budget is hit)
+JPEG_QUALITY = 85
+CLIP_PRE_SECONDS = 5.0  # Seconds kept before the alert
+CLIP_POST_SECONDS = 5.0  # Seconds recorded after the alert
+CLIP_WIDTH = 640  # Clip frames are downscaled to this width
+CLIP_JPEG_QUALITY = 70  # Compression of frames held in the ring buffer
+CLIP_FPS = 10.0  # Frames per second kept in the ring buffer (and written to the clip)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS evidence (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT,
+    kind TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES objects(hash),
+    created REAL NOT NULL,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS evidence_event ON evidence(event_id);
+CREATE INDEX IF NOT EXISTS evidence_created ON evidence(created);
+CREATE INDEX IF NOT EXISTS evidence_hash ON evidence(hash);
+"""
+
+
+class EvidenceStore:
+    """Content-addressed, size- and age-bounded store with an event index. Thread-safe."""
+
+    def __init__(self, root=EVIDENCE_DIR, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS, jpeg_quality=JPEG_QUALITY):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400.0
+        self.jpeg_quality = jpeg_quality
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, INDEX_NAME), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        self.enforce_retention()
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.root, "objects", digest[:2], digest + ext)
+
+    def put_bytes(self, data, ext, event_id=None, kind="snapshot", meta=None):
+        """Store already-encoded bytes. Returns the object's path."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest, ext)
+        with self.lock:
+            if not self._has_object(digest):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._add_object(digest, ext, len(data))
+            else:
+                STATS.incr("evidence_deduplicated")
+            self._add_evidence(event_id, kind, digest, meta)
+        self._maybe_evict()
+        return path
+
+    def put_image(self, image, event_id=None, kind="snapshot", meta=None):
+        """Store a BGR NumPy image or a PIL image as JPEG. Returns the object's path."""
+        with STATS.time("evidence"):
+            if hasattr(image, "save"):
+                import io
+                buf = io.BytesIO()
+                image.convert("RGB").save(buf, format="JPEG", quality=self.jpeg_quality)
+                data = buf.getvalue()
+            else:
+                import cv2
+                ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if not ok:
+                    raise ValueError("Could not encode image")
+                data = encoded.tobytes()
+            return self.put_bytes(data, ".jpg", event_id, kind, meta)
+
+    def put_file(self, source_path, event_id=None, kind="clip", meta=None):
+        """Move a finished file (e.g. a clip) into the store. Returns the object's path."""
+        ext = os.path.splitext(source_path)[1]
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        path = self.object_path(digest, ext)
+        with self.lock:
+            if not self._has_object(digest):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                size = os.path.getsize(source_path)
+                shutil.move(source_path, path)
+                self._add_object(digest, ext, size)
+            else:
+                os.remove(source_path)
+                STATS.incr("evidence_deduplicated")
+            self._add_evidence(event_id, kind, digest, meta)
+        self._maybe_evict()
+        return path
+
+    def _has_object(self, digest):
+        return self.db.execute("SELECT 1 FROM objects WHERE hash = ?", (digest,)).fetchone() is not None
+
+    def _add_object(self, digest, ext, size):
+        self.db.execute("INSERT INTO objects (hash, ext, size, created) VALUES (?, ?, ?, ?)",
+                        (digest, ext, size, time.time()))
+        self.total_bytes += size
+        STATS.set_gauge("evidence_bytes", self.total_bytes)
+
+    def _add_evidence(self, event_id, kind, digest, meta):
+        self.db.execute("INSERT INTO evidence (event_id, kind, hash, created, meta) VALUES (?, ?, ?, ?, ?)",
+                        (event_id, kind, digest, time.time(), json.dumps(meta) if meta else None))
+        self.db.commit()
+        STATS.incr("evidence_items")
+
+    def lookup(self, event_id=None, kind=None, limit=None):
+        """Evidence for an event (or the most recent evidence), newest first, as dicts with a path."""
+        query = ("SELECT e.id, e.event_id, e.kind, e.hash, o.ext, o.size, e.created, e.meta "
+                 "FROM evidence e JOIN objects o ON o.hash = e.hash WHERE 1 = 1")
+        params = []
+        if event_id is not None:
+            query += " AND e.event_id = ?"
+            params.append(event_id)
+        if kind is not None:
+            query += " AND e.kind = ?"
+            params.append(kind)
+        query += " ORDER BY e.created DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [{
+            "id": row[0], "event_id": row[1], "kind": row[2], "hash": row[3], "size": row[5], "created": row[6],
+            "meta": json.loads(row[7]) if row[7] else None, "path": self.object_path(row[3], row[4])
+        } for row in rows]
+
+    def _maybe_evict(self):
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self.enforce_retention()
+
+    def enforce_retention(self):
+        """Drop evidence past the age limit, then the oldest until the store fits its budget."""
+        removed = 0
+        with self.lock:
+            if self.max_age:
+                cur = self.db.execute("DELETE FROM evidence WHERE created < ?", (time.time() - self.max_age,))
+                removed += cur.rowcount
+            removed_bytes = self._delete_orphans()
+            # Evict oldest evidence in chunks until under budget
+            while self.max_bytes and self.total_bytes > self.max_bytes:
+                ids = [row[0] for row in self.db.execute("SELECT id FROM evidence ORDER BY created LIMIT 50")]
+                if not ids:
+                    break
+                self.db.execute(f"DELETE FROM evidence WHERE id IN ({','.join('?' * len(ids))})", ids)
+                removed += len(ids)
+                removed_bytes += self._delete_orphans()
+            self.db.commit()
+        if removed:
+            STATS.incr("evidence_evicted", removed)
+            print(f"Evidence retention: removed {removed} items ({removed_bytes / 1024 ** 2:.1f} MB)")
+        return removed
+
+    def _delete_orphans(self):
+        """Delete objects no evidence refers to any more. Returns the bytes freed."""
+        orphans = self.db.execute("SELECT hash, ext, size FROM objects WHERE hash NOT IN "
+                                  "(SELECT DISTINCT hash FROM evidence)").fetchall()
+        freed = 0
+        for digest, ext, size in orphans:
+            try:
+                os.remove(self.object_path(digest, ext))
+            except FileNotFoundError:
+                pass
+            self.db.execute("DELETE FROM objects WHERE hash = ?", (digest,))
+            freed += size
+        self.total_bytes -= freed
+        STATS.set_gauge("evidence_bytes", self.total_bytes)
+        return freed
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class ClipRecorder:
+    """
+    Ring buffer of recent frames (downscaled, JPEG-compressed in memory) that
+    writes a pre/post clip around each triggered alert into the evidence store.
+    """
+
+    def __init__(self, store, pre_seconds=CLIP_PRE_SECONDS, post_seconds=CLIP_POST_SECONDS,
+                 fps=CLIP_FPS, width=CLIP_WIDTH, quality=CLIP_JPEG_QUALITY):
+        self.store = store
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.width = width
+        self.quality = quality
+        self.interval = 1.0 / fps
+        self.lock = threading.Lock()
+        self.ring = deque(maxlen=max(1, int(pre_seconds * fps)))
+        self.pending = []  # [event_id, frames, end_time, meta]
+        self.last_push = 0.0
+
+    def push(self, frame, current_time=None):
+        """Offer a frame; keeps at most `fps` frames per second. Cheap when it skips."""
+        import cv2
+
+        now = time.monotonic() if current_time is None else current_time
+        if now - self.last_push < self.interval:
+            return
+        self.last_push = now
+        with STATS.time("evidence_buffer"):
+            height, width = frame.shape[:2]
+            if width > self.width:
+                frame = cv2.resize(frame, (self.width, int(height * self.width / width)), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        item = (now, encoded)
+        finished = []
+        with self.lock:
+            self.ring.append(item)
+            for clip in self.pending:
+                clip[1].append(item)
+                if now >= clip[2]:
+                    finished.append(clip)
+            for clip in finished:
+                self.pending.remove(clip)
+        self._write_clips(finished)
+
+    def trigger(self, event_id, meta=None, current_time=None):
+        """Start a clip for an event: the buffered past plus the next post_seconds of frames."""
+        now = time.monotonic() if current_time is None else current_time
+        with self.lock:
+            self.pending.append([event_id, list(self.ring), now + self.post_seconds, meta])
+
+    def flush(self):
+        """
+        Write the pending clips with the frames collected so far; call when detection stops.
+        The buffered past is dropped too, so the next session's clips don't start with it.
+        Returns the writer threads.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.ring.clear()
+        return self._write_clips(pending)
+
+    def _write_clips(self, clips):
+        threads = []
+        for event_id, frames, _, meta in clips:
+            thread = threading.Thread(target=self._write_clip, args=(event_id, frames, meta), daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def _write_clip(self, event_id, frames, meta):
+        import cv2
+        import numpy as np
+
+        if not frames:
+            return
+        first = cv2.imdecode(frames[0][1], cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+        fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=self.store.root)
+        os.close(fd)
+        try:
+            writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+            for _, encoded in frames:
+                image = cv2.imdecode(np.asarray(encoded), cv2.IMREAD_COLOR)
+                if image.shape[:2] != (height, width):
+                    image = cv2.resize(image, (width, height))
+                writer.write(image)
+            writer.release()
+            meta = dict(meta or {}, frames=len(frames), seconds=round(frames[-1][0] - frames[0][0], 2))
+            path = self.store.put_file(tmp_path, event_id, kind="clip", meta=meta)
+            print(f"Alert clip saved: {path}")
+        except Exception as e:
+            print(f"Error writing alert clip for {event_id}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and clean up the evidence store")
+    parser.add_argument("--root", default=EVIDENCE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="List evidence, newest first")
+    list_parser.add_argument("--event", default=None)
+    list_parser.add_argument("--kind", default=None)
+    list_parser.add_argument("--limit", type=int, default=20)
+    sub.add_parser("gc", help="Apply the retention policy now")
+    args = parser.parse_args()
+
+    store = EvidenceStore(args.root)
+    if args.command == "list":
+        for item in store.lookup(args.event, args.kind, args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(item["created"]))
+            print(f"{created}  {item['event_id'] or '-':<24} {item['kind']:<10} {item['size']:>9}  {item['path']}")
+    else:
+        store.enforce_retention()
+        print(f"Evidence store size: {store.total_bytes / 1024 ** 2:.1f} MB")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
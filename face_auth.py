@@ -0,0 +1,260 @@
+import os
+import threading
+
+import cv2
+import face_recognition
+import numpy as np
+
+from perf_stats import STATS
+
+# Constants
+USERS_DIR = "users"
+TOLERANCE = 0.6  # Maximum face distance for a match (lower is stricter)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+TEMPLATE_EXTENSION = ".npy"  # Several encodings per user, written by enrollment
+DETECT_WIDTH = 480  # Faces are searched on a copy this wide (HOG cost grows with the pixel count)
+PERSON_IMGSZ = 320  # YOLO input size for the optional person pre-pass
+HEAD_FRACTION = 0.6  # Upper part of a person box searched for the face
+MIN_FACE_HEIGHT = 0.2  # Face height as a fraction of the frame for a usable capture
+MIN_SHARPNESS = 40.0  # Variance of the Laplacian of the face crop; lower is blurry
+STABLE_FRAMES = 3  # Consecutive good detections before a capture
+STABLE_MOVE = 0.15  # Allowed face movement between detections, as a fraction of the face height
+ENROLL_FRAMES = 5  # Encodings stored per user
+ENROLL_INTERVAL = 0.4  # Seconds between enrollment captures, for some variety in pose
+
+STATUS_MESSAGES = {
+    "no_face": "No face found",
+    "multiple_faces": "Only one person, please",
+    "too_small": "Come closer",
+    "blurry": "Hold still",
+    "hold_still": "Hold still...",
+    "ready": "OK"
+}
+
+
+def _head_region(box, width, height):
+    """Padded upper part of a person box (x1, y1, x2, y2), where the face is."""
+    x1, y1, x2, y2 = box
+    pad = 0.1 * (x2 - x1)
+    return (max(0, int(x1 - pad)), max(0, int(y1 - pad)),
+            min(width, int(x2 + pad)), min(height, int(y1 + HEAD_FRACTION * (y2 - y1))))
+
+
+def detect_faces(bgr_image, person_boxes=None, detect_width=DETECT_WIDTH):
+    """
+    Return (rgb_image, face_locations) for an OpenCV BGR frame. Locations are
+    (top, right, bottom, left) in full-frame coordinates, but the HOG detector
+    runs on a copy downscaled to detect_width. With person_boxes (x1, y1, x2, y2)
+    only the heads of those people are searched, falling back to the full frame.
+    """
+    # Convert the image from BGR (OpenCV) to RGB (face_recognition)
+    rgb_image = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+    height, width = rgb_image.shape[:2]
+    regions = [_head_region(box, width, height) for box in person_boxes] if person_boxes else [(0, 0, width, height)]
+
+    locations = []
+    with STATS.time("face_detect"):
+        for x0, y0, x1, y1 in regions:
+            crop = rgb_image[y0:y1, x0:x1]
+            if crop.size == 0:
+                continue
+            scale = min(1.0, detect_width / float(crop.shape[1]))
+            small = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else crop
+            for top, right, bottom, left in face_recognition.face_locations(small):
+                locations.append((int(top / scale) + y0, int(right / scale) + x0,
+                                  int(bottom / scale) + y0, int(left / scale) + x0))
+    if person_boxes and not locations:
+        return detect_faces(bgr_image, None, detect_width)
+    return rgb_image, locations
+
+
+def find_person_boxes(model, bgr_image, imgsz=PERSON_IMGSZ):
+    """xyxy boxes of the people YOLO finds in a low-resolution pass, largest first."""
+    person_ids = [cls_id for cls_id, name in model.names.items() if name == "person"]
+    if not person_ids:
+        return []
+    result = model.predict(source=bgr_image, imgsz=imgsz, classes=person_ids, show=False, verbose=False)[0]
+    boxes = result.boxes.xyxy.tolist() if len(result.boxes) else []
+    return sorted(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
+
+
+def encode_face(rgb_image, face_locations):
+    """Return the encoding of the first face in the image."""
+    with STATS.time("face_encode"):
+        return face_recognition.face_encodings(rgb_image, face_locations)[0]
+
+
+def face_quality(bgr_image, location):
+    """Return (face height as a fraction of the frame, sharpness) for one face location."""
+    top, right, bottom, left = location
+    face = bgr_image[max(0, top):bottom, max(0, left):right]
+    if face.size == 0:
+        return 0.0, 0.0
+    grey = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    # Compare sharpness at a fixed size so near and far faces score alike
+    grey = cv2.resize(grey, (128, 128), interpolation=cv2.INTER_AREA)
+    return (bottom - top) / float(bgr_image.shape[0]), float(cv2.Laplacian(grey, cv2.CV_64F).var())
+
+
+class StableFaceDetector:
+    """
+    Decides when to capture: exactly one face, large and sharp enough, that has
+    stayed in place for STABLE_FRAMES detections. Replaces waiting for a key press.
+    """
+
+    def __init__(self, person_model=None, stable_frames=STABLE_FRAMES, max_move=STABLE_MOVE):
+        self.person_model = person_model
+        self.stable_frames = stable_frames
+        self.max_move = max_move
+        self.reset()
+
+    def reset(self):
+        self.streak = 0
+        self.last_location = None
+
+    def update(self, bgr_image):
+        """Return (status, rgb_image, location); status is a STATUS_MESSAGES key, "ready" to capture."""
+        person_boxes = find_person_boxes(self.person_model, bgr_image) if self.person_model is not None else None
+        rgb_image, locations = detect_faces(bgr_image, person_boxes)
+        if len(locations) != 1:
+            self.reset()
+            return ("no_face" if not locations else "multiple_faces"), rgb_image, None
+
+        location = locations[0]
+        size, sharpness = face_quality(bgr_image, location)
+        if size < MIN_FACE_HEIGHT:
+            self.reset()
+            return "too_small", rgb_image, location
+        if sharpness < MIN_SHARPNESS:
+            self.reset()
+            return "blurry", rgb_image, location
+
+        if self.last_location is not None:
+            top, right, bottom, left = location
+            last_top, last_right, last_bottom, last_left = self.last_location
+            move = max(abs(top - last_top), abs(left - last_left), abs(bottom - last_bottom), abs(right - last_right))
+            if move > self.max_move * (bottom - top):
+                self.streak = 0
+        self.last_location = location
+        self.streak += 1
+        return ("ready" if self.streak >= self.stable_frames else "hold_still"), rgb_image, location
+
+
+def draw_face_status(frame, status, location=None, extra=""):
+    """Draw the face box and a status line on a frame shown to the user."""
+    color = (0, 200, 0) if status in ("ready", "hold_still") else (0, 0, 255)
+    if location is not None:
+        top, right, bottom, left = location
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+    text = f"{STATUS_MESSAGES.get(status, status)} {extra}".strip()
+    cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 4, cv2.LINE_AA)
+    cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2, cv2.LINE_AA)
+
+
+def user_exists(user_name, users_dir=USERS_DIR):
+    return any(os.path.exists(os.path.join(users_dir, user_name + ext))
+               for ext in IMAGE_EXTENSIONS + (TEMPLATE_EXTENSION,))
+
+
+def save_user_template(user_name, encodings, image, users_dir=USERS_DIR):
+    """Store an enrolled user's encodings (users/<name>.npy) and a reference photo (users/<name>.jpg)."""
+    cv2.imwrite(os.path.join(users_dir, f"{user_name}.jpg"), image)
+    np.save(os.path.join(users_dir, user_name + TEMPLATE_EXTENSION), np.asarray(encodings, dtype=np.float64))
+
+
+def load_user_encoding(user_image_path):
+    """Encode the single face in an enrolled user's image, or None if it isn't exactly one face."""
+    user_image = face_recognition.load_image_file(user_image_path)
+    user_face_locations = face_recognition.face_locations(user_image)
+    if len(user_face_locations) != 1:
+        user_name = os.path.splitext(os.path.basename(user_image_path))[0]
+        print(f"User {user_name} has {len(user_face_locations)} faces in the image. Skipping.")
+        return None
+    return face_recognition.face_encodings(user_image, user_face_locations)[0]
+
+
+def load_user_template(path):
+    """
+    Encodings for one user as an (n, 128) array, or None: the enrollment template
+    plus its mean, or the single encoding of a photo enrolled by older versions.
+    """
+    if path.endswith(TEMPLATE_EXTENSION):
+        encodings = np.load(path)
+        if len(encodings) > 1:
+            encodings = np.vstack([encodings, encodings.mean(axis=0)])
+        return encodings
+    encoding = load_user_encoding(path)
+    return None if encoding is None else encoding.reshape(1, -1)
+
+
+class FaceIndex:
+    """
+    In-memory encodings of all enrolled users.
+    Only new or modified user files are re-encoded on refresh(), so a login
+    compares against cached encodings instead of decoding every image again.
+    """
+
+    def __init__(self, users_dir=USERS_DIR):
+        self.users_dir = users_dir
+        self.lock = threading.Lock()
+        self.entries = {}  # user_name -> (mtime, (n, 128) encodings or None)
+
+    def refresh(self):
+        with self.lock:
+            # A user's template takes precedence over their photo
+            files = {}
+            for user_file in sorted(os.listdir(self.users_dir)):
+                user_name, ext = os.path.splitext(user_file)
+                if ext.lower() == TEMPLATE_EXTENSION or (ext.lower() in IMAGE_EXTENSIONS and user_name not in files):
+                    files[user_name] = os.path.join(self.users_dir, user_file)
+
+            for user_name, path in files.items():
+                mtime = os.path.getmtime(path)
+                cached = self.entries.get(user_name)
+                if cached is None or cached[0] != mtime:
+                    self.entries[user_name] = (mtime, load_user_template(path))
+
+            for user_name in set(self.entries) - set(files):
+                del self.entries[user_name]
+
+    def match(self, captured_encoding, tolerance=TOLERANCE):
+        """Return (user_name, distance) of the closest enrolled user within tolerance, or None."""
+        with self.lock:
+            users = [(name, enc) for name, (mtime, enc) in self.entries.items() if enc is not None]
+        if not users:
+            return None
+
+        # Every user's closest stored encoding counts
+        distances = face_recognition.face_distance(np.vstack([enc for _, enc in users]), captured_encoding)
+        best_name, best_distance = None, None
+        offset = 0
+        for name, enc in users:
+            distance = float(distances[offset:offset + len(enc)].min())
+            offset += len(enc)
+            if best_distance is None or distance < best_distance:
+                best_name, best_distance = name, distance
+        if best_distance < tolerance:
+            return best_name, best_distance
+        return None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_face_index(users_dir=USERS_DIR):
+    """Return the shared FaceIndex for a users directory, refreshed from disk."""
+    with _indexes_lock:
+        index = _indexes.get(users_dir)
+        if index is None:
+            index = _indexes[users_dir] = FaceIndex(users_dir)
+    index.refresh()
+    return index
+
+
+def find_matching_user(captured_encoding, users_dir=USERS_DIR, tolerance=TOLERANCE):
+    """
+    Compare an encoding with every enrolled user.
+    Returns (user_name, distance) for the closest match or None.
+    """
+    return get_face_index(users_dir).match(captured_encoding, tolerance)
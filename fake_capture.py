@@ -0,0 +1,145 @@
+import time
+
+import cv2
+import numpy as np
+
+# Constants
+DEFAULT_WIDTH = 1280
+DEFAULT_HEIGHT = 720
+DEFAULT_FPS = 30
+
+
+class FakeVideoCapture:
+    """
+    Drop-in stand-in for cv2.VideoCapture used for headless runs.
+    Frames come either from a recorded clip (decoded once into memory) or
+    from a deterministic synthetic scene with moving shapes.
+    """
+
+    def __init__(self, source=None, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, fps=DEFAULT_FPS,
+                 num_frames=None, loop=True, realtime=False, seed=0):
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.num_frames = num_frames
+        self.position = 0
+        self.opened = True
+        self.last_read = None
+
+        if source:
+            self.frames = self._load_clip(source)
+            if not self.frames:
+                self.opened = False
+                self.frames = [np.zeros((height, width, 3), dtype=np.uint8)]
+            self.height, self.width = self.frames[0].shape[:2]
+        else:
+            self.width = width
+            self.height = height
+            self.frames = None
+            self.rng = np.random.default_rng(seed)
+            # Static noisy background so the encoder and model see some texture
+            self.background = self.rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+
+    def _load_clip(self, path):
+        frames = []
+        cap = cv2.VideoCapture(path)
+        clip_fps = cap.get(cv2.CAP_PROP_FPS)
+        if clip_fps > 0:
+            self.fps = clip_fps
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+
+    def _synthetic_frame(self, index):
+        frame = self.background.copy()
+        # A "head" and "torso" drifting around the frame
+        cx = int(self.width / 2 + self.width / 4 * np.sin(index / 45.0))
+        cy = int(self.height / 2 + self.height / 8 * np.cos(index / 60.0))
+        cv2.circle(frame, (cx, cy - self.height // 6), self.height // 10, (150, 180, 220), -1)
+        cv2.rectangle(frame, (cx - self.width // 10, cy), (cx + self.width // 10, cy + self.height // 3),
+                      (90, 60, 40), -1)
+        # A small object moving across (phone / cup sized)
+        ox = (index * 7) % self.width
+        cv2.rectangle(frame, (ox, self.height - 120), (ox + 40, self.height - 40), (20, 20, 20), -1)
+        return frame
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+
+        if self.num_frames is not None and self.position >= self.num_frames:
+            return False, None
+
+        if self.frames is not None:
+            if self.position >= len(self.frames) and not self.loop:
+                return False, None
+            frame = self.frames[self.position % len(self.frames)].copy()
+        else:
+            frame = self._synthetic_frame(self.position)
+
+        # Pace frames like a real camera when requested
+        if self.realtime:
+            now = time.perf_counter()
+            if self.last_read is not None:
+                wait = 1.0 / self.fps - (now - self.last_read)
+                if wait > 0:
+                    time.sleep(wait)
+            self.last_read = time.perf_counter()
+
+        self.position += 1
+        return True, frame
+
+    def grab(self):
+        ret, self._grabbed = self.read()
+        return ret
+
+    def retrieve(self):
+        frame = getattr(self, "_grabbed", None)
+        return frame is not None, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            if self.num_frames is not None:
+                return float(self.num_frames)
+            return float(len(self.frames)) if self.frames is not None else -1.0
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+            return True
+        if prop == cv2.CAP_PROP_FPS:
+            self.fps = value
+            return True
+        return False
+
+    def release(self):
+        self.opened = False
+
+
+def write_synthetic_clip(path, num_frames=300, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, fps=DEFAULT_FPS, seed=0):
+    """Write a synthetic clip to disk (used to benchmark offline video processing)."""
+    cap = FakeVideoCapture(width=width, height=height, fps=fps, num_frames=num_frames, seed=seed)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        out.write(frame)
+    out.release()
+    return path
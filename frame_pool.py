@@ -0,0 +1,214 @@
+"""
+Shared-memory frame pool for handing frames between processes without copying.
+
+A pool is a ring of preallocated NumPy frame buffers living in one
+multiprocessing.shared_memory block. Only slot indices and small metadata
+dicts travel through multiprocessing queues; the pixels stay in place.
+"""
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Constants
+DEFAULT_SLOTS = 8  # Frames in flight between capture, inference and rendering
+SPEC_TIMEOUT = 10  # Seconds to wait for the capture process to report the frame size
+
+
+class SharedFramePool:
+    """
+    Ring of frame buffers in shared memory.
+    The creating side (name=None) owns the block and must close() it to unlink.
+    Other processes either receive the pool as a Process argument or attach
+    by name with the same queues.
+    """
+
+    def __init__(self, shape, slots=DEFAULT_SLOTS, dtype=np.uint8, free=None, ready=None, name=None, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        nbytes = int(np.prod(self.shape)) * self.dtype.itemsize * slots
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes)
+        self.name = self.shm.name
+        self.buffers = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+        # Free slot indices, and (slot, meta) pairs ready for the next stage
+        self.free = free if free is not None else ctx.Queue()
+        self.ready = ready if ready is not None else ctx.Queue(maxsize=slots)
+        if self.owner:
+            for slot in range(slots):
+                self.free.put(slot)
+
+    def spec(self):
+        """What another process needs (besides the queues) to attach to this pool."""
+        return {"name": self.name, "shape": self.shape, "slots": self.slots, "dtype": self.dtype.str}
+
+    def __getstate__(self):
+        # Only the name and the queues cross the process boundary
+        return {
+            "shape": self.shape, "slots": self.slots, "dtype": self.dtype.str,
+            "name": self.name, "free": self.free, "ready": self.ready
+        }
+
+    def __setstate__(self, state):
+        self.shape = state["shape"]
+        self.slots = state["slots"]
+        self.dtype = np.dtype(state["dtype"])
+        self.name = state["name"]
+        self.owner = False
+        self.shm = shared_memory.SharedMemory(name=self.name)
+        self.buffers = np.ndarray((self.slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        self.free = state["free"]
+        self.ready = state["ready"]
+
+    def acquire(self, timeout=None):
+        """Take a free slot index, or None if every slot is still in use."""
+        try:
+            return self.free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def buffer(self, slot):
+        """Writable NumPy view of one slot (no copy)."""
+        return self.buffers[slot]
+
+    def publish(self, slot, meta=None, timeout=None):
+        """Hand a filled slot to the next stage."""
+        self.ready.put((slot, meta or {}), timeout=timeout)
+
+    def get(self, timeout=None):
+        """Return (slot, meta) for the next filled frame, or (None, None) on timeout."""
+        try:
+            return self.ready.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+    def release(self, slot):
+        """Give a slot back once every stage is done with it."""
+        self.free.put(slot)
+
+    def close(self):
+        # Drop our views before closing the mapping
+        self.buffers = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _capture_main(source, slots, free, ready, spec_conn, stop_event):
+    """Capture process: decode frames straight into shared-memory slots."""
+    import cv2
+    from camera import open_device
+
+    cap, _ = open_device(source)
+    ret, frame = cap.read() if cap.isOpened() else (False, None)
+    if not ret:
+        spec_conn.send(None)
+        return
+
+    # The pool is sized from the first frame, so it is created here and the parent attaches
+    pool = SharedFramePool(frame.shape, slots=slots, dtype=frame.dtype, free=free, ready=ready)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    spec = pool.spec()
+    spec["fps"] = fps
+    spec_conn.send(spec)
+    decode_in_place = isinstance(cap, cv2.VideoCapture)
+
+    index = 0
+    dropped = 0
+    try:
+        while not stop_event.is_set():
+            slot = pool.acquire(timeout=0.5)
+            if slot is None:
+                # Consumers are behind: grab and discard to keep the camera fresh
+                cap.grab()
+                dropped += 1
+                continue
+            buf = pool.buffer(slot)
+            if index == 0:
+                buf[...] = frame
+                ret = True
+            else:
+                # cv2 decodes directly into the provided array when the size matches
+                ret, out = cap.read(buf) if decode_in_place else cap.read()
+                if ret and out is not buf:
+                    np.copyto(buf, out)
+            if not ret:
+                pool.release(slot)
+                break
+            pool.publish(slot, {"index": index, "time": time.time(), "fps": fps, "dropped": dropped})
+            index += 1
+    finally:
+        cap.release()
+        try:
+            pool.publish(-1, {"end": True}, timeout=1.0)
+        except queue.Full:
+            pass
+        # Give consumers a moment to detach before the block goes away
+        stop_event.wait(1.0)
+        pool.close()
+
+
+class SharedMemoryCapture:
+    """
+    VideoCapture-like reader backed by a capture process and a SharedFramePool.
+    The array returned by read() is a view into shared memory and stays valid
+    until the next read() call.
+    """
+
+    def __init__(self, source=0, slots=DEFAULT_SLOTS):
+        ctx = mp.get_context("spawn")
+        free = ctx.Queue()
+        ready = ctx.Queue(maxsize=slots)
+        spec_recv, spec_send = ctx.Pipe(duplex=False)
+        self.stop_event = ctx.Event()
+        self.process = ctx.Process(target=_capture_main,
+                                   args=(source, slots, free, ready, spec_send, self.stop_event), daemon=True)
+        self.process.start()
+
+        self.pool = None
+        self.current_slot = None
+        self.meta = {}
+        spec = spec_recv.recv() if spec_recv.poll(SPEC_TIMEOUT) else None
+        if spec is not None:
+            self.pool = SharedFramePool(spec["shape"], slots=spec["slots"], dtype=spec["dtype"],
+                                        free=free, ready=ready, name=spec["name"])
+            self.meta = {"fps": spec["fps"]}
+
+    def isOpened(self):
+        return self.pool is not None
+
+    def read(self):
+        if self.pool is None:
+            return False, None
+        if self.current_slot is not None:
+            self.pool.release(self.current_slot)
+            self.current_slot = None
+        slot, meta = self.pool.get(timeout=SPEC_TIMEOUT)
+        if slot is None or slot < 0:
+            return False, None
+        self.current_slot = slot
+        self.meta = meta
+        return True, self.pool.buffer(slot)
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.meta.get("fps", 0.0))
+        if self.pool is not None and prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.pool.shape[1])
+        if self.pool is not None and prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.pool.shape[0])
+        return 0.0
+
+    def release(self):
+        self.stop_event.set()
+        if self.pool is not None:
+            self.pool.close()  # Not the owner: only detaches
+            self.pool = None
+        self.process.join(timeout=5)
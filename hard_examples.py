@@ -0,0 +1,409 @@
+"""
+Hard-example mining: the frames behind production alerts, reviewed by a
+supervisor and exported as small incremental YOLO datasets for fine-tuning.
+
+Every incident's raw frame is saved with the model's detections (YOLO label
+format, class ids from data.yaml). A supervisor marks each one correct or
+incorrect; export turns the reviewed, not yet exported examples into a
+dataset with the same class layout as data.yaml:
+
+  correct    the detections are kept as labels (confirmed positives)
+  incorrect  the boxes behind the false alert are removed (hard negatives);
+             alerts about a missing class can't be fixed this way and are
+             copied to to_label/ for manual annotation instead
+
+    python hard_examples.py list --status pending
+    python hard_examples.py review                    # c = correct, i = incorrect, s = skip, q = quit
+    python hard_examples.py mark 20250101-120000-3-9f2c41ab incorrect   # ids as printed by list
+    python hard_examples.py export --replay 200 --data-root /path/to/dataset
+    python train.py --data hard_examples/exports/<batch>/data.yaml --model runs/train/bitirme/weights/best.pt --epochs 10
+"""
+import argparse
+import atexit
+import json
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+import yaml
+
+from perf_stats import STATS
+from train import resolve_data_yaml
+
+# Constants
+HARD_EXAMPLES_DIR = "hard_examples"
+INDEX_NAME = "index.sqlite"
+DATA_YAML = "data.yaml"
+MIN_CONFIDENCE = 0.25  # Detections stored with each example
+LABEL_CONFIDENCE = 0.45  # Detections that become labels on export
+MAX_PENDING = 2000  # Oldest unreviewed examples are dropped beyond this
+SAVE_QUEUE_SIZE = 16  # Frames waiting to be written; more are dropped
+VAL_FRACTION = 0.2
+JPEG_QUALITY = 95
+STATUSES = ("pending", "correct", "incorrect", "skipped")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS examples (
+    event_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    user TEXT,
+    causes TEXT NOT NULL,
+    targets TEXT NOT NULL,
+    image TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    detections TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    reviewer TEXT,
+    reviewed REAL,
+    export TEXT
+);
+CREATE INDEX IF NOT EXISTS examples_status ON examples(status);
+"""
+
+
+def load_class_names(data_yaml=DATA_YAML):
+    """Class names of the training dataset, in class-id order."""
+    with open(data_yaml, encoding="utf-8") as f:
+        names = yaml.safe_load(f)["names"]
+    if isinstance(names, dict):
+        names = [names[i] for i in sorted(names)]
+    return list(names)
+
+
+def alert_targets(causes, rules):
+    """{class name: condition} for the classes whose detections raised the alert."""
+    targets = {}
+    for cause in causes:
+        rule = rules.rule(cause)
+        if rule is not None:
+            targets[rule.class_name] = rule.condition
+    return targets
+
+
+class HardExampleStore:
+    """
+    Alert frames plus detections, review verdicts and export batches.
+    submit() is cheap for the detection loop; encoding and writing happen on a
+    background thread. Thread-safe.
+    """
+
+    def __init__(self, root=HARD_EXAMPLES_DIR, data_yaml=DATA_YAML, max_pending=MAX_PENDING):
+        self.root = root
+        self.data_yaml = data_yaml
+        self.names = load_class_names(data_yaml)
+        self.class_ids = {name: i for i, name in enumerate(self.names)}
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=SAVE_QUEUE_SIZE)
+        self.worker = None
+
+        os.makedirs(os.path.join(root, "images"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, INDEX_NAME), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        # Frames still queued at exit are written before the interpreter goes away
+        atexit.register(self.close)
+
+    # Collection
+
+    def submit(self, incident, frame, result, rules):
+        """Queue an incident's raw (unannotated) frame and the detections of its YOLO result."""
+        detections = []
+        boxes = result.boxes
+        if len(boxes):
+            for cls_id, conf, xywhn in zip(boxes.cls.tolist(), boxes.conf.tolist(), boxes.xywhn.tolist()):
+                name = result.names.get(int(cls_id), "unknown")
+                # Only classes the dataset knows can become labels
+                if conf >= MIN_CONFIDENCE and name in self.class_ids:
+                    detections.append({"name": name, "conf": round(conf, 4), "xywhn": [round(v, 6) for v in xywhn]})
+        # Incident ids restart with the process; the suffix keeps a restart from overwriting an example
+        example_id = f"{incident.event_id}-{uuid.uuid4().hex[:8]}"
+        item = (example_id, incident.user, list(incident.causes), alert_targets(incident.causes, rules),
+                frame.copy(), detections, time.time())
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            STATS.incr("hard_examples_dropped")
+            return
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._save_loop, daemon=True)
+            self.worker.start()
+
+    def _save_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self._save(*item)
+            except Exception as e:
+                print(f"Error saving hard example {item[0]}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _save(self, event_id, user, causes, targets, frame, detections, created):
+        import cv2
+
+        with STATS.time("hard_example_save"):
+            image = os.path.join("images", f"{event_id}.jpg")
+            if not cv2.imwrite(os.path.join(self.root, image), frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]):
+                raise ValueError("Could not write image")
+            height, width = frame.shape[:2]
+            with self.lock:
+                self.db.execute("INSERT INTO examples (event_id, created, user, causes, targets, image, "
+                                "width, height, detections) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (event_id, created, user, json.dumps(causes), json.dumps(targets), image,
+                                 width, height, json.dumps(detections)))
+                self._drop_excess_pending()
+                self.db.commit()
+        STATS.incr("hard_examples_saved")
+
+    def _drop_excess_pending(self):
+        excess = self.db.execute("SELECT event_id, image FROM examples WHERE status = 'pending' "
+                                 "ORDER BY created DESC LIMIT -1 OFFSET ?", (self.max_pending,)).fetchall()
+        for event_id, image in excess:
+            self._remove_image(image)
+            self.db.execute("DELETE FROM examples WHERE event_id = ?", (event_id,))
+
+    def _remove_image(self, image):
+        try:
+            os.remove(os.path.join(self.root, image))
+        except FileNotFoundError:
+            pass
+
+    # Review
+
+    def examples(self, status=None, limit=None):
+        """Examples as dicts, oldest first."""
+        query = ("SELECT event_id, created, user, causes, targets, image, width, height, detections, status, "
+                 "reviewer, reviewed, export FROM examples")
+        params = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [{
+            "event_id": row[0], "created": row[1], "user": row[2], "causes": json.loads(row[3]),
+            "targets": json.loads(row[4]), "path": os.path.join(self.root, row[5]), "width": row[6],
+            "height": row[7], "detections": json.loads(row[8]), "status": row[9], "reviewer": row[10],
+            "reviewed": row[11], "export": row[12]
+        } for row in rows]
+
+    def mark(self, event_id, verdict, reviewer=None):
+        """Record a supervisor's verdict ("correct", "incorrect" or "skipped"). Returns False if unknown."""
+        if verdict not in STATUSES:
+            raise ValueError(f"Unknown verdict '{verdict}'")
+        with self.lock:
+            cur = self.db.execute("UPDATE examples SET status = ?, reviewer = ?, reviewed = ? WHERE event_id = ?",
+                                  (verdict, reviewer, time.time(), event_id))
+            self.db.commit()
+        if cur.rowcount:
+            STATS.incr(f"hard_examples_{verdict}")
+        return cur.rowcount > 0
+
+    def counts(self):
+        with self.lock:
+            rows = self.db.execute("SELECT status, export IS NOT NULL, COUNT(*) FROM examples "
+                                   "GROUP BY status, export IS NOT NULL").fetchall()
+        counts = {}
+        for status, exported, count in rows:
+            key = f"{status} (exported)" if exported else status
+            counts[key] = count
+        return counts
+
+    # Export
+
+    def labels_for(self, example):
+        """
+        YOLO label lines for a reviewed example, or None if it needs manual labelling
+        (a false "class missing" alert means the model missed an object).
+        """
+        detections = [d for d in example["detections"] if d["conf"] >= LABEL_CONFIDENCE]
+        if example["status"] == "incorrect":
+            targets = example["targets"]
+            if any(condition == "absent" for condition in targets.values()):
+                return None
+            kept = []
+            for name, condition in targets.items():
+                if condition == "multiple":
+                    # "Too many" was wrong: keep the most confident box, the rest were false
+                    same = sorted((d for d in detections if d["name"] == name), key=lambda d: -d["conf"])
+                    kept.extend(same[:1])
+            detections = [d for d in detections if d["name"] not in targets] + kept
+        return [f"{self.class_ids[d['name']]} " + " ".join(f"{v:.6f}" for v in d["xywhn"]) for d in detections]
+
+    def export(self, out_dir=None, val_fraction=VAL_FRACTION, replay=0, seed=0, data_root=None):
+        """
+        Write the reviewed examples that haven't been exported yet as a YOLO dataset
+        (train/valid images+labels and a data.yaml with the data.yaml class layout).
+        replay adds that many images from the original training set, so fine-tuning
+        doesn't forget the rest of the data; data_root re-bases its paths like train.py
+        --data-root. Returns the new data.yaml path, or None.
+        """
+        batch = time.strftime("%Y%m%d-%H%M%S")
+        out_dir = out_dir or os.path.join(self.root, "exports", batch)
+        reviewed = [e for e in self.examples() if e["status"] in ("correct", "incorrect") and not e["export"]]
+        if not reviewed:
+            print("No newly reviewed examples to export.")
+            return None
+
+        for split in ("train", "valid"):
+            os.makedirs(os.path.join(out_dir, split, "images"), exist_ok=True)
+            os.makedirs(os.path.join(out_dir, split, "labels"), exist_ok=True)
+
+        written = {"train": 0, "valid": 0, "to_label": 0}
+        for example in reviewed:
+            labels = self.labels_for(example)
+            name = os.path.basename(example["path"])
+            if labels is None:
+                os.makedirs(os.path.join(out_dir, "to_label"), exist_ok=True)
+                shutil.copy2(example["path"], os.path.join(out_dir, "to_label", name))
+                written["to_label"] += 1
+                continue
+            # Stable split: an example stays on the same side if it is exported again
+            split = "valid" if zlib.crc32(example["event_id"].encode("utf-8")) % 1000 < val_fraction * 1000 else "train"
+            shutil.copy2(example["path"], os.path.join(out_dir, split, "images", name))
+            with open(os.path.join(out_dir, split, "labels", os.path.splitext(name)[0] + ".txt"), "w") as f:
+                f.write("\n".join(labels) + ("\n" if labels else ""))
+            written[split] += 1
+
+        if replay:
+            written["replay"] = self._add_replay(os.path.join(out_dir, "train"), replay, seed, data_root)
+
+        train_dir = os.path.abspath(os.path.join(out_dir, "train", "images"))
+        val_dir = os.path.abspath(os.path.join(out_dir, "valid", "images"))
+        if not written["valid"]:
+            val_dir = train_dir  # Too few examples for a separate split
+        data = {"train": train_dir, "val": val_dir, "nc": len(self.names), "names": self.names}
+        data_path = os.path.join(out_dir, "data.yaml")
+        with open(data_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(data, f, sort_keys=False)
+
+        with self.lock:
+            self.db.executemany("UPDATE examples SET export = ? WHERE event_id = ?",
+                                [(batch, e["event_id"]) for e in reviewed])
+            self.db.commit()
+        print(f"Exported {written} to {out_dir}")
+        return data_path
+
+    def _add_replay(self, train_dir, count, seed, data_root=None):
+        """Copy a random sample of the original training images (with labels) into train_dir."""
+        try:
+            data_path, _ = resolve_data_yaml(self.data_yaml, data_root)
+        except FileNotFoundError as e:
+            print(f"Replay skipped: {e}")
+            return 0
+        with open(data_path, encoding="utf-8") as f:
+            source = yaml.safe_load(f).get("train")
+        if not source or not os.path.isdir(source):
+            print(f"Replay skipped: training images not found ({source})")
+            return 0
+        images = sorted(name for name in os.listdir(source) if os.path.splitext(name)[1].lower() in (".jpg", ".jpeg", ".png"))
+        label_dir = os.path.join(os.path.dirname(os.path.normpath(source)), "labels")
+        for name in random.Random(seed).sample(images, min(count, len(images))):
+            stem = os.path.splitext(name)[0]
+            shutil.copy2(os.path.join(source, name), os.path.join(train_dir, "images", "replay_" + name))
+            label = os.path.join(label_dir, stem + ".txt")
+            if os.path.exists(label):
+                shutil.copy2(label, os.path.join(train_dir, "labels", f"replay_{stem}.txt"))
+        return min(count, len(images))
+
+    def close(self):
+        if self.db is None:
+            return
+        if self.worker is not None:
+            self.queue.join()
+        with self.lock:
+            self.db.close()
+            self.db = None
+
+
+def review(store, reviewer=None):
+    """Show pending examples one by one: c = correct, i = incorrect, s = skip, q = quit."""
+    import cv2
+
+    verdicts = {ord("c"): "correct", ord("i"): "incorrect", ord("s"): "skipped"}
+    pending = store.examples("pending")
+    print(f"{len(pending)} examples to review")
+    for example in pending:
+        image = cv2.imread(example["path"])
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        for d in example["detections"]:
+            cx, cy, w, h = d["xywhn"]
+            p1 = (int((cx - w / 2) * width), int((cy - h / 2) * height))
+            p2 = (int((cx + w / 2) * width), int((cy + h / 2) * height))
+            # Boxes behind the alert in red, the rest in green
+            color = (0, 0, 255) if d["name"] in example["targets"] else (0, 200, 0)
+            cv2.rectangle(image, p1, p2, color, 2)
+            cv2.putText(image, f"{d['name']} {d['conf']:.2f}", (p1[0], max(15, p1[1] - 5)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        title = f"{', '.join(example['causes'])} | {example['user'] or 'Unknown'} | c/i/s/q"
+        cv2.putText(image, title, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+        cv2.imshow("Hard example review", image)
+        key = cv2.waitKey(0) & 0xFF
+        while key not in verdicts and key != ord("q"):
+            key = cv2.waitKey(0) & 0xFF
+        if key == ord("q"):
+            break
+        store.mark(example["event_id"], verdicts[key], reviewer)
+    cv2.destroyAllWindows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review alert frames and export incremental training sets")
+    parser.add_argument("--root", default=HARD_EXAMPLES_DIR)
+    parser.add_argument("--data", default=DATA_YAML, help="Dataset whose class layout the exports use")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="List examples, oldest first")
+    list_parser.add_argument("--status", default=None, choices=STATUSES)
+    list_parser.add_argument("--limit", type=int, default=50)
+    review_parser = sub.add_parser("review", help="Review pending examples in a window")
+    review_parser.add_argument("--reviewer", default=None)
+    mark_parser = sub.add_parser("mark", help="Record a verdict for one example")
+    mark_parser.add_argument("event_id")
+    mark_parser.add_argument("verdict", choices=("correct", "incorrect", "skipped"))
+    mark_parser.add_argument("--reviewer", default=None)
+    export_parser = sub.add_parser("export", help="Export newly reviewed examples as a YOLO dataset")
+    export_parser.add_argument("--out", default=None)
+    export_parser.add_argument("--val-fraction", type=float, default=VAL_FRACTION)
+    export_parser.add_argument("--replay", type=int, default=0, help="Original training images to mix in")
+    export_parser.add_argument("--data-root", default=None,
+                               help="Dataset root to re-base missing paths in the data yaml onto (as in train.py)")
+    args = parser.parse_args()
+
+    store = HardExampleStore(args.root, args.data)
+    if args.command == "list":
+        for e in store.examples(args.status, args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e["created"]))
+            print(f"{created}  {e['event_id']:<24} {e['status']:<10} {e['export'] or '-':<16} "
+                  f"{','.join(e['causes']):<24} {len(e['detections'])} boxes")
+        print(store.counts())
+    elif args.command == "review":
+        review(store, args.reviewer)
+        print(store.counts())
+    elif args.command == "mark":
+        if not store.mark(args.event_id, args.verdict, args.reviewer):
+            print(f"Unknown example: {args.event_id}")
+            store.close()
+            return 1
+    else:
+        data_path = store.export(args.out, args.val_fraction, args.replay, data_root=args.data_root)
+        if data_path:
+            print(f"Fine-tune with: python train.py --data {data_path} --model runs/train/bitirme/weights/best.pt")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Headless monitoring: camera -> YOLO -> alert rules -> log + notifications + API, with no GUI.
+Supervisors and other services watch through the local API (see api_server.py).
+
+    python headless.py --source 0 --user alice
+    python headless.py --source synthetic --port 8765
+"""
+import argparse
+import sys
+import time
+
+from perf_stats import STATS, start_metrics_server
+from detector import LiveDetector, get_model, load_profile
+from alert_rules import RuleEngine
+from alert_aggregator import AlertAggregator
+from log_writer import CSVLogWriter
+from analytics import AlertRollups
+from api_server import API_HOST, API_PORT, EventHub, incident_event, start_api_server
+from notifiers import Notification, start_delivery_engine
+from hard_examples import HardExampleStore
+from camera import CameraService
+from resource_governor import CPU_BUDGET, ResourceGovernor
+
+# Constants
+LOG_FILE = "detections_log.csv"
+LOG_HEADER = ["Time Detected", "Warning Cause", "Name"]
+
+
+def open_source(source):
+    """
+    Camera index, video file/URL, or "synthetic" for the built-in test scene, read
+    through the camera service (negotiated format, always the newest frame).
+    """
+    return CameraService(source, idle_release=0).acquire()
+
+
+def run(args):
+    # Before cv2/torch are imported, so their thread pools start at the budgeted size
+    governor = ResourceGovernor(args.cpu_budget).start()
+    hub = EventHub()
+    server = start_api_server(hub, args.host, args.port)
+    if server is None:
+        return 1
+    start_metrics_server()
+
+    rules = RuleEngine()
+    aggregator = AlertAggregator(rules)
+    log_writer = CSVLogWriter(LOG_FILE, LOG_HEADER)
+    analytics = AlertRollups()
+    notifier = start_delivery_engine()
+    hard_examples = HardExampleStore() if args.hard_examples else None
+    model_path, profile_kwargs = load_profile(args.profile)
+    if args.model:
+        model_path = args.model
+    predict_kwargs = dict(profile_kwargs, verbose=False)
+    if args.device:
+        predict_kwargs["device"] = args.device
+    if args.cascade:
+        from cascade import CascadeDetector
+        detector = CascadeDetector(get_model(model_path, warmup=True), rules, **predict_kwargs)
+    else:
+        detector = LiveDetector(get_model(model_path, warmup=True), rules, **predict_kwargs)
+
+    cap = open_source(args.source)
+    if not cap.isOpened():
+        print(f"Could not open source: {args.source}")
+        return 1
+
+    hub.update_status(running=True, user=args.user, source=args.source)
+    governor.set_min_fps(rules.min_fps())
+    last_classes = None
+    frames = 0
+    try:
+        while args.frames is None or frames < args.frames:
+            governor.throttle()
+            with STATS.time("capture"):
+                ret, frame = cap.read()
+            if not ret:
+                print("Frame could not be captured.")
+                break
+
+            result, detected_classes, fired = detector.process_frame(frame)
+            frames += 1
+            STATS.tick_frame()
+
+            # Detection events only when the set of visible classes changes
+            classes = sorted(set(detected_classes))
+            if classes != last_classes:
+                hub.publish_event("detection", user=args.user, classes=classes)
+                last_classes = classes
+
+            incident = aggregator.submit(fired, args.user, time.time())
+            if incident is not None:
+                now = time.localtime()
+                message = " | ".join(rules.message(c) for c in incident.causes)
+                log_writer.write([time.strftime("%Y-%m-%d %H:%M:%S", now), message, args.user or "Unknown"])
+                analytics.record(now, args.user, incident.causes)
+                event = incident_event(incident, rules)
+                hub.publish_event("alert", **event)
+                notifier.submit(Notification(f"Cause: {message}\nUser: {args.user or 'Unknown'}\n"
+                                             f"Level: {incident.level} ({incident.severity} severity)",
+                                             severity=incident.severity, data=event))
+                print(f"Alert: {message} ({incident.level})")
+                if hard_examples is not None:
+                    hard_examples.submit(incident, frame, result, rules)
+
+            # Annotate only while someone is watching the stream
+            if hub.wants_frames():
+                with STATS.time("render"):
+                    hub.publish_frame(result.plot())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        governor.stop()
+        hub.update_status(running=False)
+        cap.release()
+        log_writer.close()
+        analytics.save()
+        notifier.close()
+        if hard_examples is not None:
+            hard_examples.close()
+        server.stop()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run detection without the GUI and serve it over the local API")
+    parser.add_argument("--source", default="0", help="Camera index, video file/URL, or 'synthetic'")
+    parser.add_argument("--user", default=None, help="Name recorded with alerts")
+    parser.add_argument("--profile", default=None, help="Deployment profile in model_profiles.yaml (default: active)")
+    parser.add_argument("--model", default=None, help="Model weights (overrides the profile)")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--frames", type=int, default=None, help="Stop after this many frames")
+    parser.add_argument("--cpu-budget", type=float, default=CPU_BUDGET,
+                        help="Share of the machine's cores the process may use (0-1)")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Person-only check on every frame, full detector periodically or on activity")
+    parser.add_argument("--no-hard-examples", dest="hard_examples", action="store_false",
+                        help="Don't keep alert frames for review and retraining")
+    args = parser.parse_args()
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
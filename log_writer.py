@@ -0,0 +1,220 @@
+import atexit
+import csv
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
+
+from perf_stats import STATS
+
+# Constants
+FLUSH_ROWS = 64  # Buffered rows that trigger an immediate flush
+FLUSH_INTERVAL = 2.0  # Seconds between background flushes
+# When to fsync after a flush: "always", "interval" (at most every FSYNC_INTERVAL) or "never"
+FSYNC_POLICY = "interval"
+FSYNC_INTERVAL = 10.0
+ROTATE_BYTES = 5 * 1024 * 1024  # Rotate once the log grows past this size (0 disables)
+ROTATE_DAILY = True  # Also rotate when the day changes
+MAX_ARCHIVES = 30  # Compressed archives kept next to the log
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def log_files(path):
+    """The log and its rotated copies (plain or compressed), oldest first."""
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(os.path.splitext(path)[0]) + "."
+    names = set(os.listdir(directory))
+    # Rotated names carry a timestamp, so name order is age order. While a copy is
+    # being compressed its .csv is complete and its .csv.gz is not.
+    rotated = sorted(name for name in names
+                     if name.startswith(prefix) and name != os.path.basename(path)
+                     and (name.endswith(".csv") or (name.endswith(".csv.gz") and name[:-3] not in names)))
+    paths = [os.path.join(directory, name) for name in rotated]
+    if os.path.exists(path):
+        paths.append(path)
+    return paths
+
+
+def open_log(path):
+    """Open a log file or a compressed archive for reading as text."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode='rt', newline='', encoding='utf-8')
+    return open(path, mode='r', newline='', encoding='utf-8')
+
+
+class CSVLogWriter:
+    """
+    Buffered, thread-safe CSV log with a single open handle.
+    Producers only append to an in-memory buffer under a lock; rows are written
+    in one batch when the buffer fills up or every flush_interval seconds.
+    The file is rotated by size and/or day and old files are gzip-compressed
+    in the background as <name>.<YYYYmmdd-HHMMSS>.csv.gz.
+    """
+
+    def __init__(self, path, header, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 fsync=FSYNC_POLICY, rotate_bytes=ROTATE_BYTES, rotate_daily=ROTATE_DAILY,
+                 max_archives=MAX_ARCHIVES):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}'")
+        self.path = path
+        self.header = list(header)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.max_archives = max_archives
+
+        self.lock = threading.Lock()  # Guards the buffer
+        self.io_lock = threading.Lock()  # Guards the file handle
+        self.buffer = []
+        self.file = None
+        self.size = 0
+        self.day = None
+        self.last_fsync = 0.0
+        self.unsynced = False  # Flushed to the OS but not fsynced yet
+        self.closed = False
+        text = io.StringIO()
+        csv.writer(text).writerow(self.header)
+        self.header_bytes = len(text.getvalue().encode('utf-8'))
+
+        with self.io_lock:
+            self._open()
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _open(self):
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self.file = open(self.path, mode='a', newline='', encoding='utf-8')
+        if exists:
+            self.size = os.path.getsize(self.path)
+            self.day = time.strftime("%Y%m%d", time.localtime(os.path.getmtime(self.path)))
+        else:
+            self.size = 0
+            self.day = time.strftime("%Y%m%d")
+            self._write_rows([self.header])
+
+    def _write_rows(self, rows):
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        data = text.getvalue()
+        self.file.write(data)
+        self.size += len(data.encode('utf-8'))
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing {self.path}: {e}")
+
+    def write(self, row):
+        """Queue one row. Never touches the disk unless the buffer is full."""
+        with self.lock:
+            if self.closed:
+                raise ValueError(f"{self.path} log writer is closed")
+            self.buffer.append(list(row))
+            full = len(self.buffer) >= self.flush_rows
+        STATS.incr("log_rows")
+        if full:
+            self.flush()
+
+    def flush(self, fsync=False):
+        """Write all buffered rows. fsync=True forces them to disk regardless of the policy."""
+        with self.io_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+            if self.file is None:
+                return
+            if rows:
+                with STATS.time("logging"):
+                    if self._should_rotate():
+                        self._rotate()
+                    self._write_rows(rows)
+                    self.file.flush()
+                self.unsynced = True
+                STATS.incr("log_flushes")
+            self._maybe_fsync(force=fsync)
+
+    def _maybe_fsync(self, force=False):
+        if not self.unsynced:
+            return
+        now = time.monotonic()
+        if force or self.fsync == "always" or (self.fsync == "interval" and now - self.last_fsync >= FSYNC_INTERVAL):
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.last_fsync = now
+            self.unsynced = False
+
+    def _should_rotate(self):
+        if self.size <= self.header_bytes:
+            return False  # Nothing but the header yet
+        if self.rotate_bytes and self.size >= self.rotate_bytes:
+            return True
+        return self.rotate_daily and time.strftime("%Y%m%d") != self.day
+
+    def _rotate(self):
+        self.file.close()
+        base = f"{os.path.splitext(self.path)[0]}.{time.strftime('%Y%m%d-%H%M%S')}"
+        rotated = base + ".csv"
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{base}-{suffix}.csv"
+            suffix += 1
+        os.replace(self.path, rotated)
+        self._open()
+        STATS.incr("log_rotations")
+        # Compression can take a while for big files; keep it off the producers' path
+        threading.Thread(target=self._compress, args=(rotated,), daemon=True).start()
+
+    def _compress(self, path):
+        try:
+            with open(path, 'rb') as src, gzip.open(path + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except OSError as e:
+            print(f"Error compressing {path}: {e}")
+            return
+        self._prune_archives()
+
+    def _prune_archives(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(os.path.splitext(self.path)[0]) + "."
+        archives = sorted(name for name in os.listdir(directory)
+                          if name.startswith(prefix) and name.endswith(".csv.gz"))
+        for name in archives[:-self.max_archives] if self.max_archives else []:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop buffered rows and truncate the log back to its header."""
+        with self.io_lock:
+            with self.lock:
+                self.buffer = []
+            if self.file is not None:
+                self.file.close()
+            with open(self.path, mode='w', newline='', encoding='utf-8'):
+                pass
+            self._open()
+            self.file.flush()
+            self.unsynced = True
+            self._maybe_fsync(force=True)
+
+    def close(self):
+        if self.closed:
+            return
+        self.stop_event.set()
+        self.flush(fsync=self.fsync != "never")
+        with self.io_lock:
+            with self.lock:
+                self.closed = True
+            if self.file is not None:
+                self.file.close()
+                self.file = None
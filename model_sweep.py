@@ -0,0 +1,284 @@
+"""
+Latency/accuracy sweep over model variants, and a distilled compact student.
+
+    python model_sweep.py sweep --data-root /data/bitirme --imgsz 320 416 512 640 --write-profiles
+    python model_sweep.py distill --data-root /data/bitirme --width 0.125 --imgsz 416 --epochs 50
+    python model_sweep.py sweep --models runs/train/bitirme/weights/best.pt runs/distill/student/weights/best.pt
+
+sweep validates every model at every input size on the validation split (mAP
+overall and per class) and times single-frame CPU inference, then prints the
+Pareto frontier: the variants no other variant beats on both latency and mAP.
+--write-profiles stores the picks in model_profiles.yaml, which the app reads.
+
+distill labels the training images with the deployed model (teacher) and
+trains a narrower student on the ground truth plus the teacher's extra boxes.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import yaml
+
+from perf_stats import PerfStats
+from detector import MODEL_PATH, PROFILES_FILE
+from train import DATA_YAML, IMAGE_EXTENSIONS, choose_cache, choose_workers, resolve_data_yaml
+
+# Constants
+SWEEP_DIR = os.path.join("runs", "sweep")
+DISTILL_DIR = os.path.join("runs", "distill")
+SWEEP_SIZES = (320, 416, 512, 640)
+LATENCY_FRAMES = 50  # Timed single-frame predictions per variant
+WARMUP_FRAMES = 3
+METRIC = "map50_95"  # Accuracy axis of the Pareto frontier ("map50" or "map50_95")
+LOW_POWER_MIN_RELATIVE = 0.9  # The low-power pick keeps at least this share of the best overall mAP...
+LOW_POWER_MIN_CLASS_RELATIVE = 0.8  # ...and of every class' mAP
+TEACHER_CONF = 0.5  # Teacher boxes kept as extra labels
+TEACHER_IOU = 0.5  # Teacher boxes overlapping a ground-truth box of the same class are duplicates
+STUDENT_WIDTH = 0.125  # Channel multiplier of the student (YOLOv8n is 0.25)
+STUDENT_DEPTH = 0.33
+
+
+def image_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def measure_latency(model, images, imgsz, frames=LATENCY_FRAMES):
+    """p50/p90 single-frame predict latency (ms) on CPU, cycling through the given images."""
+    import cv2
+
+    decoded = [cv2.imread(path) for path in images[:min(len(images), frames)]]
+    decoded = [image for image in decoded if image is not None]
+    stats = PerfStats(window=frames)
+    for i in range(WARMUP_FRAMES + frames):
+        image = decoded[i % len(decoded)]
+        start = time.perf_counter()
+        model.predict(source=image, imgsz=imgsz, device="cpu", verbose=False)
+        if i >= WARMUP_FRAMES:
+            stats.observe("predict", time.perf_counter() - start)
+    timer = stats.snapshot()["stages"]["predict"]
+    return {"p50_ms": round(timer["p50"] * 1000.0, 2), "p90_ms": round(timer["p90"] * 1000.0, 2)}
+
+
+def evaluate(model_path, data_path, imgsz, names):
+    """Validation mAP (overall and per class) and CPU latency for one model at one input size."""
+    from ultralytics import YOLO
+
+    with open(data_path, encoding="utf-8") as f:
+        val_dir = yaml.safe_load(f)["val"]
+    model = YOLO(model_path)
+    metrics = model.val(data=data_path, imgsz=imgsz, batch=8, device="cpu", plots=False, verbose=False,
+                        workers=choose_workers(8, "none"))
+    box = metrics.box
+    per_class = {}
+    for i, cls_id in enumerate(box.ap_class_index):
+        per_class[names[int(cls_id)]] = {"map50": round(float(box.ap50[i]), 4), "map50_95": round(float(box.ap[i]), 4),
+                                         "recall": round(float(box.r[i]), 4)}
+    return {
+        "model": model_path,
+        "imgsz": imgsz,
+        "map50": round(float(box.map50), 4),
+        "map50_95": round(float(box.map), 4),
+        "classes": per_class,
+        "latency": measure_latency(model, image_files(val_dir), imgsz)
+    }
+
+
+def pareto_frontier(results, metric=METRIC):
+    """Variants not beaten on both latency and accuracy, fastest first."""
+    frontier = []
+    best = -1.0
+    for r in sorted(results, key=lambda r: (r["latency"]["p50_ms"], -r[metric])):
+        if r[metric] > best:
+            frontier.append(r)
+            best = r[metric]
+    return frontier
+
+
+def pick_profiles(frontier, metric=METRIC):
+    """
+    "workstation": the most accurate variant. "low-power laptop": the fastest one
+    that keeps LOW_POWER_MIN_RELATIVE of its mAP and LOW_POWER_MIN_CLASS_RELATIVE
+    of every class' mAP, so no single alert class quietly stops working.
+    """
+    best = frontier[-1]
+    low_power = best
+    for r in frontier:
+        classes_ok = all(r["classes"].get(name, {}).get(metric, 0.0) >= LOW_POWER_MIN_CLASS_RELATIVE * values[metric]
+                         for name, values in best["classes"].items())
+        if r[metric] >= LOW_POWER_MIN_RELATIVE * best[metric] and classes_ok:
+            low_power = r
+            break
+    return {
+        "workstation": {"model": best["model"], "imgsz": best["imgsz"]},
+        "low-power laptop": {"model": low_power["model"], "imgsz": low_power["imgsz"]}
+    }
+
+
+def write_profiles(profiles, path=PROFILES_FILE):
+    """Merge profiles into model_profiles.yaml, keeping other profiles and the active choice."""
+    config = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    config.setdefault("active", "workstation")
+    config.setdefault("profiles", {}).update(profiles)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Deployment profiles: which model and input size the app runs (see model_sweep.py).\n")
+        f.write("# `active` is used by the GUI; headless.py also takes --profile.\n")
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def run_sweep(args):
+    data_path, _ = resolve_data_yaml(args.data, args.data_root)
+    with open(data_path, encoding="utf-8") as f:
+        names = yaml.safe_load(f)["names"]
+    if isinstance(names, dict):
+        names = [names[i] for i in sorted(names)]
+
+    results = []
+    for model_path in args.models:
+        for imgsz in args.imgsz:
+            print(f"Evaluating {model_path} at {imgsz}...")
+            results.append(evaluate(model_path, data_path, imgsz, names))
+    frontier = pareto_frontier(results, args.metric)
+
+    print(f"\n{'model':<48} {'imgsz':>5} {'mAP50':>7} {'mAP50-95':>9} {'p50 ms':>8}  frontier")
+    for r in sorted(results, key=lambda r: r["latency"]["p50_ms"]):
+        mark = "*" if r in frontier else ""
+        print(f"{r['model'][-48:]:<48} {r['imgsz']:>5} {r['map50']:>7.3f} {r['map50_95']:>9.3f} "
+              f"{r['latency']['p50_ms']:>8.1f}  {mark}")
+
+    profiles = pick_profiles(frontier, args.metric)
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    report_path = os.path.join(SWEEP_DIR, time.strftime("sweep_%Y%m%d-%H%M%S.json"))
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"metric": args.metric, "results": results,
+                   "frontier": [{"model": r["model"], "imgsz": r["imgsz"]} for r in frontier],
+                   "profiles": profiles}, f, indent=2)
+    print(f"\nSuggested profiles: {profiles}")
+    print(f"Sweep report saved: {report_path}")
+    if args.write_profiles:
+        write_profiles(profiles)
+        print(f"Profiles written to {PROFILES_FILE}")
+    return 0
+
+
+def box_iou(a, b):
+    """IoU of two normalized (cx, cy, w, h) boxes."""
+    ax0, ay0, ax1, ay1 = a[0] - a[2] / 2, a[1] - a[3] / 2, a[0] + a[2] / 2, a[1] + a[3] / 2
+    bx0, by0, bx1, by1 = b[0] - b[2] / 2, b[1] - b[3] / 2, b[0] + b[2] / 2, b[1] + b[3] / 2
+    inter = max(0.0, min(ax1, bx1) - max(ax0, bx0)) * max(0.0, min(ay1, by1) - max(ay0, by0))
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def build_distill_set(teacher_path, train_dir, out_dir, imgsz):
+    """
+    Mirror train_dir under out_dir with labels = ground truth + confident teacher
+    boxes that the ground truth doesn't already cover. Images are linked, not copied.
+    """
+    from ultralytics import YOLO
+
+    teacher = YOLO(teacher_path)
+    label_dir = os.path.join(os.path.dirname(os.path.normpath(train_dir)), "labels")
+    out_images = os.path.join(out_dir, "train", "images")
+    out_labels = os.path.join(out_dir, "train", "labels")
+    os.makedirs(out_images, exist_ok=True)
+    os.makedirs(out_labels, exist_ok=True)
+
+    added = 0
+    images = image_files(train_dir)
+    for result in teacher.predict(source=images, imgsz=imgsz, conf=TEACHER_CONF, device="cpu", stream=True,
+                                  verbose=False):
+        name = os.path.basename(result.path)
+        stem = os.path.splitext(name)[0]
+        boxes = []
+        gt_path = os.path.join(label_dir, stem + ".txt")
+        if os.path.exists(gt_path):
+            with open(gt_path) as f:
+                boxes = [(int(parts[0]), [float(v) for v in parts[1:5]]) for parts in map(str.split, f) if parts]
+        ground_truth = list(boxes)
+        for cls_id, xywhn in zip(result.boxes.cls.tolist(), result.boxes.xywhn.tolist()):
+            if all(c != int(cls_id) or box_iou(b, xywhn) < TEACHER_IOU for c, b in ground_truth):
+                boxes.append((int(cls_id), xywhn))
+                added += 1
+        target = os.path.join(out_images, name)
+        if not os.path.exists(target):
+            try:
+                os.symlink(os.path.abspath(result.path), target)
+            except OSError:  # No symlink permission (Windows)
+                import shutil
+                shutil.copy2(result.path, target)
+        with open(os.path.join(out_labels, stem + ".txt"), "w") as f:
+            f.writelines(f"{c} " + " ".join(f"{v:.6f}" for v in b) + "\n" for c, b in boxes)
+    print(f"Distillation set: {len(images)} images, {added} teacher boxes added")
+
+
+def student_config(nc, width, depth, out_dir):
+    """A YOLOv8 config scaled down to the given width/depth multipliers."""
+    from ultralytics.nn.tasks import yaml_model_load
+
+    config = yaml_model_load("yolov8n.yaml")
+    config["nc"] = nc
+    config["scales"] = {"n": [depth, width, 1024]}
+    for key in ("scale", "yaml_file"):
+        config.pop(key, None)
+    # The "yolov8n" prefix tells Ultralytics which scale entry to use
+    path = os.path.join(out_dir, f"yolov8n-student-w{width}.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return path
+
+
+def run_distill(args):
+    from ultralytics import YOLO
+
+    data_path, num_images = resolve_data_yaml(args.data, args.data_root)
+    with open(data_path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    out_dir = os.path.join(DISTILL_DIR, args.name)
+    build_distill_set(args.teacher, data["train"], out_dir, args.teacher_imgsz)
+
+    distill_data = dict(data, train=os.path.abspath(os.path.join(out_dir, "train", "images")))
+    distill_data_path = os.path.join(out_dir, "data.yaml")
+    with open(distill_data_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(distill_data, f, sort_keys=False)
+
+    cache = choose_cache(num_images, args.imgsz)
+    student = YOLO(student_config(len(data["names"]), args.width, STUDENT_DEPTH, out_dir))
+    student.train(data=distill_data_path, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch,
+                  workers=choose_workers(args.batch, cache), cache=cache or False, device="cpu",
+                  project=os.path.abspath(DISTILL_DIR), name=args.name, exist_ok=True)
+    weights = os.path.join(str(student.trainer.save_dir), "weights", "best.pt")
+    print(f"Student weights: {weights}")
+    print(f"Compare with: python model_sweep.py sweep --models {args.teacher} {weights} --imgsz {args.imgsz}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/accuracy sweep and model distillation")
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--data-root", default=None, help="Dataset root to re-base missing paths in the data yaml onto")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sweep_parser = sub.add_parser("sweep", help="Evaluate models x input sizes and print the Pareto frontier")
+    sweep_parser.add_argument("--models", nargs="+", default=[MODEL_PATH])
+    sweep_parser.add_argument("--imgsz", type=int, nargs="+", default=list(SWEEP_SIZES))
+    sweep_parser.add_argument("--metric", default=METRIC, choices=("map50", "map50_95"))
+    sweep_parser.add_argument("--write-profiles", action="store_true", help=f"Store the picks in {PROFILES_FILE}")
+    distill_parser = sub.add_parser("distill", help="Train a narrower student on teacher-augmented labels")
+    distill_parser.add_argument("--teacher", default=MODEL_PATH)
+    distill_parser.add_argument("--teacher-imgsz", type=int, default=640)
+    distill_parser.add_argument("--width", type=float, default=STUDENT_WIDTH, help="Student channel multiplier")
+    distill_parser.add_argument("--imgsz", type=int, default=416, help="Student training/input size")
+    distill_parser.add_argument("--epochs", type=int, default=50)
+    distill_parser.add_argument("--batch", type=int, default=16)
+    distill_parser.add_argument("--name", default="student")
+    args = parser.parse_args()
+    return run_sweep(args) if args.command == "sweep" else run_distill(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Alert notifications: pluggable notifiers behind one async delivery engine.
+
+Notifiers (Telegram, webhook, SMTP, JSON-lines file) and the severity routing
+are configured in notifiers.yaml. DeliveryEngine.submit() never blocks: each
+delivery is scheduled on the engine's asyncio loop, at most max_concurrency
+run at a time, failures are retried with backoff, and every notifier keeps its
+connection (HTTP keep-alive session / SMTP connection) open between sends.
+"""
+import asyncio
+import json
+import os
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import yaml
+
+from perf_stats import STATS
+
+# Constants
+NOTIFIERS_FILE = "notifiers.yaml"
+MAX_CONCURRENCY = 4  # Deliveries in flight at once, across all notifiers
+MAX_PENDING = 200  # Queued deliveries before new ones are dropped
+RETRIES = 2
+RETRY_BACKOFF = 1.0  # Seconds, doubled on every retry
+REQUEST_TIMEOUT = 10  # Seconds per HTTP/SMTP call
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+
+class Notification:
+    """One message to deliver, optionally with an image (e.g. a screenshot)."""
+
+    def __init__(self, text, severity="medium", image_path=None, title="Warning Triggered", data=None):
+        self.text = text
+        self.severity = severity
+        self.image_path = image_path
+        self.title = title
+        self.data = data or {}  # Structured fields for machine consumers (webhook, file)
+        self.time = time.time()
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "text": self.text,
+            "severity": self.severity,
+            "time": self.time,
+            "image": os.path.basename(self.image_path) if self.image_path else None,
+            "data": self.data
+        }
+
+
+class Notifier:
+    """Base class. send() runs on a delivery worker thread and raises on failure."""
+
+    stage = "notify"  # perf_stats stage used to time deliveries
+
+    def __init__(self, name):
+        self.name = name
+
+    def send(self, notification):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _HttpNotifier(Notifier):
+    """Shares one requests.Session (and its keep-alive pool) across deliveries."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def _check(self, response):
+        if response.status_code >= 300:
+            raise RuntimeError(f"{self.name}: HTTP {response.status_code} {response.text[:200]}")
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class TelegramNotifier(_HttpNotifier):
+    stage = "telegram"
+
+    def __init__(self, name, token, chat_id, api_url=TELEGRAM_API_URL, parse_mode="Markdown"):
+        super().__init__(name)
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}"
+        self.chat_id = chat_id
+        self.parse_mode = parse_mode
+
+    def send(self, notification):
+        payload = {"chat_id": self.chat_id, "parse_mode": self.parse_mode}
+        if notification.image_path:
+            payload["caption"] = notification.text
+            with open(notification.image_path, "rb") as photo_file:
+                response = self.session.post(f"{self.base_url}/sendPhoto", data=payload,
+                                             files={"photo": photo_file}, timeout=REQUEST_TIMEOUT)
+        else:
+            payload["text"] = notification.text
+            response = self.session.post(f"{self.base_url}/sendMessage", data=payload, timeout=REQUEST_TIMEOUT)
+        self._check(response)
+
+
+class WebhookNotifier(_HttpNotifier):
+    stage = "notify_webhook"
+
+    def __init__(self, name, url, headers=None, include_image=False):
+        super().__init__(name)
+        self.url = url
+        self.headers = headers or {}
+        self.include_image = include_image
+
+    def send(self, notification):
+        body = notification.to_dict()
+        if self.include_image and notification.image_path:
+            # multipart: the JSON payload plus the image file
+            with open(notification.image_path, "rb") as image_file:
+                response = self.session.post(self.url, headers=self.headers, data={"payload": json.dumps(body)},
+                                             files={"image": image_file}, timeout=REQUEST_TIMEOUT)
+        else:
+            response = self.session.post(self.url, headers=self.headers, json=body, timeout=REQUEST_TIMEOUT)
+        self._check(response)
+
+
+class SmtpNotifier(Notifier):
+    stage = "notify_smtp"
+
+    def __init__(self, name, host, to, sender, port=587, username=None, password=None, starttls=True):
+        super().__init__(name)
+        self.host = host
+        self.port = int(port)
+        self.to = [to] if isinstance(to, str) else list(to)
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.connection = None
+        self.lock = threading.Lock()  # smtplib connections are not thread-safe
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=REQUEST_TIMEOUT)
+        if self.starttls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password or "")
+        return connection
+
+    def send(self, notification):
+        message = EmailMessage()
+        message["Subject"] = f"[{notification.severity.upper()}] {notification.title}"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.to)
+        message.set_content(notification.text)
+        if notification.image_path:
+            with open(notification.image_path, "rb") as image_file:
+                subtype = os.path.splitext(notification.image_path)[1].lstrip(".").lower().replace("jpg", "jpeg")
+                message.add_attachment(image_file.read(), maintype="image", subtype=subtype or "png",
+                                       filename=os.path.basename(notification.image_path))
+
+        with self.lock:
+            for attempt in range(2):
+                if self.connection is None:
+                    self.connection = self._connect()
+                try:
+                    self.connection.send_message(message)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    # The server dropped the idle connection: reconnect once
+                    self.connection = None
+                    if attempt:
+                        raise
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                try:
+                    self.connection.quit()
+                except smtplib.SMTPException:
+                    pass
+                self.connection = None
+
+
+class FileNotifier(Notifier):
+    """Appends notifications as JSON lines (audit trail, or a sink for offline testing)."""
+
+    stage = "notify_file"
+
+    def __init__(self, name, path):
+        super().__init__(name)
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def send(self, notification):
+        line = json.dumps(notification.to_dict()) + "\n"
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+NOTIFIER_TYPES = {
+    "telegram": TelegramNotifier,
+    "webhook": WebhookNotifier,
+    "smtp": SmtpNotifier,
+    "file": FileNotifier
+}
+
+
+def load_notifier_config(path=NOTIFIERS_FILE):
+    """Parse notifiers.yaml. Returns (notifiers by name, routes by severity)."""
+    with open(path, encoding="utf-8") as f:
+        return build_notifiers(yaml.safe_load(f) or {})
+
+
+def build_notifiers(config):
+    """
+    Create the notifiers and routes from a parsed config dict.
+    String values may reference environment variables, e.g. token: ${TELEGRAM_BOT_TOKEN}.
+    Notifiers with enabled: false, or that reference an unset variable, are skipped.
+    """
+    notifiers = {}
+    for name, spec in (config.get("notifiers") or {}).items():
+        spec = {k: os.path.expandvars(v) if isinstance(v, str) else v for k, v in (spec or {}).items()}
+        if not spec.pop("enabled", True):
+            continue
+        unset = [k for k, v in spec.items() if isinstance(v, str) and re.search(r"\$\{?\w+", v)]
+        if unset:
+            print(f"Notifier '{name}' skipped: environment variable not set for {', '.join(unset)}")
+            continue
+        kind = spec.pop("type", name)
+        if kind not in NOTIFIER_TYPES:
+            raise ValueError(f"Notifier '{name}': unknown type '{kind}'")
+        try:
+            notifiers[name] = NOTIFIER_TYPES[kind](name, **spec)
+        except TypeError as e:
+            raise ValueError(f"Notifier '{name}': {e}")
+
+    routes = {}
+    for severity, targets in (config.get("routes") or {}).items():
+        routes[severity] = [t for t in (targets or []) if t in notifiers]
+    return notifiers, routes
+
+
+class DeliveryEngine:
+    """
+    Routes notifications by severity and delivers them on a background asyncio loop.
+    Blocking client calls run on a small thread pool sized to max_concurrency.
+    """
+
+    def __init__(self, notifiers, routes, max_concurrency=MAX_CONCURRENCY, max_pending=MAX_PENDING,
+                 retries=RETRIES, retry_backoff=RETRY_BACKOFF, stats=STATS):
+        self.notifiers = notifiers
+        self.routes = routes
+        self.max_pending = max_pending
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.stats = stats
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self.executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="notify")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def targets(self, severity):
+        return self.routes.get(severity, self.routes.get("default", []))
+
+    def submit(self, notification):
+        """Queue a notification for every notifier routed to its severity. Returns immediately."""
+        queued = 0
+        for name in self.targets(notification.severity):
+            with self.lock:
+                if self.pending >= self.max_pending:
+                    self.stats.incr("notify_dropped")
+                    continue
+                self.pending += 1
+                self.idle.clear()
+            self.stats.set_gauge("notify_queue_depth", self.pending)
+            asyncio.run_coroutine_threadsafe(self._deliver(self.notifiers[name], notification), self.loop)
+            queued += 1
+        return queued
+
+    async def _deliver(self, notifier, notification):
+        try:
+            async with self.semaphore:
+                for attempt in range(self.retries + 1):
+                    start = time.perf_counter()
+                    try:
+                        await self.loop.run_in_executor(self.executor, notifier.send, notification)
+                    except Exception as e:
+                        self.stats.incr("notify_failures")
+                        print(f"Notifier '{notifier.name}' failed (attempt {attempt + 1}): {e}")
+                        if attempt < self.retries:
+                            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                        continue
+                    self.stats.observe(notifier.stage, time.perf_counter() - start)
+                    self.stats.incr("notify_sent")
+                    return True
+            return False
+        finally:
+            with self.lock:
+                self.pending -= 1
+                if self.pending == 0:
+                    self.idle.set()
+            self.stats.set_gauge("notify_queue_depth", self.pending)
+
+    def flush(self, timeout=None):
+        """Wait until every queued delivery finished. Returns False on timeout."""
+        return self.idle.wait(timeout)
+
+    def close(self, timeout=REQUEST_TIMEOUT):
+        self.flush(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+        for notifier in self.notifiers.values():
+            notifier.close()
+
+
+def start_delivery_engine(path=NOTIFIERS_FILE, **kwargs):
+    """Build the engine from the config file. Without a usable file nothing is routed."""
+    try:
+        notifiers, routes = load_notifier_config(path)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Notifications disabled: could not load {path}: {e}")
+        notifiers, routes = {}, {}
+    return DeliveryEngine(notifiers, routes, **kwargs)
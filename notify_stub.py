@@ -0,0 +1,193 @@
+"""
+Local stand-ins for the notification services, for offline tests and load tests.
+
+    python notify_stub.py --http-port 8766 --smtp-port 8025 --delay 0.05 --fail-rate 0.1
+
+HTTP: answers the Telegram bot API (/bot<token>/sendMessage, /sendPhoto) and
+webhooks (any other POST path). SMTP: accepts every message. Point
+notifiers.yaml at it (telegram api_url, webhook url, smtp host/port with
+starttls: false) to exercise the whole delivery path without the internet.
+"""
+import argparse
+import json
+import random
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Constants
+STUB_HOST = "127.0.0.1"
+STUB_HTTP_PORT = 8766
+STUB_SMTP_PORT = 8025
+
+
+class StubRecorder:
+    """Counts what the stubs received; shared by the HTTP and SMTP handlers."""
+
+    def __init__(self, delay=0.0, fail_rate=0.0, seed=0):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.failed = 0
+        self.connections = 0
+        self.rng = random.Random(seed)
+
+    def hit(self, kind):
+        """Record one request. Returns False if it should be answered with an error."""
+        if self.delay:
+            time.sleep(self.delay)
+        with self.lock:
+            if self.fail_rate and self.rng.random() < self.fail_rate:
+                self.failed += 1
+                return False
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            return True
+
+    def connected(self):
+        with self.lock:
+            self.connections += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"received": dict(self.counts), "failed": self.failed, "connections": self.connections}
+
+
+class _HttpHandler(BaseHTTPRequestHandler):
+    recorder = None
+    protocol_version = "HTTP/1.1"  # Keep-alive, so client connection reuse is visible
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.recorder.connected()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if "/sendMessage" in self.path:
+            kind = "telegram_message"
+        elif "/sendPhoto" in self.path:
+            kind = "telegram_photo"
+        else:
+            kind = "webhook"
+        ok = self.recorder.hit(kind)
+        body = json.dumps({"ok": ok}).encode("utf-8")
+        self.send_response(200 if ok else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        body = json.dumps(self.recorder.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    recorder = None
+    disable_nagle_algorithm = True
+
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.recorder.connected()
+        self.reply("220 notify-stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 notify-stub")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.reply("250 OK" if self.recorder.hit("smtp") else "451 Temporary failure")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class NotifyStub:
+    """Runs the HTTP and SMTP stubs on daemon threads."""
+
+    def __init__(self, host=STUB_HOST, http_port=STUB_HTTP_PORT, smtp_port=STUB_SMTP_PORT, delay=0.0, fail_rate=0.0):
+        self.recorder = StubRecorder(delay, fail_rate)
+        http_handler = type("StubHttpHandler", (_HttpHandler,), {"recorder": self.recorder})
+        smtp_handler = type("StubSmtpHandler", (_SmtpHandler,), {"recorder": self.recorder})
+        self.http = ThreadingHTTPServer((host, http_port), http_handler)
+        self.http.daemon_threads = True
+        self.smtp = _ThreadingTCPServer((host, smtp_port), smtp_handler)
+        self.host = host
+        self.http_port = self.http.server_address[1]
+        self.smtp_port = self.smtp.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.http.shutdown()
+        self.smtp.shutdown()
+        self.http.server_close()
+        self.smtp.server_close()
+
+    def notifier_config(self, file_path=None):
+        """A notifiers/routes config pointing every channel at this stub."""
+        http_url = f"http://{self.host}:{self.http_port}"
+        notifiers = {
+            "telegram": {"type": "telegram", "token": "stub", "chat_id": "1", "api_url": http_url},
+            "webhook": {"type": "webhook", "url": f"{http_url}/webhook"},
+            "email": {"type": "smtp", "host": self.host, "port": self.smtp_port, "sender": "stub@localhost",
+                      "to": ["supervisor@localhost"], "starttls": False}
+        }
+        if file_path:
+            notifiers["audit_file"] = {"type": "file", "path": file_path}
+        return {"notifiers": notifiers, "routes": {"default": list(notifiers)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Telegram/webhook/SMTP stub for notification tests")
+    parser.add_argument("--host", default=STUB_HOST)
+    parser.add_argument("--http-port", type=int, default=STUB_HTTP_PORT)
+    parser.add_argument("--smtp-port", type=int, default=STUB_SMTP_PORT)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    args = parser.parse_args()
+
+    stub = NotifyStub(args.host, args.http_port, args.smtp_port, args.delay, args.fail_rate).start()
+    print(f"Stub HTTP on http://{args.host}:{stub.http_port} (GET for counts), SMTP on {args.host}:{stub.smtp_port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(stub.recorder.snapshot())
+    except KeyboardInterrupt:
+        stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Constants
+WINDOW_SIZE = 500  # Number of recent samples kept per stage for percentiles
+FPS_WINDOW = 120  # Number of recent frame timestamps used for the FPS estimate
+METRICS_HOST = "127.0.0.1"  # Only expose metrics on the local machine
+METRICS_PORT = 9108
+METRIC_PREFIX = "rwc"
+
+# Pipeline stages in the order they happen for a single frame
+STAGES = [
+    "capture",
+    "preprocess",
+    "inference",
+    "postprocess",
+    "alert",
+    "render",
+    "logging",
+    "telegram"
+]
+
+
+class StageTimer:
+    """Keeps a rolling window of durations (in seconds) for one pipeline stage."""
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentiles(self, quantiles):
+        """Return {quantile: value} over the rolling window (nearest-rank)."""
+        if not self.samples:
+            return {q: 0.0 for q in quantiles}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in quantiles}
+
+
+class PerfStats:
+    """Thread-safe registry of stage timers, counters and gauges."""
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.window = window
+        self.lock = threading.Lock()
+        self.timers = {stage: StageTimer(window) for stage in STAGES}
+        self.counters = {}
+        self.gauges = {}
+        self.frame_times = deque(maxlen=FPS_WINDOW)
+        self.started = time.time()
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager that records how long the wrapped block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            timer = self.timers.get(stage)
+            if timer is None:
+                timer = self.timers[stage] = StageTimer(self.window)
+            timer.add(seconds)
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        """Adjust a gauge in place (e.g. +1/-1 for items in flight)."""
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def tick_frame(self):
+        """Mark the end of one processed frame (used for the FPS estimate)."""
+        with self.lock:
+            self.frame_times.append(time.perf_counter())
+            self.counters["frames_processed"] = self.counters.get("frames_processed", 0) + 1
+
+    def fps(self):
+        with self.lock:
+            if len(self.frame_times) < 2:
+                return 0.0
+            span = self.frame_times[-1] - self.frame_times[0]
+            return (len(self.frame_times) - 1) / span if span > 0 else 0.0
+
+    def reset(self):
+        with self.lock:
+            self.timers = {stage: StageTimer(self.window) for stage in STAGES}
+            self.counters = {}
+            self.gauges = {}
+            self.frame_times.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Return a plain-dict copy of all metrics (safe to serialize)."""
+        fps = self.fps()
+        with self.lock:
+            stages = {}
+            for stage, timer in self.timers.items():
+                pct = timer.percentiles(self.QUANTILES)
+                stages[stage] = {
+                    "count": timer.count,
+                    "total": timer.total,
+                    "mean": timer.total / timer.count if timer.count else 0.0,
+                    "p50": pct[0.5],
+                    "p90": pct[0.9],
+                    "p99": pct[0.99]
+                }
+            return {
+                "uptime": time.time() - self.started,
+                "fps": fps,
+                "stages": stages,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges)
+            }
+
+    def summary_lines(self):
+        """Human-readable summary used by the GUI stats window and overlay."""
+        snap = self.snapshot()
+        lines = [f"FPS: {snap['fps']:.1f}"]
+        for stage, values in snap["stages"].items():
+            if values["count"] == 0:
+                continue
+            lines.append(
+                f"{stage:<12} p50 {values['p50'] * 1000:7.1f} ms   "
+                f"p99 {values['p99'] * 1000:7.1f} ms   n={values['count']}"
+            )
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"{name}: {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"{name}: {value}")
+        return lines
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        out = []
+
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        out.append(f"# HELP {name} Duration of pipeline stages over a rolling window.")
+        out.append(f"# TYPE {name} summary")
+        for stage, values in snap["stages"].items():
+            for q, key in ((0.5, "p50"), (0.9, "p90"), (0.99, "p99")):
+                out.append(f'{name}{{stage="{stage}",quantile="{q}"}} {values[key]:.6f}')
+            out.append(f'{name}_sum{{stage="{stage}"}} {values["total"]:.6f}')
+            out.append(f'{name}_count{{stage="{stage}"}} {values["count"]}')
+
+        name = f"{METRIC_PREFIX}_fps"
+        out.append(f"# HELP {name} Processed frames per second.")
+        out.append(f"# TYPE {name} gauge")
+        out.append(f"{name} {snap['fps']:.3f}")
+
+        for counter, value in sorted(snap["counters"].items()):
+            name = f"{METRIC_PREFIX}_{_sanitize(counter)}_total"
+            out.append(f"# TYPE {name} counter")
+            out.append(f"{name} {value}")
+
+        for gauge, value in sorted(snap["gauges"].items()):
+            name = f"{METRIC_PREFIX}_{_sanitize(gauge)}"
+            out.append(f"# TYPE {name} gauge")
+            out.append(f"{name} {value}")
+
+        return "\n".join(out) + "\n"
+
+
+def _sanitize(name):
+    """Make a metric name Prometheus-safe."""
+    return "".join(ch if ch.isalnum() or ch == "_" else "_" for ch in name)
+
+
+# Shared registry used by the whole application
+STATS = PerfStats()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    stats = STATS
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.stats.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet; scrapes happen every few seconds
+        pass
+
+
+def start_metrics_server(stats=STATS, host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a daemon thread. Returns the server or None on failure."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"stats": stats})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"Could not start metrics server on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,377 @@
+"""
+Batch photo processing and a lazily loaded result gallery.
+
+PhotoBatchJob runs YOLO on many photos in batches on a background thread:
+the next batch is decoded while the current one is inferred, and annotated
+results go to the evidence store through a separate writer thread. With a
+ResultCache, photos processed before (same content, weights and settings)
+are taken from the cache and skip inference.
+
+Gallery is a scrollable Tk window of thumbnails. Only the rows on screen
+are decoded (on a loader thread, using JPEG draft mode), and thumbnails are
+kept in an LRU cache, so scrolling through hundreds of results stays smooth.
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from detector import result_detections
+from perf_stats import STATS
+
+# Constants
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+BATCH_SIZE = 8  # Photos per YOLO call
+WRITE_QUEUE_SIZE = 16  # Annotated results waiting for the writer (bounds memory)
+THUMB_SIZE = (160, 120)
+THUMB_CACHE_SIZE = 300  # Thumbnails kept in memory (least recently shown are dropped first)
+CELL_PADDING = 10
+CAPTION_HEIGHT = 18
+POLL_INTERVAL = 50  # Milliseconds between checks for finished thumbnails
+
+
+def list_images(paths):
+    """Expand files and directories into a sorted list of image files."""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(os.path.join(path, name))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            images.append(path)
+    return images
+
+
+def decode_images(paths):
+    """BGR images of the paths (None for files that can't be read)."""
+    import cv2
+
+    return [cv2.imread(path) for path in paths]
+
+
+def detection_caption(detections):
+    """Short "phone x2, food" summary of detector.result_detections()."""
+    counts = {}
+    for detection in detections:
+        counts[detection["name"]] = counts.get(detection["name"], 0) + 1
+    return ", ".join(name if n == 1 else f"{name} x{n}" for name, n in sorted(counts.items())) or "nothing"
+
+
+class PhotoBatchJob:
+    """
+    Detect objects in a list of photos on a background thread.
+    `results` fills up with (source path, result path, caption) as photos finish.
+    """
+
+    def __init__(self, model, paths, evidence, batch_size=BATCH_SIZE, cache=None, model_path=None,
+                 **predict_kwargs):
+        self.model = model
+        self.paths = list(paths)
+        self.evidence = evidence
+        self.batch_size = batch_size
+        self.cache = cache if model_path else None
+        self.model_path = model_path
+        self.keys = {}  # source path -> result cache key
+        self.predict_kwargs = predict_kwargs
+        self.lock = threading.Lock()
+        self.results = []
+        self.failed = []
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def progress(self):
+        with self.lock:
+            return len(self.results) + len(self.failed), len(self.paths)
+
+    def run(self):
+        writer = threading.Thread(target=self._write_loop, daemon=True)
+        writer.start()
+        paths = self._from_cache() if self.cache is not None else self.paths
+        batches = [paths[i:i + self.batch_size] for i in range(0, len(paths), self.batch_size)]
+        # Decoding the next batch overlaps with inference on the current one
+        with ThreadPoolExecutor(max_workers=2) as decoder:
+            pending = decoder.submit(decode_images, batches[0]) if batches else None
+            for i, batch in enumerate(batches):
+                with STATS.time("photo_decode"):
+                    images = pending.result()
+                if i + 1 < len(batches):
+                    pending = decoder.submit(decode_images, batches[i + 1])
+                if self.cancelled.is_set():
+                    break
+                self._process(batch, images)
+        self.write_queue.put(None)
+        writer.join()
+        self.done.set()
+
+    def _from_cache(self):
+        """Add the cached results to `results`; returns the paths that still need inference."""
+        remaining = []
+        for path in self.paths:
+            if self.cancelled.is_set():
+                return []
+            try:
+                key = self.keys[path] = self.cache.key(path, self.model_path, "photo", self.predict_kwargs)
+            except OSError as e:
+                print(f"Error reading {path}: {e}")
+                remaining.append(path)  # Decoding will report it as failed
+                continue
+            entry = self.cache.get(key)
+            if entry is None:
+                remaining.append(path)
+                continue
+            with self.lock:
+                self.results.append((path, entry["outputs"]["result"], detection_caption(entry["detections"] or [])))
+        return remaining
+
+    def _process(self, paths, images):
+        valid = [(path, image) for path, image in zip(paths, images) if image is not None]
+        with self.lock:
+            self.failed.extend(path for path, image in zip(paths, images) if image is None)
+        if not valid:
+            return
+        try:
+            with STATS.time("photo_batch"):
+                results = self.model.predict(source=[image for _, image in valid], show=False, verbose=False,
+                                             **self.predict_kwargs)
+        except Exception as e:
+            print(f"Error processing photos: {e}")
+            with self.lock:
+                self.failed.extend(path for path, _ in valid)
+            return
+        STATS.incr("photos_processed", len(valid))
+        for (path, _), result in zip(valid, results):
+            # Blocks when the writer falls behind, so annotated images don't pile up in memory
+            self.write_queue.put((path, result.plot(), result_detections(result)))
+
+    def _write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                return
+            path, annotated, detections = item
+            try:
+                result_path = self.evidence.put_image(annotated, kind="result", meta={"source": path})
+                if path in self.keys:
+                    self.cache.put(self.keys[path], "photo", path, {"result": result_path}, detections)
+            except Exception as e:
+                print(f"Error saving result for {path}: {e}")
+                with self.lock:
+                    self.failed.append(path)
+                continue
+            with self.lock:
+                self.results.append((path, result_path, detection_caption(detections)))
+
+
+class ThumbnailCache:
+    """LRU cache of Tk thumbnails keyed by image path."""
+
+    def __init__(self, capacity=THUMB_CACHE_SIZE):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def get(self, path):
+        photo = self.items.get(path)
+        if photo is None:
+            STATS.incr("thumb_cache_misses")
+            return None
+        self.items.move_to_end(path)
+        STATS.incr("thumb_cache_hits")
+        return photo
+
+    def put(self, path, photo):
+        self.items[path] = photo
+        self.items.move_to_end(path)
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+            STATS.incr("thumb_cache_evictions")
+        STATS.set_gauge("thumb_cache_size", len(self.items))
+
+
+def load_thumbnail(path, size=THUMB_SIZE):
+    """Decode an image at roughly thumbnail size (JPEG draft mode skips most of the work)."""
+    from PIL import Image
+
+    with STATS.time("thumbnail"):
+        image = Image.open(path)
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        image.thumbnail(size)
+        return image
+
+
+class Gallery:
+    """
+    Scrollable grid of result thumbnails in a Toplevel. Items can be added while
+    it is open; clicking a thumbnail calls on_open(path).
+    """
+
+    def __init__(self, master, title="Results", on_open=None, thumb_size=THUMB_SIZE,
+                 cache_size=THUMB_CACHE_SIZE):
+        import tkinter as tk
+
+        self.thumb_size = thumb_size
+        self.on_open = on_open
+        self.cache = ThumbnailCache(cache_size)
+        self.items = []  # (path, caption)
+        self.shown = {}  # item index -> (canvas image id, Tk image); the reference keeps evicted images alive
+        self.requested = set()
+        self.loaded = queue.Queue()
+        self.loader = ThreadPoolExecutor(max_workers=2)
+        self.columns = 1
+        self.closed = False
+
+        self.window = tk.Toplevel(master)
+        self.window.title(title)
+        self.window.configure(bg="#343541")
+        self.window.geometry("900x600")
+        self.status = tk.Label(self.window, text="", bg="#343541", fg="white", anchor="w")
+        self.status.pack(fill="x", padx=10, pady=(10, 0))
+        frame = tk.Frame(self.window, bg="#343541")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.canvas = tk.Canvas(frame, bg="#454545", highlightthickness=0)
+        scrollbar = tk.Scrollbar(frame, orient="vertical", command=self._on_scroll)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar = scrollbar
+
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+        self.canvas.bind("<MouseWheel>", lambda e: self._on_scroll("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self._on_scroll("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self._on_scroll("scroll", 1, "units"))
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.after(POLL_INTERVAL, self._poll)
+
+    @property
+    def cell(self):
+        width, height = self.thumb_size
+        return width + 2 * CELL_PADDING, height + CAPTION_HEIGHT + 2 * CELL_PADDING
+
+    def set_status(self, text):
+        if not self.closed:
+            self.status.config(text=text)
+
+    def add(self, path, caption=""):
+        self.items.append((path, caption))
+        self._draw_placeholder(len(self.items) - 1)
+        self._update_scrollregion()
+        self.refresh()
+
+    def layout(self):
+        """Re-flow the grid for the current window width."""
+        cell_width, _ = self.cell
+        columns = max(1, self.canvas.winfo_width() // cell_width)
+        if columns == self.columns and self.canvas.find_withtag("cell"):
+            self.refresh()
+            return
+        self.columns = columns
+        self.canvas.delete("all")
+        self.shown.clear()
+        for index in range(len(self.items)):
+            self._draw_placeholder(index)
+        self._update_scrollregion()
+        self.refresh()
+
+    def _position(self, index):
+        cell_width, cell_height = self.cell
+        row, column = divmod(index, self.columns)
+        return column * cell_width + CELL_PADDING, row * cell_height + CELL_PADDING
+
+    def _draw_placeholder(self, index):
+        x, y = self._position(index)
+        width, height = self.thumb_size
+        path, caption = self.items[index]
+        tag = f"item{index}"
+        self.canvas.create_rectangle(x, y, x + width, y + height, fill="#343541", outline="#5a5a5a",
+                                     tags=("cell", tag))
+        self.canvas.create_text(x + width // 2, y + height + CAPTION_HEIGHT // 2 + 2, text=caption, fill="white",
+                                width=width, font=("Helvetica", 9), tags=("cell", tag))
+        self.canvas.tag_bind(tag, "<Button-1>", lambda e, p=path: self.on_open and self.on_open(p))
+
+    def _update_scrollregion(self):
+        _, cell_height = self.cell
+        rows = (len(self.items) + self.columns - 1) // self.columns
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell[0], rows * cell_height + CELL_PADDING))
+
+    def _on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+
+    def visible_range(self):
+        """Indexes of the items in the rows on screen (plus one row either side)."""
+        _, cell_height = self.cell
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // cell_height) - 1)
+        last_row = int(bottom // cell_height) + 1
+        return range(first_row * self.columns, min(len(self.items), (last_row + 1) * self.columns))
+
+    def refresh(self):
+        """Show the visible thumbnails: from the cache, or by queueing their decode. Others are dropped."""
+        if self.closed:
+            return
+        visible = self.visible_range()
+        for index in list(self.shown):
+            if index not in visible:
+                self.canvas.delete(self.shown.pop(index)[0])
+        for index in visible:
+            if index in self.shown:
+                continue
+            path = self.items[index][0]
+            photo = self.cache.get(path)
+            if photo is not None:
+                self._show(index, photo)
+            elif path not in self.requested:
+                self.requested.add(path)
+                self.loader.submit(self._load, index, path)
+
+    def _load(self, index, path):
+        try:
+            self.loaded.put((index, path, load_thumbnail(path, self.thumb_size)))
+        except Exception as e:
+            print(f"Error loading thumbnail {path}: {e}")
+            self.loaded.put((index, path, None))
+
+    def _poll(self):
+        """Turn decoded images into Tk images; only the Tk thread may create them."""
+        if self.closed:
+            return
+        from PIL import ImageTk
+
+        visible = self.visible_range()
+        while True:
+            try:
+                index, path, image = self.loaded.get_nowait()
+            except queue.Empty:
+                break
+            self.requested.discard(path)
+            if image is None:
+                continue
+            photo = ImageTk.PhotoImage(image)
+            self.cache.put(path, photo)
+            if index in visible and index not in self.shown:
+                self._show(index, photo)
+        self.window.after(POLL_INTERVAL, self._poll)
+
+    def _show(self, index, photo):
+        x, y = self._position(index)
+        width, height = self.thumb_size
+        item = self.canvas.create_image(x + width // 2, y + height // 2, image=photo, tags=("cell", f"item{index}"))
+        self.shown[index] = (item, photo)
+
+    def close(self):
+        self.closed = True
+        self.loader.shutdown(wait=False)
+        self.cache.items.clear()
+        self.shown.clear()
+        self.window.destroy()
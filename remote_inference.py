@@ -0,0 +1,461 @@
+"""
+Split (thin client) mode: capture on the worker's machine, inference on a central server.
+
+The client only captures, runs the scene-change gate and sends downscaled JPEG
+keyframes, delta crops of the changed region, or tiny "skip" messages when
+nothing changed. JPEG quality adapts to a bandwidth target. The server decodes
+each client's stream, batches inference across clients, runs each client's
+alert rules and replies with detections and alerts.
+
+    python remote_inference.py server --port 8770
+    python remote_inference.py client --source 0 --user alice --host 127.0.0.1 --port 8770
+
+Wire format, both directions: 8-byte header (">II": JSON length, payload length),
+the JSON header, then the payload (JPEG bytes, or nothing).
+"""
+import argparse
+import json
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from perf_stats import STATS
+from detector import MODEL_PATH, LiveDetector, get_model, result_arrays, result_detections
+from alert_rules import RuleEngine
+from alert_aggregator import AlertAggregator
+from api_server import incident_event
+from scene_gate import SceneChangeGate
+
+# Constants
+REMOTE_HOST = "127.0.0.1"
+REMOTE_PORT = 8770
+SEND_WIDTH = 640  # Frames are downscaled to this width before sending (the model's input size)
+KEYFRAME_INTERVAL = 5.0  # Seconds between full keyframes (bounds drift and recovers from loss)
+DELTA_MAX_AREA = 0.5  # Changed region larger than this fraction of the frame -> send a keyframe
+START_QUALITY = 75
+MIN_QUALITY = 35
+MAX_QUALITY = 90
+TARGET_KBPS = 800  # Upstream bandwidth target per client
+MAX_IN_FLIGHT = 2  # Frames awaiting a result before the client drops new frames
+RESULT_TIMEOUT = 5.0  # Seconds after which a frame's result is given up on
+BATCH_SIZE = 8  # Frames inferred together, across clients
+BATCH_WAIT = 0.01  # Seconds to wait for more frames to fill a batch
+HEADER = struct.Struct(">II")
+
+
+def send_message(sock, header, payload=b""):
+    head = json.dumps(header).encode("utf-8")
+    sock.sendall(HEADER.pack(len(head), len(payload)) + head + payload)
+    return HEADER.size + len(head) + len(payload)
+
+
+def recv_message(rfile):
+    """Read one message. Returns (header, payload), or (None, None) when the peer closed."""
+    prefix = rfile.read(HEADER.size)
+    if len(prefix) < HEADER.size:
+        return None, None
+    head_len, payload_len = HEADER.unpack(prefix)
+    header = json.loads(rfile.read(head_len).decode("utf-8"))
+    payload = rfile.read(payload_len) if payload_len else b""
+    return header, payload
+
+
+class RemoteInferenceClient:
+    """
+    Thin client. submit() encodes and sends one frame (or nothing) and returns
+    immediately; results arrive on a receiver thread (latest_result / on_result).
+    """
+
+    def __init__(self, host=REMOTE_HOST, port=REMOTE_PORT, user=None, send_width=SEND_WIDTH,
+                 target_kbps=TARGET_KBPS, keyframe_interval=KEYFRAME_INTERVAL, max_in_flight=MAX_IN_FLIGHT,
+                 on_result=None, stats=STATS):
+        self.send_width = send_width
+        self.target_bytes_per_s = target_kbps * 1000 / 8.0
+        self.keyframe_interval = keyframe_interval
+        self.max_in_flight = max_in_flight
+        self.on_result = on_result
+        self.stats = stats
+
+        self.gate = SceneChangeGate()
+        self.reference = None  # Our copy of the server's reconstructed frame
+        self.last_keyframe = 0.0
+        self.quality = START_QUALITY
+        self.seq = 0
+        self.sent_window = deque()  # (time, bytes) over the last second
+        self.counts = {"key": 0, "delta": 0, "skip": 0, "dropped": 0}
+        self.bytes_sent = 0
+        self.latencies = []
+
+        self.lock = threading.Lock()
+        self.in_flight = {}  # seq -> send time
+        self.latest_result = None
+
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+        send_message(self.sock, {"type": "hello", "user": user})
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def _receive(self):
+        while True:
+            try:
+                header, _ = recv_message(self.rfile)
+            except (OSError, ValueError):
+                header = None
+            if header is None:
+                return
+            if header.get("type") == "error":
+                with self.lock:
+                    self.in_flight.pop(header.get("seq"), None)
+                self.stats.incr("remote_frame_errors")
+                print(f"Server could not process frame {header.get('seq')}: {header.get('error')}")
+                continue
+            with self.lock:
+                sent = self.in_flight.pop(header.get("seq"), None)
+                self.latest_result = header
+            if sent is not None:
+                latency = time.perf_counter() - sent
+                self.latencies.append(latency)
+                self.stats.observe("remote_roundtrip", latency)
+            if self.on_result is not None:
+                self.on_result(header)
+
+    def _adapt_quality(self, now, nbytes):
+        """AIMD on the JPEG quality to stay under the bandwidth target."""
+        self.sent_window.append((now, nbytes))
+        while self.sent_window and now - self.sent_window[0][0] > 1.0:
+            self.sent_window.popleft()
+        rate = sum(b for _, b in self.sent_window)
+        if rate > self.target_bytes_per_s:
+            self.quality = max(MIN_QUALITY, self.quality - 5)
+        elif rate < 0.7 * self.target_bytes_per_s:
+            self.quality = min(MAX_QUALITY, self.quality + 1)
+        self.stats.set_gauge("remote_jpeg_quality", self.quality)
+
+    def submit(self, frame, current_time=None):
+        """
+        Gate, encode and send one BGR frame. Returns "key", "delta", "skip" or "dropped".
+        Raises ConnectionError once the connection to the server is gone.
+        """
+        if not self.receiver.is_alive():
+            raise ConnectionError("Connection to the inference server closed")
+        if current_time is None:
+            current_time = time.time()
+        with self.lock:
+            # Results that never came (lost in a server error) must not block new frames forever
+            expired = [seq for seq, sent in self.in_flight.items() if time.perf_counter() - sent > RESULT_TIMEOUT]
+            for seq in expired:
+                del self.in_flight[seq]
+            if expired:
+                self.stats.incr("remote_results_lost", len(expired))
+            if len(self.in_flight) >= self.max_in_flight:
+                # The server is behind: drop instead of queueing stale frames
+                self.counts["dropped"] += 1
+                self.stats.incr("remote_frames_dropped")
+                return "dropped"
+
+        with self.stats.time("preprocess"):
+            height, width = frame.shape[:2]
+            if width > self.send_width:
+                frame = cv2.resize(frame, (self.send_width, int(height * self.send_width / width)),
+                                   interpolation=cv2.INTER_AREA)
+            fraction, rect = self.gate.measure(frame)
+
+        now = time.monotonic()
+        frame_area = frame.shape[0] * frame.shape[1]
+        if (self.reference is None or now - self.last_keyframe >= self.keyframe_interval
+                or (rect is not None and rect[2] * rect[3] > DELTA_MAX_AREA * frame_area)):
+            kind = "key"
+            rect = (0, 0, frame.shape[1], frame.shape[0])
+        elif fraction < self.gate.min_changed:
+            kind = "skip"
+        else:
+            kind = "delta"
+
+        self.seq += 1
+        header = {"type": kind, "seq": self.seq, "time": current_time}
+        payload = b""
+        if kind != "skip":
+            x, y, w, h = rect
+            with self.stats.time("encode"):
+                ok, buf = cv2.imencode(".jpg", frame[y:y + h, x:x + w], [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                payload = buf.tobytes()
+                # Mirror what the server will reconstruct so deltas never drift
+                decoded = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+                if kind == "key":
+                    self.reference = decoded
+                    self.last_keyframe = now
+                else:
+                    self.reference[y:y + h, x:x + w] = decoded
+                self.gate.set_reference(self.reference)
+            header["rect"] = [x, y, w, h]
+            header["size"] = [frame.shape[1], frame.shape[0]]
+
+        with self.lock:
+            self.in_flight[self.seq] = time.perf_counter()
+        nbytes = send_message(self.sock, header, payload)
+        self.bytes_sent += nbytes
+        self.counts[kind] += 1
+        self.stats.incr("remote_bytes_sent", nbytes)
+        self._adapt_quality(now, nbytes)
+        return kind
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _ClientSession:
+    """Server-side state for one connected client."""
+
+    def __init__(self, model, sock, user, stats):
+        self.sock = sock
+        self.user = user
+        self.detector = LiveDetector(model, RuleEngine(), stats=stats)
+        self.aggregator = AlertAggregator(self.detector.rules)
+        self.frame = None  # Reconstructed frame (keyframe + applied deltas)
+        self.arrays = ([], [])  # Last (class ids, confidences), reused for skipped frames
+        self.detections = []
+        self.send_lock = threading.Lock()
+
+    def apply(self, header, payload):
+        """
+        Decode a keyframe or delta into the reconstructed frame. Returns a copy to infer on,
+        or None for a payload that can't be decoded or doesn't fit (the reference is kept).
+        """
+        image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        if header["type"] == "key" or self.frame is None:
+            self.frame = image
+        else:
+            x, y, w, h = header["rect"]
+            region = self.frame[y:y + h, x:x + w]
+            if region.shape != image.shape:
+                return None
+            region[:] = image
+        return self.frame.copy()
+
+    def reply(self, header):
+        with self.send_lock:
+            try:
+                send_message(self.sock, header)
+            except OSError:
+                pass  # Client went away; its handler thread cleans up
+
+    def reply_error(self, seq, error):
+        """Tell the client a frame failed, so it stops waiting for the result."""
+        self.reply({"type": "error", "seq": seq, "error": str(error)})
+
+
+class InferenceServer:
+    """
+    Accepts thin clients, decodes their streams on per-client threads and runs
+    batched inference for all of them on one inference thread.
+    """
+
+    def __init__(self, model, host=REMOTE_HOST, port=REMOTE_PORT, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT,
+                 stats=STATS, **predict_kwargs):
+        self.model = model
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.stats = stats
+        self.predict_kwargs = predict_kwargs
+        self.work = queue.Queue()
+        self.stop_event = threading.Event()
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def handle(self):
+                server._serve_client(self.request, self.rfile)
+
+        self.tcp = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.tcp.daemon_threads = True
+        self.port = self.tcp.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.tcp.serve_forever, daemon=True).start()
+        threading.Thread(target=self._inference_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.tcp.shutdown()
+        self.tcp.server_close()
+
+    def _serve_client(self, sock, rfile):
+        header, _ = recv_message(rfile)
+        if header is None or header.get("type") != "hello":
+            return
+        session = _ClientSession(self.model, sock, header.get("user"), self.stats)
+        self.stats.add_gauge("remote_clients", 1)
+        try:
+            while True:
+                header, payload = recv_message(rfile)
+                if header is None:
+                    break
+                self.stats.incr("remote_bytes_received", HEADER.size + len(payload))
+                frame = None
+                if header["type"] in ("key", "delta"):
+                    with self.stats.time("decode"):
+                        frame = session.apply(header, payload)
+                    if frame is None:
+                        self.stats.incr("remote_decode_errors")
+                        session.reply_error(header.get("seq"), "could not decode frame")
+                        continue
+                # Skips go through the same queue so they are evaluated in order
+                self.work.put((session, header, frame))
+        except (OSError, ValueError) as e:
+            print(f"Remote client {session.user or 'unknown'} disconnected: {e}")
+        finally:
+            self.stats.add_gauge("remote_clients", -1)
+
+    def _next_batch(self):
+        try:
+            items = [self.work.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.batch_wait
+        while len(items) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self.work.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _inference_loop(self):
+        while not self.stop_event.is_set():
+            items = self._next_batch()
+            if not items:
+                continue
+            frames = [frame for _, _, frame in items if frame is not None]
+            results = iter(())
+            if frames:
+                try:
+                    results = iter(self.model.predict(source=frames, show=False, **self.predict_kwargs))
+                except Exception as e:
+                    # Keep the (only) inference thread alive; the clients learn the batch failed
+                    print(f"Error running inference on a batch of {len(frames)}: {e}")
+                    self.stats.incr("remote_batch_errors")
+                    for session, header, _ in items:
+                        session.reply_error(header.get("seq"), e)
+                    continue
+                self.stats.incr("remote_batches")
+                self.stats.set_gauge("remote_batch_size", len(frames))
+
+            for session, header, frame in items:
+                current_time = header["time"]
+                try:
+                    if frame is not None:
+                        result, detected_classes, fired = session.detector.process_result(next(results), current_time)
+                        session.arrays = result_arrays(result)
+                        session.detections = result_detections(result)
+                    else:
+                        detected_classes, fired = session.detector.evaluate(*session.arrays, current_time)
+                    incident = session.aggregator.submit(fired, session.user, current_time)
+                except Exception as e:
+                    print(f"Error processing frame {header.get('seq')} for {session.user}: {e}")
+                    session.reply_error(header.get("seq"), e)
+                    continue
+                alerts = [incident_event(incident, session.detector.rules)] if incident is not None else []
+                session.reply({"type": "result", "seq": header["seq"], "detections": session.detections,
+                               "classes": detected_classes, "alerts": alerts})
+                self.stats.tick_frame()
+
+
+def run_server(args):
+    predict_kwargs = {"verbose": False}
+    if args.device:
+        predict_kwargs["device"] = args.device
+    model = get_model(args.model, warmup=True)
+    server = InferenceServer(model, args.host, args.port, batch_size=args.batch, **predict_kwargs).start()
+    print(f"Inference server listening on {args.host}:{server.port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"fps {STATS.fps():.1f} | clients {STATS.snapshot()['gauges'].get('remote_clients', 0)}")
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+def run_client(args):
+    from headless import open_source
+
+    def on_result(result):
+        for alert in result["alerts"]:
+            print(f"Alert: {' | '.join(alert['messages'])} ({alert['level']})")
+
+    cap = open_source(args.source)
+    if not cap.isOpened():
+        print(f"Could not open source: {args.source}")
+        return 1
+    client = RemoteInferenceClient(args.host, args.port, user=args.user, target_kbps=args.kbps, on_result=on_result)
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while args.frames is None or frames < args.frames:
+            with STATS.time("capture"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            client.submit(frame)
+            frames += 1
+    except KeyboardInterrupt:
+        pass
+    except ConnectionError as e:
+        print(f"Stopped: {e}")
+    finally:
+        elapsed = time.perf_counter() - start
+        client.close()
+        cap.release()
+    print(f"Frames: {client.counts} | sent {client.bytes_sent / 1024.0:.0f} KiB "
+          f"({client.bytes_sent * 8 / 1000.0 / max(elapsed, 1e-6):.0f} kbps)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split capture (thin client) / inference (server) mode")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    server_parser = sub.add_parser("server", help="Run batched inference for remote clients")
+    server_parser.add_argument("--host", default=REMOTE_HOST)
+    server_parser.add_argument("--port", type=int, default=REMOTE_PORT)
+    server_parser.add_argument("--model", default=MODEL_PATH)
+    server_parser.add_argument("--device", default=None)
+    server_parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    server_parser.set_defaults(func=run_server)
+
+    client_parser = sub.add_parser("client", help="Capture and stream frames to an inference server")
+    client_parser.add_argument("--host", default=REMOTE_HOST)
+    client_parser.add_argument("--port", type=int, default=REMOTE_PORT)
+    client_parser.add_argument("--source", default="0", help="Camera index, video file/URL, or 'synthetic'")
+    client_parser.add_argument("--user", default=None)
+    client_parser.add_argument("--kbps", type=int, default=TARGET_KBPS, help="Upstream bandwidth target")
+    client_parser.add_argument("--frames", type=int, default=None)
+    client_parser.set_defaults(func=run_client)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
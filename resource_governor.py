@@ -0,0 +1,168 @@
+"""
+CPU budget for the monitoring process.
+
+YOLO (PyTorch), OpenCV and dlib each start a thread pool as large as the
+machine, and together with the Telegram and screenshot threads they crowd out
+the worker's own applications. The governor:
+
+- sizes every library's thread pool from one budget (a share of the machine's
+  cores) before the libraries are imported, and sets PyTorch/OpenCV again once
+  they are loaded;
+- measures the process' total CPU use (all threads) once per CONTROL_INTERVAL;
+- when the process is over budget, lowers the inference rate (the detection loop
+  calls throttle() once per frame), then the PyTorch thread count; both recover
+  when there is room again. The rate never drops below what the alert rules need.
+
+    governor = ResourceGovernor()   # Before cv2/torch/face_recognition are imported
+    governor.start()
+    while running:
+        governor.throttle()
+        ...one frame...
+"""
+import os
+import threading
+import time
+
+from perf_stats import STATS
+
+# Constants
+CPU_BUDGET = 0.5  # Share of the machine's logical cores the monitoring process may use
+CONTROL_INTERVAL = 1.0  # Seconds between CPU measurements
+LOW_WATER = 0.8  # Below this share of the budget the inference rate is allowed to recover
+MIN_FPS = 2.0  # Slowest inference rate, whatever the load
+MAX_OPENCV_THREADS = 2  # OpenCV work per frame (resize, colour conversion, drawing) is small
+# Read once by OpenMP/BLAS at import time: PyTorch's defaults, NumPy and dlib's BLAS
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+                   "NUMEXPR_NUM_THREADS")
+
+
+def budget_cores(budget=CPU_BUDGET):
+    """The budget in cores; may be less than one core (the process then idles part of the time)."""
+    return budget * (os.cpu_count() or 1)
+
+
+def thread_plan(cores):
+    """Thread pool size per library for a budget of `cores` cores."""
+    return {
+        "torch": max(1, int(cores)),
+        "opencv": max(1, min(MAX_OPENCV_THREADS, int(cores) // 2)),
+        # dlib (face encodings) and NumPy: small matrices, parallelism doesn't pay off
+        "blas": 1
+    }
+
+
+def apply_thread_env(plan):
+    """Set the OpenMP/BLAS variables; only effective before those libraries are imported. User settings win."""
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(plan["torch"] if name == "OMP_NUM_THREADS" else plan["blas"]))
+
+
+def process_cpu_seconds():
+    """User + system CPU time of this process, all threads."""
+    times = os.times()
+    return times.user + times.system
+
+
+class ResourceGovernor:
+    """Keeps the process near its CPU budget by pacing inference and resizing thread pools."""
+
+    def __init__(self, budget=CPU_BUDGET, interval=CONTROL_INTERVAL, min_fps=MIN_FPS, stats=STATS):
+        self.cores = budget_cores(budget)
+        self.plan = thread_plan(self.cores)
+        self.interval = interval
+        self.min_fps = min_fps
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.frame_interval = 0.0  # Minimum seconds between frames; 0 = unthrottled
+        self.torch_threads = self.plan["torch"]
+        self.applied_threads = None  # (torch, opencv) last set in the inference thread
+        self.last_frame = 0.0
+        self.thread = None
+        self.stop_event = threading.Event()
+        apply_thread_env(self.plan)
+        self.stats.set_gauge("cpu_budget_cores", round(self.cores, 2))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._monitor, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def set_min_fps(self, fps):
+        """Raise the rate floor, e.g. to RuleEngine.min_fps() so frame-count alerts can still fire."""
+        with self.lock:
+            self.min_fps = max(MIN_FPS, fps)
+
+    def _monitor(self):
+        last_cpu = process_cpu_seconds()
+        last_wall = time.perf_counter()
+        while not self.stop_event.wait(self.interval):
+            cpu, wall = process_cpu_seconds(), time.perf_counter()
+            if wall > last_wall:
+                self.update(max(0.0, cpu - last_cpu) / (wall - last_wall))
+            last_cpu, last_wall = cpu, wall
+
+    def update(self, used_cores):
+        """One control step for the measured CPU use (in cores) over the last interval."""
+        with self.lock:
+            max_interval = 1.0 / self.min_fps if self.min_fps > 0 else 0.0
+            if used_cores > self.cores:
+                # Work per frame is roughly constant: stretch the frame interval by the overshoot
+                base = self.frame_interval or self.stats_frame_seconds()
+                self.frame_interval = min(max_interval, base * used_cores / self.cores)
+                if self.frame_interval >= max_interval and self.torch_threads > 1:
+                    # Already at the slowest rate: a single inference must use fewer cores
+                    self.torch_threads -= 1
+                    self.stats.incr("governor_thread_reductions")
+            elif used_cores < self.cores * LOW_WATER:
+                if self.frame_interval > 0:
+                    self.frame_interval *= 0.8
+                    if self.frame_interval < 0.005:
+                        self.frame_interval = 0.0
+                elif self.torch_threads < self.plan["torch"]:
+                    self.torch_threads += 1
+            frame_interval, torch_threads = self.frame_interval, self.torch_threads
+
+        self.stats.set_gauge("cpu_used_cores", round(used_cores, 2))
+        self.stats.set_gauge("cpu_budget_percent", round(100.0 * used_cores / self.cores, 1))
+        self.stats.set_gauge("governor_frame_interval_ms", round(1000.0 * frame_interval, 1))
+        self.stats.set_gauge("governor_torch_threads", torch_threads)
+
+    def stats_frame_seconds(self):
+        """Current time per frame, the starting point for throttling."""
+        fps = self.stats.fps()
+        return 1.0 / fps if fps > 0 else self.interval / 10.0
+
+    def throttle(self):
+        """
+        Call once per frame from the inference thread: applies thread-count changes
+        (PyTorch's setting is per calling thread under OpenMP) and sleeps as long
+        as the current frame interval requires.
+        """
+        with self.lock:
+            frame_interval, torch_threads = self.frame_interval, self.torch_threads
+        threads = (torch_threads, self.plan["opencv"])
+        if threads != self.applied_threads:
+            self._set_library_threads(*threads)
+            self.applied_threads = threads
+
+        now = time.perf_counter()
+        wait = self.last_frame + frame_interval - now
+        if wait > 0:
+            self.stats.observe("throttle", wait)
+            self.stats.incr("frames_throttled")
+            time.sleep(wait)
+            now += wait
+        self.last_frame = now
+
+    def _set_library_threads(self, torch_threads, opencv_threads):
+        import cv2
+        import torch
+
+        torch.set_num_threads(torch_threads)
+        cv2.setNumThreads(opencv_threads)
+        self.stats.set_gauge("governor_torch_threads", torch_threads)
+        self.stats.set_gauge("governor_opencv_threads", opencv_threads)
@@ -0,0 +1,230 @@
+"""
+Result cache for uploaded photos and videos.
+
+Results are keyed by the SHA-256 of the uploaded file plus a fingerprint of
+the model weights and the processing settings, so uploading the same file
+again returns the stored detections and annotated output instantly instead of
+running inference and writing another result file. Retraining (new weights)
+changes the fingerprint; entries of other weights are dropped on the next
+lookup. The cache holds its own hard links (or copies) of the outputs and
+evicts the least recently used entries beyond MAX_BYTES.
+
+    python result_cache.py stats
+    python result_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+from perf_stats import STATS
+
+# Constants
+CACHE_DIR = "result_cache"
+INDEX_NAME = "index.sqlite"
+MAX_BYTES = 5 * 1024 ** 3  # Disk budget for cached outputs (annotated videos are large)
+HASH_CHUNK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    outputs TEXT NOT NULL,
+    detections TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint(kind, config):
+    """Stable text for the settings that change a result (kind, input size, device, ...)."""
+    return json.dumps({"kind": kind, **(config or {})}, sort_keys=True, default=str)
+
+
+class ResultCache:
+    """Content-keyed, size-bounded LRU cache of processing results. Thread-safe."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, "outputs"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, INDEX_NAME), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.current_model = None
+        STATS.set_gauge("result_cache_bytes", self.total_bytes)
+
+    def file_digest(self, path):
+        """SHA-256 of a file; remembered per (path, size, mtime) so unchanged files aren't read again."""
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime, digest FROM digests WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        with STATS.time("result_cache_hash"):
+            digest = sha256_file(path)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO digests (path, size, mtime, digest) VALUES (?, ?, ?, ?)",
+                            (path, stat.st_size, stat.st_mtime, digest))
+            self.db.commit()
+        return digest
+
+    def model_fingerprint(self, model_path):
+        """Fingerprint of the weights; entries made with other weights are dropped when it changes."""
+        fingerprint = self.file_digest(model_path)
+        if fingerprint != self.current_model:
+            self.current_model = fingerprint
+            self._drop_other_models(fingerprint)
+        return fingerprint
+
+    def key(self, path, model_path, kind, config=None):
+        """Cache key for processing `path` with these weights and settings."""
+        parts = (self.file_digest(path), self.model_fingerprint(model_path), config_fingerprint(kind, config))
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """The cached entry ({"outputs": {name: path}, "detections": ...}) or None."""
+        with self.lock:
+            row = self.db.execute("SELECT kind, source, outputs, detections FROM entries WHERE key = ?",
+                                  (key,)).fetchone()
+            if row is not None:
+                outputs = json.loads(row[2])
+                if all(os.path.exists(p) for p in outputs.values()):
+                    self.db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self.db.commit()
+                    STATS.incr("result_cache_hits")
+                    return {"kind": row[0], "source": row[1], "outputs": outputs,
+                            "detections": json.loads(row[3]) if row[3] else None}
+                # Outputs deleted from disk behind our back
+                self._remove(key)
+        STATS.incr("result_cache_misses")
+        return None
+
+    def put(self, key, kind, source, outputs, detections=None):
+        """
+        Store the output files of a finished result ({name: path}). The cache keeps
+        its own hard links (copies across file systems), so the originals may be deleted.
+        Returns the entry's {name: cached path}.
+        """
+        entry_dir = os.path.join(self.root, "outputs", key[:2], key)
+        os.makedirs(entry_dir, exist_ok=True)
+        cached, size = {}, 0
+        for name, path in outputs.items():
+            target = os.path.join(entry_dir, name + os.path.splitext(path)[1])
+            if os.path.exists(target):
+                os.remove(target)
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copyfile(path, target)
+            cached[name] = target
+            size += os.path.getsize(target)
+
+        with self.lock:
+            previous = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            self.db.execute("INSERT OR REPLACE INTO entries (key, kind, source, model, created, last_used, size, "
+                            "outputs, detections) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (key, kind, source, self.current_model or "", now, now, size, json.dumps(cached),
+                             json.dumps(detections) if detections is not None else None))
+            self.db.commit()
+            self.total_bytes += size - (previous[0] if previous else 0)
+            self._evict(keep=key)
+        STATS.set_gauge("result_cache_bytes", self.total_bytes)
+        return cached
+
+    def _evict(self, keep=None):
+        """Remove the least recently used entries (except `keep`) until the cache fits its budget."""
+        evicted = 0
+        while self.max_bytes and self.total_bytes > self.max_bytes:
+            row = self.db.execute("SELECT key FROM entries WHERE key != ? ORDER BY last_used LIMIT 1",
+                                  (keep or "",)).fetchone()
+            if row is None:
+                break
+            self._remove(row[0])
+            evicted += 1
+        if evicted:
+            STATS.incr("result_cache_evictions", evicted)
+
+    def _drop_other_models(self, fingerprint):
+        with self.lock:
+            keys = [row[0] for row in self.db.execute("SELECT key FROM entries WHERE model != ?", (fingerprint,))]
+            for key in keys:
+                self._remove(key)
+        if keys:
+            STATS.incr("result_cache_invalidated", len(keys))
+            print(f"Result cache: model weights changed, dropped {len(keys)} entries")
+
+    def _remove(self, key):
+        row = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        shutil.rmtree(os.path.join(self.root, "outputs", key[:2], key), ignore_errors=True)
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.db.commit()
+        self.total_bytes -= row[0]
+        STATS.set_gauge("result_cache_bytes", self.total_bytes)
+
+    def clear(self):
+        with self.lock:
+            for (key,) in self.db.execute("SELECT key FROM entries").fetchall():
+                self._remove(key)
+            self.db.execute("DELETE FROM digests")
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            rows = self.db.execute("SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind").fetchall()
+        return {kind: {"entries": count, "bytes": size} for kind, count, size in rows}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or empty the photo/video result cache")
+    parser.add_argument("--root", default=CACHE_DIR)
+    parser.add_argument("command", choices=("stats", "clear"))
+    args = parser.parse_args()
+
+    cache = ResultCache(args.root)
+    if args.command == "stats":
+        for kind, values in sorted(cache.stats().items()):
+            print(f"{kind:<8} {values['entries']:>6} entries  {values['bytes'] / 1024 ** 2:9.1f} MB")
+        print(f"Total: {cache.total_bytes / 1024 ** 2:.1f} MB of {cache.max_bytes / 1024 ** 2:.0f} MB")
+    else:
+        cache.clear()
+        print("Result cache cleared")
+    cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+# Constants
+GATE_WIDTH = 160  # Frames are compared at this width (keeps the gate well under 1 ms)
+PIXEL_THRESHOLD = 20  # Grey-level difference for a pixel to count as changed
+MIN_CHANGED_FRACTION = 0.003  # Fraction of changed pixels for the scene to count as changed
+RECT_PADDING = 8  # Pixels (at full size) added around the changed region
+
+
+class SceneChangeGate:
+    """
+    Cheap "did anything change?" check against a reference frame.
+    Frames are shrunk to GATE_WIDTH, converted to grey and blurred, so sensor
+    noise and compression artefacts do not count as change.
+    """
+
+    def __init__(self, pixel_threshold=PIXEL_THRESHOLD, min_changed=MIN_CHANGED_FRACTION, gate_width=GATE_WIDTH):
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.gate_width = gate_width
+        self.reference = None
+        self.frame_size = None
+
+    def _small_grey(self, frame):
+        height, width = frame.shape[:2]
+        small_height = max(1, int(round(height * self.gate_width / width)))
+        small = cv2.resize(frame, (self.gate_width, small_height), interpolation=cv2.INTER_AREA)
+        grey = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(grey, (5, 5), 0)
+
+    def set_reference(self, frame):
+        """Compare future frames against this one (e.g. the last frame sent or processed)."""
+        self.reference = self._small_grey(frame)
+        self.frame_size = frame.shape[1], frame.shape[0]
+
+    def measure(self, frame):
+        """
+        Return (changed_fraction, rect) against the reference, where rect is the
+        (x, y, w, h) bounding box of the change in frame coordinates, or None.
+        Without a reference (or after a size change) the whole frame counts as changed.
+        """
+        height, width = frame.shape[:2]
+        if self.reference is None or self.frame_size != (width, height):
+            return 1.0, (0, 0, width, height)
+
+        mask = self._change_mask(frame)
+        fraction = float(np.count_nonzero(mask)) / mask.size
+        if fraction == 0.0:
+            return 0.0, None
+
+        ys, xs = np.nonzero(mask)
+        scale = width / float(mask.shape[1])
+        x0 = max(0, int(xs.min() * scale) - RECT_PADDING)
+        y0 = max(0, int(ys.min() * scale) - RECT_PADDING)
+        x1 = min(width, int((xs.max() + 1) * scale) + RECT_PADDING)
+        y1 = min(height, int((ys.max() + 1) * scale) + RECT_PADDING)
+        return fraction, (x0, y0, x1 - x0, y1 - y0)
+
+    def changed(self, frame):
+        return self.measure(frame)[0] >= self.min_changed
+
+    def region_change(self, frame, boxes):
+        """
+        Changed fraction of the pixels inside the (x1, y1, x2, y2) boxes, in frame
+        coordinates, against the reference. Change elsewhere in the frame is ignored.
+        Without a reference (or after a size change) this is 1.0.
+        """
+        height, width = frame.shape[:2]
+        if self.reference is None or self.frame_size != (width, height):
+            return 1.0
+        mask = self._change_mask(frame)
+        scale = mask.shape[1] / float(width)
+        region = np.zeros_like(mask)
+        for x1, y1, x2, y2 in boxes:
+            region[max(0, int(y1 * scale)):int(y2 * scale) + 1, max(0, int(x1 * scale)):int(x2 * scale) + 1] = True
+        area = np.count_nonzero(region)
+        return float(np.count_nonzero(mask & region)) / area if area else 0.0
+
+    def _change_mask(self, frame):
+        return cv2.absdiff(self._small_grey(frame), self.reference) > self.pixel_threshold
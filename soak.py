@@ -0,0 +1,337 @@
+"""
+Soak test: the live loop for a whole simulated shift, watching for leaks.
+
+Frames from the synthetic scene or a recorded clip are fed as fast as the
+model runs, and a simulated clock advances 1/--sim-fps seconds per frame, so
+rule windows, cooldowns, clips and rollups see a full shift in a fraction of
+the time. Every incident takes the app's path: log row, rollups, API event,
+evidence screenshot and clip, hard example and a notification (to a file),
+from a thread per alert like the app's screenshot threads. Photo processing
+(get_model + predict + result image) runs every few simulated minutes.
+
+Every --sample-minutes (simulated) the RSS, traced Python memory and its top
+allocators, open file handles, threads and the size of the work directory are
+recorded. After the warm-up, growth past the thresholds fails the run (exit 1).
+
+    python soak.py --hours 8
+    python soak.py --hours 1 --clip shift.mp4 --model runs/train/bitirme/weights/best.pt
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+
+from perf_stats import STATS
+from detector import MODEL_PATH, LiveDetector, get_model
+from alert_rules import RuleEngine
+from alert_aggregator import AlertAggregator
+from log_writer import CSVLogWriter
+from analytics import AlertRollups
+from api_server import EventHub, incident_event
+from notifiers import DeliveryEngine, FileNotifier, Notification
+from evidence import EvidenceStore, ClipRecorder
+from hard_examples import HardExampleStore
+
+# Constants
+SOAK_DIR = os.path.join("runs", "soak")
+LOG_HEADER = ["Time Detected", "Warning Cause", "Name"]
+SHIFT_HOURS = 8.0
+SIM_FPS = 2.0  # Frames per simulated second; the live loop runs faster, so each frame stands for more time
+ALERT_FRAMES = 20  # Matching frames per rule window at SIM_FPS (rules.yaml's 200 assume the camera's rate)
+SAMPLE_MINUTES = 15.0  # Simulated minutes between samples
+PHOTO_MINUTES = 10.0  # Simulated minutes between photo-processing actions
+WARMUP_FRACTION = 0.1  # Share of the run before the baseline sample (model load, caches, first clips)
+WARMUP_PHOTOS = 2  # ...and at least this many photo actions, whose first predict allocates for its input size
+TRACE_FRAMES = 1  # Stack depth tracemalloc keeps per allocation
+TOP_ALLOCATORS = 10
+# Baseline lines kept for the allocator diff; smaller lines count as new (keeps the retained baseline small)
+BASELINE_MIN_BYTES = 256 * 1024
+# Growth past the warm-up peak that fails the run
+GROWTH_KEYS = ("rss_mb", "traced_mb", "handles", "threads", "os_threads", "disk_mb")
+MAX_RSS_GROWTH_MB = 100.0
+MAX_RSS_SLOPE_MB_PER_HOUR = 10.0  # Steady RSS growth per simulated hour (least squares)
+MIN_SLOPE_HOURS = 2.0  # Shorter runs are too noisy (allocator caches come and go) to judge the slope
+MAX_TRACED_GROWTH_MB = 50.0
+MAX_HANDLE_GROWTH = 20
+MAX_THREAD_GROWTH = 10
+MAX_DISK_GROWTH_MB = 1024.0
+
+
+def open_handles(process):
+    """Open file descriptors (POSIX) or handles (Windows) of the process."""
+    return process.num_handles() if sys.platform == "win32" else process.num_fds()
+
+
+def dir_size_mb(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass  # Rotated or evicted while walking
+    return total / 1024 ** 2
+
+
+def allocations_by_line():
+    """{source line: (bytes, blocks)} of the traced memory, without tracemalloc's own bookkeeping."""
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return {str(s.traceback): (s.size, s.count) for s in snapshot.statistics("lineno")}
+
+
+def top_allocators(lines, baseline=None, limit=TOP_ALLOCATORS):
+    """The lines holding the most traced memory, or with the most growth since the baseline."""
+    if baseline is None:
+        top = sorted(lines.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [{"where": where, "kib": round(size / 1024, 1), "count": count} for where, (size, count) in top]
+    growth = {where: size - baseline.get(where, (0, 0))[0] for where, (size, _) in lines.items()}
+    top = sorted(growth.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"where": where, "kib": round(lines[where][0] / 1024, 1), "growth_kib": round(diff / 1024, 1),
+             "count": lines[where][1]} for where, diff in top]
+
+
+def slope_per_hour(samples, key):
+    """Least-squares growth of samples[key] per simulated hour."""
+    if len(samples) < 3:
+        return 0.0
+    xs = [s["sim_hours"] for s in samples]
+    ys = [s[key] for s in samples]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var if var else 0.0
+
+
+def check_growth(reference, final, slope, trace):
+    """Return the list of exceeded thresholds."""
+    failures = []
+    checks = [("rss_mb", MAX_RSS_GROWTH_MB), ("handles", MAX_HANDLE_GROWTH), ("threads", MAX_THREAD_GROWTH),
+              ("disk_mb", MAX_DISK_GROWTH_MB)]
+    if trace:
+        checks.append(("traced_mb", MAX_TRACED_GROWTH_MB))
+    for key, limit in checks:
+        growth = final[key] - reference[key]
+        if growth > limit:
+            failures.append(f"{key} grew by {growth:.1f} (limit {limit})")
+    if slope is not None and slope > MAX_RSS_SLOPE_MB_PER_HOUR:
+        failures.append(f"RSS grows {slope:.1f} MB per shift hour (limit {MAX_RSS_SLOPE_MB_PER_HOUR})")
+    return failures
+
+
+class SoakRun:
+    """The app's live-loop side effects, writing into one work directory."""
+
+    def __init__(self, args, workdir):
+        from fake_capture import FakeVideoCapture
+
+        self.args = args
+        self.workdir = workdir
+        self.model_path = args.model
+        self.rules = RuleEngine(overrides={"frames": args.alert_frames})
+        if self.rules.min_fps() > args.sim_fps:
+            print(f"Warning: the rules need {self.rules.min_fps():.2f} frames per simulated second to fire; "
+                  f"lower --alert-frames or raise --sim-fps")
+        self.detector = LiveDetector(get_model(args.model, warmup=True), self.rules, verbose=False)
+        self.aggregator = AlertAggregator(self.rules)
+        self.log_writer = CSVLogWriter(os.path.join(workdir, "detections_log.csv"), LOG_HEADER)
+        self.analytics = AlertRollups(os.path.join(workdir, "alert_rollups.json"))
+        self.hub = EventHub()
+        self.notifier = DeliveryEngine({"file": FileNotifier("file", os.path.join(workdir, "notifications.jsonl"))},
+                                       {"default": ["file"]})
+        self.evidence = EvidenceStore(os.path.join(workdir, "evidence"))
+        self.clip_recorder = ClipRecorder(self.evidence)
+        self.hard_examples = HardExampleStore(os.path.join(workdir, "hard_examples"))
+        # The clip is recorded once and looped; the synthetic scene never repeats
+        self.cap = FakeVideoCapture(args.clip)
+        self.user = "soak"
+        self.incidents = 0
+
+    def step(self, now):
+        """One frame at simulated time `now`."""
+        ret, frame = self.cap.read()
+        if not ret:
+            raise RuntimeError("Source could not be read")
+        result, detected_classes, fired = self.detector.process_frame(frame, now)
+        self.hub.publish_event("detection", user=self.user, classes=sorted(set(detected_classes)))
+        annotated = result.plot()
+        self.clip_recorder.push(annotated, now)
+
+        incident = self.aggregator.submit(fired, self.user, now)
+        if incident is not None:
+            self.incidents += 1
+            self.clip_recorder.trigger(incident.event_id, meta={"causes": incident.causes}, current_time=now)
+            local = time.localtime(now)
+            message = " | ".join(self.rules.message(c) for c in incident.causes)
+            self.log_writer.write([time.strftime("%Y-%m-%d %H:%M:%S", local), message, self.user])
+            self.analytics.record(local, self.user, incident.causes)
+            event = incident_event(incident, self.rules)
+            self.hub.publish_event("alert", **event)
+            self.hard_examples.submit(incident, frame, result, self.rules)
+            notification = Notification(f"Cause: {message}\nUser: {self.user}", severity=incident.severity, data=event)
+            threading.Thread(target=self._screenshot_and_notify, args=(notification, annotated), daemon=True).start()
+
+    def _screenshot_and_notify(self, notification, image):
+        notification.image_path = self.evidence.put_image(image, notification.data.get("event_id"), kind="screenshot")
+        self.notifier.submit(notification)
+
+    def process_photo(self):
+        """What "Upload Photo" does: the shared model, one prediction, a result image."""
+        import cv2
+
+        ret, frame = self.cap.read()
+        path = os.path.join(self.workdir, "upload.jpg")
+        cv2.imwrite(path, frame)
+        result = get_model(self.model_path).predict(source=path, show=False, verbose=False)[0]
+        self.evidence.put_image(result.plot(), kind="result", meta={"source": path})
+
+    def close(self):
+        self.cap.release()
+        for thread in self.clip_recorder.flush():
+            thread.join()
+        self.log_writer.close()
+        self.analytics.save()
+        self.notifier.close()
+        self.hard_examples.close()
+        self.evidence.close()
+
+
+def run(args):
+    import psutil
+
+    if not os.path.exists(args.model):
+        print(f"Model file not found: {args.model}")
+        return 1
+    workdir = os.path.join(args.out, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(workdir, exist_ok=True)
+    trace = not args.no_tracemalloc
+    if trace:
+        tracemalloc.start(TRACE_FRAMES)
+
+    process = psutil.Process()
+    soak = SoakRun(args, workdir)
+    total_frames = int(args.hours * 3600 * args.sim_fps)
+    sample_every = max(1, int(args.sample_minutes * 60 * args.sim_fps))
+    photo_every = max(1, int(PHOTO_MINUTES * 60 * args.sim_fps))
+    warmup_frames = max(int(total_frames * WARMUP_FRACTION), WARMUP_PHOTOS * photo_every + 1)
+    start_time = time.time()
+    print(f"Soak: {args.hours} h shift = {total_frames} frames, work directory {workdir}")
+
+    samples = []
+    baseline = baseline_lines = None
+    wall_start = time.perf_counter()
+
+    def sample(frame_index):
+        # Per-line totals only: holding a whole snapshot would itself add ~100 MB to the RSS being watched
+        lines = allocations_by_line() if trace else None
+        row = {
+            "frame": frame_index,
+            "sim_hours": round(frame_index / args.sim_fps / 3600, 3),
+            "wall_seconds": round(time.perf_counter() - wall_start, 1),
+            "rss_mb": round(process.memory_info().rss / 1024 ** 2, 1),
+            "traced_mb": round(tracemalloc.get_traced_memory()[0] / 1024 ** 2, 1) if trace else 0.0,
+            "handles": open_handles(process),
+            "threads": threading.active_count(),
+            "os_threads": process.num_threads(),
+            "disk_mb": round(dir_size_mb(workdir), 1),
+            "incidents": soak.incidents
+        }
+        if lines is not None:
+            row["top_allocators"] = top_allocators(lines, baseline_lines)
+        samples.append(row)
+        print(f"[{row['sim_hours']:5.2f} h] RSS {row['rss_mb']} MB, traced {row['traced_mb']} MB, "
+              f"handles {row['handles']}, threads {row['threads']}, disk {row['disk_mb']} MB, "
+              f"incidents {row['incidents']}")
+        return row, lines
+
+    interrupted = False
+    frames = 0
+    try:
+        for i in range(total_frames):
+            soak.step(start_time + i / args.sim_fps)
+            frames += 1
+            STATS.tick_frame()
+            if i and i % photo_every == 0:
+                soak.process_photo()
+            if i == warmup_frames:
+                baseline, lines = sample(i)
+                baseline_lines = {where: v for where, v in lines.items() if v[0] >= BASELINE_MIN_BYTES}
+                del lines
+                baseline["baseline"] = True
+            elif i % sample_every == 0:
+                sample(i)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Interrupted; checking what ran so far")
+    final, _ = sample(frames)
+    soak.close()
+    if trace:
+        tracemalloc.stop()
+
+    if baseline is None:
+        print("Run ended before the warm-up; nothing to compare")
+        baseline = final
+    # Compare with the highest value seen up to the baseline, so a dip in RSS at that moment isn't growth
+    warmup = [s for s in samples if s["frame"] <= baseline["frame"]]
+    reference = {key: max(s[key] for s in warmup) for key in GROWTH_KEYS}
+    steady = [s for s in samples if s["frame"] >= baseline["frame"]]
+    slope = None
+    if steady[-1]["sim_hours"] - steady[0]["sim_hours"] >= MIN_SLOPE_HOURS:
+        slope = slope_per_hour(steady, "rss_mb")
+    failures = check_growth(reference, final, slope, trace)
+    growth = {key: round(final[key] - reference[key], 1) for key in GROWTH_KEYS}
+
+    report = {
+        "settings": {"hours": args.hours, "sim_fps": args.sim_fps, "alert_frames": args.alert_frames,
+                     "model": args.model, "clip": args.clip, "tracemalloc": trace, "interrupted": interrupted},
+        "wall_seconds": round(time.perf_counter() - wall_start, 1),
+        "speedup": round(final["sim_hours"] * 3600 / max(time.perf_counter() - wall_start, 1e-6), 1),
+        "growth": growth,
+        "rss_slope_mb_per_hour": None if slope is None else round(slope, 2),
+        "failures": failures,
+        "samples": samples,
+        "stats": STATS.snapshot()
+    }
+    report_path = os.path.join(workdir, "soak_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if not args.keep_artifacts:
+        for name in os.listdir(workdir):
+            path = os.path.join(workdir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif path != report_path:
+                os.remove(path)
+
+    slope_text = "n/a (run too short)" if slope is None else f"{slope:.2f} MB/h"
+    print(f"Growth since warm-up: {growth}, RSS slope {slope_text} ({report['speedup']}x real time)")
+    print(f"Soak report saved: {report_path}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the live loop for a simulated shift and check for leaks")
+    parser.add_argument("--hours", type=float, default=SHIFT_HOURS, help="Simulated shift length")
+    parser.add_argument("--sim-fps", type=float, default=SIM_FPS,
+                        help="Frames per simulated second (lower = faster shift)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--clip", default=None, help="Recorded clip to loop instead of the synthetic scene")
+    parser.add_argument("--alert-frames", type=int, default=ALERT_FRAMES,
+                        help="Matching frames per window for every rule")
+    parser.add_argument("--sample-minutes", type=float, default=SAMPLE_MINUTES,
+                        help="Simulated minutes between samples")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="Skip Python allocation tracing (faster, no allocator report)")
+    parser.add_argument("--keep-artifacts", action="store_true",
+                        help="Keep the logs, evidence and hard examples next to the report")
+    parser.add_argument("--out", default=SOAK_DIR)
+    return run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
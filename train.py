@@ -0,0 +1,269 @@
+"""
+Scriptable YOLO training with dataset caching, auto-tuned batch/workers and a throughput report.
+
+    python train.py --data data.yaml --data-root /data/bitirme --epochs 50
+    python train.py --tune-only          # print the chosen batch/workers/cache and exit
+
+Replaces the training cells of script.ipynb. Runs CPU-only by default.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import yaml
+
+# Constants
+BASE_MODEL = "yolov8n.pt"
+DATA_YAML = "data.yaml"
+PROJECT_DIR = os.path.join("runs", "train")
+RUN_NAME = "bitirme"
+EPOCHS = 50
+IMGSZ = 640
+BATCH_CANDIDATES = (4, 8, 16, 32, 64)  # Batch sizes tried by the CPU auto-tuner
+PROBE_MAX_STEP_SECONDS = 30.0  # Stop probing once a single step takes longer than this
+MEMORY_HEADROOM = 0.75  # Fraction of available RAM the cache and batches may use
+MAX_WORKERS = 8
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+REPORT_NAME = "throughput.json"
+
+
+def resolve_data_yaml(data_path, data_root=None, out_dir=PROJECT_DIR):
+    """
+    Return (path of a data yaml whose split paths exist, number of training images).
+    Split paths that don't exist (e.g. Windows paths from another machine) are
+    re-based onto data_root by keeping their last two components (train/images).
+    """
+    with open(data_path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+
+    changed = False
+    for split in ("train", "val", "test"):
+        path = data.get(split)
+        if not path or os.path.exists(path):
+            continue
+        if data_root:
+            parts = path.replace("\\", "/").rstrip("/").split("/")
+            candidate = os.path.join(data_root, *parts[-2:])
+            if os.path.exists(candidate):
+                data[split] = os.path.abspath(candidate)
+                changed = True
+                continue
+        if split != "test":
+            raise FileNotFoundError(f"{split} images not found: {path} (use --data-root)")
+        data.pop(split)
+        changed = True
+
+    resolved_path = data_path
+    if changed:
+        os.makedirs(out_dir, exist_ok=True)
+        resolved_path = os.path.join(out_dir, "resolved_" + os.path.basename(data_path))
+        with open(resolved_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(data, f, sort_keys=False)
+    return resolved_path, count_images(data["train"])
+
+
+def count_images(path):
+    if os.path.isfile(path):  # A .txt list of image paths
+        with open(path, encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+    return sum(1 for _, _, files in os.walk(path) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def choose_cache(num_images, imgsz, requested="auto"):
+    """
+    "ram" when the decoded dataset fits comfortably in memory, otherwise "disk"
+    (decoded .npy files next to the images, read back without JPEG decoding).
+    """
+    if requested != "auto":
+        return None if requested == "none" else requested
+    import psutil
+    # Images are cached resized to imgsz on the long side; assume 3:4 aspect on average
+    cache_bytes = num_images * imgsz * imgsz * 3 * 0.75
+    available = psutil.virtual_memory().available
+    return "ram" if cache_bytes < available * MEMORY_HEADROOM * 0.5 else "disk"
+
+
+def choose_workers(batch, cache):
+    """Data-loader processes: enough to keep up, without starving the training threads on CPU."""
+    cpus = os.cpu_count() or 1
+    # With decoded images cached, loading is mostly augmentation and needs fewer workers
+    workers = cpus // 4 if cache == "ram" else cpus // 2
+    return max(1, min(workers, MAX_WORKERS, batch))
+
+
+def probe_batch_size(model_path, imgsz, device="cpu", candidates=BATCH_CANDIDATES):
+    """
+    Time one forward+backward pass at increasing batch sizes and return
+    (best batch size, {batch: images/sec}). Stops when memory would run out,
+    a step gets too slow, or throughput stops improving.
+    """
+    import psutil
+    import torch
+    from ultralytics import YOLO
+
+    net = YOLO(model_path).model.to(device)
+    net.train()
+    for param in net.parameters():
+        param.requires_grad_(True)
+    process = psutil.Process()
+
+    def step(batch):
+        x = torch.rand(batch, 3, imgsz, imgsz, device=device)
+        sum(p.float().mean() for p in flatten(net(x))).backward()
+        net.zero_grad(set_to_none=True)
+
+    def flatten(preds):
+        # Training heads return tensors nested in lists/dicts depending on the version
+        if torch.is_tensor(preds):
+            return [preds]
+        items = preds.values() if isinstance(preds, dict) else preds
+        return [t for item in items for t in flatten(item)]
+
+    results = {}
+    best = candidates[0]
+    for batch in candidates:
+        rss_before = process.memory_info().rss
+        try:
+            step(batch)  # Warm-up (allocations, kernel selection)
+            start = time.perf_counter()
+            step(batch)
+            elapsed = time.perf_counter() - start
+        except RuntimeError as e:  # Out of memory
+            print(f"Batch {batch}: {e}")
+            break
+        results[batch] = round(batch / elapsed, 1)
+        print(f"Batch {batch}: {results[batch]} images/s ({elapsed:.2f} s/step)")
+        if results[batch] >= results[best] * 1.05:
+            best = batch
+        elif batch > best:
+            break  # Larger batches no longer pay off
+        # Doubling the batch roughly doubles activation memory
+        used = max(process.memory_info().rss - rss_before, 0)
+        if elapsed > PROBE_MAX_STEP_SECONDS or 2 * used > psutil.virtual_memory().available * MEMORY_HEADROOM:
+            break
+    del net
+    return best, results
+
+
+class ThroughputMeter:
+    """Ultralytics callbacks that split each epoch into data-loader stalls and compute."""
+
+    def __init__(self):
+        self.epochs = []
+        self.epoch_start = 0.0
+        self.batch_start = 0.0
+        self.last_batch_end = 0.0
+        self.stall = 0.0
+        self.compute = 0.0
+        self.batches = 0
+
+    def register(self, model):
+        model.add_callback("on_train_epoch_start", self.on_epoch_start)
+        model.add_callback("on_train_batch_start", self.on_batch_start)
+        model.add_callback("on_train_batch_end", self.on_batch_end)
+        model.add_callback("on_train_epoch_end", self.on_epoch_end)
+
+    def on_epoch_start(self, trainer):
+        self.epoch_start = self.last_batch_end = time.perf_counter()
+        self.stall = self.compute = 0.0
+        self.batches = 0
+
+    def on_batch_start(self, trainer):
+        self.batch_start = time.perf_counter()
+        # Time between the previous step and this one is spent waiting for the loader
+        self.stall += self.batch_start - self.last_batch_end
+
+    def on_batch_end(self, trainer):
+        self.last_batch_end = time.perf_counter()
+        self.compute += self.last_batch_end - self.batch_start
+        self.batches += 1
+
+    def on_epoch_end(self, trainer):
+        elapsed = time.perf_counter() - self.epoch_start
+        images = len(trainer.train_loader.dataset)
+        self.epochs.append({
+            "epoch": trainer.epoch + 1,
+            "images": images,
+            "seconds": round(elapsed, 2),
+            "images_per_s": round(images / elapsed, 2) if elapsed > 0 else 0.0,
+            "loader_stall_seconds": round(self.stall, 2),
+            "loader_stall_percent": round(100.0 * self.stall / elapsed, 1) if elapsed > 0 else 0.0,
+            "compute_seconds": round(self.compute, 2),
+            "batches": self.batches
+        })
+        e = self.epochs[-1]
+        print(f"Epoch {e['epoch']}: {e['images_per_s']} images/s, loader stall {e['loader_stall_percent']}%")
+
+    def summary(self):
+        if not self.epochs:
+            return {}
+        # The first epoch includes cache warm-up and lazy initialisation
+        steady = self.epochs[1:] or self.epochs
+        seconds = sum(e["seconds"] for e in steady)
+        return {
+            "epochs": len(self.epochs),
+            "images_per_s": round(sum(e["images"] for e in steady) / seconds, 2) if seconds else 0.0,
+            "loader_stall_percent": round(100.0 * sum(e["loader_stall_seconds"] for e in steady) / seconds, 1)
+            if seconds else 0.0,
+            "total_seconds": round(sum(e["seconds"] for e in self.epochs), 2)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the detection model")
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--data-root", default=None, help="Dataset root to re-base missing paths in the data yaml onto")
+    parser.add_argument("--model", default=BASE_MODEL, help="Starting weights")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--device", default="cpu", help="cpu, or a CUDA device such as 0")
+    parser.add_argument("--batch", type=int, default=0, help="0 = auto-tune")
+    parser.add_argument("--workers", type=int, default=-1, help="-1 = auto")
+    parser.add_argument("--cache", default="auto", choices=("auto", "ram", "disk", "none"))
+    parser.add_argument("--project", default=PROJECT_DIR)
+    parser.add_argument("--name", default=RUN_NAME)
+    parser.add_argument("--tune-only", action="store_true", help="Only print the tuned settings")
+    args = parser.parse_args()
+
+    data_path, num_images = resolve_data_yaml(args.data, args.data_root, args.project)
+    cache = choose_cache(num_images, args.imgsz, args.cache)
+
+    probe = {}
+    batch = args.batch
+    if batch <= 0:
+        if args.device == "cpu":
+            batch, probe = probe_batch_size(args.model, args.imgsz)
+        else:
+            batch = -1  # Ultralytics' own CUDA memory-based auto batch
+    workers = args.workers if args.workers >= 0 else choose_workers(max(batch, 1), cache)
+
+    settings = {"data": data_path, "train_images": num_images, "batch": batch, "workers": workers,
+                "cache": cache or "none", "device": args.device, "imgsz": args.imgsz,
+                "cpu_count": os.cpu_count(), "probe_images_per_s": probe}
+    print(json.dumps(settings, indent=2))
+    if args.tune_only:
+        return 0
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    meter = ThroughputMeter()
+    meter.register(model)
+    model.train(data=data_path, epochs=args.epochs, imgsz=args.imgsz, batch=batch, workers=workers,
+                cache=cache or False, device=args.device, name=args.name,
+                # Relative projects would land under Ultralytics' global runs directory
+                project=os.path.abspath(args.project))
+
+    report = {"settings": settings, "summary": meter.summary(), "epochs": meter.epochs}
+    save_dir = str(model.trainer.save_dir) if model.trainer else args.project
+    report_path = os.path.join(save_dir, REPORT_NAME)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Throughput report saved: {report_path}")
+    print(f"Best weights: {os.path.join(save_dir, 'weights', 'best.pt')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import json
+import queue
+import threading
+
+import cv2
+
+from perf_stats import STATS
+
+# Constants
+QUEUE_SIZE = 64  # Frames buffered between decode / inference / encode
+_END = object()  # Sentinel marking the end of a stream
+
+
+def open_capture(path):
+    """Open a video file, asking OpenCV for hardware decoding when the build supports it."""
+    if hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+        cap = cv2.VideoCapture(path, cv2.CAP_ANY, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            return cap
+    return cv2.VideoCapture(path)
+
+
+def open_writer(path, fourcc, fps, size):
+    """Open a video writer, asking OpenCV for hardware encoding when the build supports it."""
+    if hasattr(cv2, "VIDEOWRITER_PROP_HW_ACCELERATION"):
+        writer = cv2.VideoWriter(path, cv2.CAP_ANY, fourcc, fps, size,
+                                 [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if writer.isOpened():
+            return writer
+    return cv2.VideoWriter(path, fourcc, fps, size)
+
+
+class ThreadedVideoReader:
+    """
+    Decodes frames ahead of the consumer on a background thread (bounded buffer).
+    start_frame / max_frames restrict reading to one segment of the video.
+    """
+
+    def __init__(self, path, queue_size=QUEUE_SIZE, stats=STATS, start_frame=0, max_frames=None):
+        self.cap = open_capture(path)
+        self.stats = stats
+        self.max_frames = max_frames
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.opened = self.cap.isOpened()
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else 25  # Default to 25 if FPS is not available
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        if self.opened and start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        self.thread = None
+        if self.opened:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        decoded = 0
+        while not self.stopped.is_set():
+            if self.max_frames is not None and decoded >= self.max_frames:
+                break
+            decoded += 1
+            with self.stats.time("decode"):
+                ret, frame = self.cap.read()
+            if not ret:
+                break
+            # Block while the buffer is full, but wake up if we are asked to stop
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self.stats.set_gauge("decode_queue_depth", self.queue.qsize())
+        self.cap.release()
+        self._put_end()
+
+    def _put_end(self):
+        while True:
+            try:
+                self.queue.put(_END, timeout=0.1)
+                return
+            except queue.Full:
+                if self.stopped.is_set():
+                    return
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        """Same contract as cv2.VideoCapture.read()."""
+        if not self.opened:
+            return False, None
+        frame = self.queue.get()
+        if frame is _END:
+            self.opened = False
+            return False, None
+        return True, frame
+
+    def release(self):
+        self.stopped.set()
+        # Drain so the decode thread is never stuck on a full queue
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.opened = False
+
+
+class ThreadedVideoWriter:
+    """Encodes frames on a background thread; write() only blocks when the buffer is full."""
+
+    def __init__(self, path, fourcc, fps, size, queue_size=QUEUE_SIZE, stats=STATS):
+        self.writer = open_writer(path, fourcc, fps, size)
+        self.stats = stats
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is _END:
+                break
+            with self.stats.time("encode"):
+                self.writer.write(frame)
+            self.stats.set_gauge("encode_queue_depth", self.queue.qsize())
+        self.writer.release()
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    def write(self, frame):
+        self.queue.put(frame)
+
+    def release(self):
+        """Flush all buffered frames and close the file."""
+        self.queue.put(_END)
+        self.thread.join()
+
+
+class DetectionSidecarWriter:
+    """Writes per-frame detections as JSON lines instead of re-encoding video."""
+
+    def __init__(self, path, fps):
+        self.file = open(path, mode='w', encoding='utf-8')
+        self.fps = fps
+
+    def write(self, frame_index, detections):
+        record = {
+            "frame": frame_index,
+            "time": round(frame_index / self.fps, 3),
+            "detections": detections
+        }
+        self.file.write(json.dumps(record) + "\n")
+
+    def release(self):
+        self.file.close()
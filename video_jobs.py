@@ -0,0 +1,345 @@
+"""
+Resumable, checkpointed processing of long videos.
+
+The video is split into fixed-length segments. Each finished segment (annotated
+video + detections) is committed to the job directory and recorded in a
+manifest, so an interrupted run resumes from the last finished segment.
+The final output is assembled from the segments once all are done.
+
+    python video_jobs.py shift.mp4 shift_result.mp4 --workers 4
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from detector import MODEL_PATH, load_model, process_video_file
+from video_io import open_capture
+
+# Constants
+VIDEO_JOBS_DIR = "video_jobs"
+SEGMENT_SECONDS = 60  # Length of one checkpointed segment
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def job_id(input_video_path, write_video):
+    """Identify a job by the input file (path, size, mtime) and the output mode."""
+    stat = os.stat(input_video_path)
+    key = f"{os.path.abspath(input_video_path)}|{stat.st_size}|{int(stat.st_mtime)}|{int(bool(write_video))}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def find_resumable_job(input_video_path, write_video, jobs_dir=VIDEO_JOBS_DIR):
+    """Return the manifest of an unfinished job for this input, or None."""
+    manifest_path = os.path.join(jobs_dir, job_id(input_video_path, write_video), MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("complete"):
+        return None
+    return manifest
+
+
+def _write_json_atomic(path, data):
+    """Write JSON so that a crash leaves either the old or the new file, never half of one."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Per-process model for parallel segment workers
+_worker_model = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+
+def _process_segment_worker(input_video_path, start, count, video_tmp, sidecar_tmp, predict_kwargs):
+    frames = process_video_file(_worker_model, input_video_path, video_tmp, sidecar_tmp, show=False,
+                                start_frame=start, max_frames=count, **predict_kwargs)
+    return frames
+
+
+class VideoJob:
+    """A chunked processing job for one input video."""
+
+    def __init__(self, input_video_path, result_video_path, write_video=True,
+                 segment_seconds=SEGMENT_SECONDS, jobs_dir=VIDEO_JOBS_DIR, resume=True):
+        """With resume=False the segments of an earlier, unfinished run are discarded."""
+        self.input_video_path = input_video_path
+        self.write_video = write_video
+        self.job_dir = os.path.join(jobs_dir, job_id(input_video_path, write_video))
+        self.manifest_path = os.path.join(self.job_dir, MANIFEST_NAME)
+
+        manifest = find_resumable_job(input_video_path, write_video, jobs_dir) if resume else None
+        if not resume:
+            shutil.rmtree(self.job_dir, ignore_errors=True)
+        os.makedirs(self.job_dir, exist_ok=True)
+        if manifest is not None:
+            print(f"Resuming video job {self.job_dir}: {len(manifest['segments'])} segment(s) already done.")
+            self.manifest = manifest
+            # Segments live in the job directory; only the assembled output goes to the path asked for now
+            if manifest["result_video_path"] != result_video_path:
+                print(f"Output changed from {manifest['result_video_path']} to {result_video_path}")
+                manifest["result_video_path"] = result_video_path
+                _write_json_atomic(self.manifest_path, manifest)
+        else:
+            self.manifest = self._new_manifest(result_video_path, segment_seconds)
+            _write_json_atomic(self.manifest_path, self.manifest)
+
+    def _new_manifest(self, result_video_path, segment_seconds):
+        cap = open_capture(self.input_video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = fps if fps > 0 else 25  # Default to 25 if FPS is not available
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        segment_frames = max(1, int(round(segment_seconds * fps)))
+        total_segments = math.ceil(frame_count / segment_frames) if frame_count > 0 else None
+        return {
+            "version": MANIFEST_VERSION,
+            "input": os.path.abspath(self.input_video_path),
+            "result_video_path": result_video_path,
+            "write_video": self.write_video,
+            "fps": fps,
+            "width": width,
+            "height": height,
+            "frame_count": frame_count,
+            "segment_frames": segment_frames,
+            "total_segments": total_segments,  # None until the end of the video is reached
+            "segments": {},
+            "complete": False
+        }
+
+    @property
+    def result_video_path(self):
+        return self.manifest["result_video_path"]
+
+    @property
+    def sidecar_path(self):
+        return os.path.splitext(self.result_video_path)[0] + ".jsonl"
+
+    def _segment_paths(self, index):
+        base = os.path.join(self.job_dir, f"segment_{index:05d}")
+        video = base + ".mp4" if self.write_video else None
+        return video, base + ".jsonl"
+
+    def _commit_segment(self, index, frames, video_tmp, sidecar_tmp):
+        """Move a finished segment into place and record it in the manifest."""
+        video, sidecar = self._segment_paths(index)
+        if frames == 0:
+            # Empty tail segment (frame count was unknown); nothing to keep
+            self._discard_tmp(video_tmp, sidecar_tmp)
+            video = sidecar = None
+        else:
+            if video is not None:
+                os.replace(video_tmp, video)
+            os.replace(sidecar_tmp, sidecar)
+
+        segment_frames = self.manifest["segment_frames"]
+        self.manifest["segments"][str(index)] = {
+            "start": index * segment_frames,
+            "frames": frames,
+            "video": os.path.basename(video) if video else None,
+            "detections": os.path.basename(sidecar) if sidecar else None
+        }
+        # A short segment means we reached the end of the video
+        if frames < segment_frames and self.manifest["total_segments"] is None:
+            self.manifest["total_segments"] = index + 1
+        _write_json_atomic(self.manifest_path, self.manifest)
+        print(f"Segment {index} committed ({frames} frames).")
+
+    def _discard_tmp(self, video_tmp, sidecar_tmp):
+        for path in (video_tmp, sidecar_tmp):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _tmp_paths(self, index):
+        video, sidecar = self._segment_paths(index)
+        video_tmp = video.replace(".mp4", ".partial.mp4") if video else None
+        return video_tmp, sidecar + ".partial"
+
+    def is_done(self):
+        total = self.manifest["total_segments"]
+        return total is not None and all(str(i) in self.manifest["segments"] for i in range(total))
+
+    def run(self, model=None, model_path=MODEL_PATH, workers=1, show=True, stop_event=None, **predict_kwargs):
+        """
+        Process all pending segments and assemble the output.
+        Returns True when the output is complete, False if interrupted.
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+
+        if workers > 1 and self.manifest["total_segments"] is not None:
+            self._run_parallel(model_path, workers, stop_event, predict_kwargs)
+        else:
+            if model is None:
+                model = load_model(model_path)
+            self._run_sequential(model, show, stop_event, predict_kwargs)
+
+        if stop_event.is_set() or not self.is_done():
+            print(f"Video job interrupted; progress saved in {self.job_dir}")
+            return False
+
+        self.assemble()
+        return True
+
+    def _run_sequential(self, model, show, stop_event, predict_kwargs):
+        segment_frames = self.manifest["segment_frames"]
+        index = 0
+        while not stop_event.is_set():
+            total = self.manifest["total_segments"]
+            if total is not None and index >= total:
+                break
+            if str(index) in self.manifest["segments"]:
+                index += 1
+                continue
+
+            video_tmp, sidecar_tmp = self._tmp_paths(index)
+            try:
+                frames = process_video_file(model, self.input_video_path, video_tmp, sidecar_tmp, show=show,
+                                            start_frame=index * segment_frames, max_frames=segment_frames,
+                                            stop_event=stop_event, **predict_kwargs)
+            except Exception as e:
+                # Not the end of the video: leave the segment uncommitted so a resume redoes it
+                print(f"Segment {index} failed: {e}")
+                self._discard_tmp(video_tmp, sidecar_tmp)
+                stop_event.set()
+                break
+            if frames is None:
+                print("Video could not be opened.")
+                stop_event.set()
+                break
+            if stop_event.is_set():
+                # Partially processed segment; it will be redone on resume
+                break
+            self._commit_segment(index, frames, video_tmp, sidecar_tmp)
+            index += 1
+
+    def _run_parallel(self, model_path, workers, stop_event, predict_kwargs):
+        segment_frames = self.manifest["segment_frames"]
+        pending = [i for i in range(self.manifest["total_segments"]) if str(i) not in self.manifest["segments"]]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+            futures = {}
+            for index in pending:
+                video_tmp, sidecar_tmp = self._tmp_paths(index)
+                future = pool.submit(_process_segment_worker, self.input_video_path, index * segment_frames,
+                                     segment_frames, video_tmp, sidecar_tmp, predict_kwargs)
+                futures[future] = (index, video_tmp, sidecar_tmp)
+
+            for future in as_completed(futures):
+                index, video_tmp, sidecar_tmp = futures[future]
+                if stop_event.is_set():
+                    future.cancel()
+                    continue
+                try:
+                    frames = future.result()
+                except Exception as e:
+                    print(f"Segment {index} failed: {e}")
+                    self._discard_tmp(video_tmp, sidecar_tmp)
+                    continue
+                if frames is not None:
+                    self._commit_segment(index, frames, video_tmp, sidecar_tmp)
+
+    def assemble(self):
+        """Join the committed segments into the final video and detections file."""
+        segments = self.manifest["segments"]
+        indices = [i for i in range(self.manifest["total_segments"]) if segments[str(i)]["frames"] > 0]
+
+        # Detections: plain concatenation of the JSON-lines files
+        sidecar_tmp = self.sidecar_path + ".partial"
+        with open(sidecar_tmp, "wb") as out:
+            for i in indices:
+                name = segments[str(i)]["detections"]
+                with open(os.path.join(self.job_dir, name), "rb") as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(sidecar_tmp, self.sidecar_path)
+
+        if self.write_video:
+            videos = [os.path.join(self.job_dir, segments[str(i)]["video"]) for i in indices]
+            video_tmp = os.path.splitext(self.result_video_path)[0] + ".partial.mp4"
+            if not self._concat_ffmpeg(videos, video_tmp):
+                self._concat_opencv(videos, video_tmp)
+            os.replace(video_tmp, self.result_video_path)
+
+        self.manifest["complete"] = True
+        _write_json_atomic(self.manifest_path, self.manifest)
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+        print(f"Video job assembled: {self.result_video_path if self.write_video else self.sidecar_path}")
+
+    def _concat_ffmpeg(self, videos, output):
+        """Stream-copy concatenation (no re-encoding). Returns False if ffmpeg is unavailable."""
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            return False
+        list_path = os.path.join(self.job_dir, "concat.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for video in videos:
+                f.write(f"file '{os.path.abspath(video)}'\n")
+        result = subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"ffmpeg concat failed, falling back to OpenCV: {result.stderr.strip()}")
+            return False
+        return True
+
+    def _concat_opencv(self, videos, output):
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        size = (self.manifest["width"], self.manifest["height"])
+        out = cv2.VideoWriter(output, fourcc, self.manifest["fps"], size)
+        for video in videos:
+            cap = cv2.VideoCapture(video)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+        out.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable processing of long videos")
+    parser.add_argument("input")
+    parser.add_argument("output", help="Annotated output video (.mp4); detections go next to it as .jsonl")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=1, help="Process segments in parallel")
+    parser.add_argument("--segment-seconds", type=int, default=SEGMENT_SECONDS)
+    parser.add_argument("--no-video", action="store_true", help="Only write the detections file")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--restart", action="store_true", help="Discard the progress of an earlier run")
+    args = parser.parse_args()
+
+    predict_kwargs = {"verbose": False}
+    if args.device:
+        predict_kwargs["device"] = args.device
+
+    job = VideoJob(args.input, args.output, write_video=not args.no_video, segment_seconds=args.segment_seconds,
+                   resume=not args.restart)
+    done = job.run(model_path=args.model, workers=args.workers, show=False, **predict_kwargs)
+    return 0 if done else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())